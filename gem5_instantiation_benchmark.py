@@ -0,0 +1,582 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+A benchmark of the time it takes to set up the stdlib boards used in these
+materials, before the first tick is simulated.
+
+Run with a gem5 binary, the script builds one board and times each phase of
+its setup:
+
+- `import_objects`: `from m5.objects import *`, as most scripts here start
+  with. `preloaded` counts the `m5.objects` modules gem5 had imported before
+  the script started.
+- `construct`: building the processor, memory, cache hierarchy and board,
+  and setting the workload. This includes the `incorporate_*` calls when the
+  board connects its components in its constructor.
+- `incorporate_cache`, `incorporate_processor`, `incorporate_memory`: the
+  time spent connecting each component to the board.
+- `pre_instantiate`: what the Simulator does before instantiating: the
+  board's own preparation, if it needs any, and creating the Root.
+- `instantiate`: `m5.instantiate()`, i.e. creating and connecting the C++
+  objects.
+- `config_ini`, `config_json`: writing config.ini and config.json, which
+  `m5.instantiate()` otherwise does itself.
+
+The timings are written to `instantiation.json` in the output directory.
+With `--profile`, the setup is run under cProfile and the profile is written
+to `instantiation.prof` and summarized in `instantiation-profile.txt`.
+
+The `none` case stops after `import_objects`, to time gem5 alone.
+
+Run with the host's Python, the script runs gem5 once per case and number of
+cores and prints the timings of all the runs, e.g. to find setup regressions
+between two gem5 builds by comparing with the results of the other
+(`--baseline`). It also times each gem5 process as a whole (`process`);
+`startup` is the part of it spent outside the setup, mostly starting gem5
+and importing its Python modules before the script runs, which is most of
+the run time of a short SE simulation.
+
+Usage:
+------
+
+```
+gem5 gem5_instantiation_benchmark.py --case simple-classic --cores 16 \
+    [--profile]
+python3 gem5_instantiation_benchmark.py --gem5 <gem5 binary> \
+    --cases simple-classic simple-mesi --cores 1 4 16 64 256 \
+    [--repeat <N>] [--csv <results.csv>] [--baseline <results.csv>]
+```
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+CASES = [
+    "none",
+    "test-classic",
+    "test-mesi",
+    "simple-nocache",
+    "simple-classic",
+    "simple-mesi",
+    "x86-mesi-switchable",
+]
+
+PHASES = [
+    "import_objects",
+    "construct",
+    "incorporate_cache",
+    "incorporate_processor",
+    "incorporate_memory",
+    "pre_instantiate",
+    "instantiate",
+    "config_ini",
+    "config_json",
+]
+
+# The phases which do not overlap. Their sum is the setup time.
+TOP_PHASES = [
+    "import_objects",
+    "construct",
+    "pre_instantiate",
+    "instantiate",
+    "config_ini",
+    "config_json",
+]
+
+# The times measured around each gem5 process by the host.
+PROCESS_TIMES = ["process", "startup"]
+
+# The columns printed as the benchmark runs.
+SUMMARY_COLUMNS = ["case", "cores", "objects", "setup"] + PROCESS_TIMES
+
+RESULT_FILE = "instantiation.json"
+
+
+def _classic_hierarchy():
+    from gem5.components.cachehierarchies.classic.\
+        private_l1_private_l2_cache_hierarchy import (
+            PrivateL1PrivateL2CacheHierarchy,
+        )
+
+    return PrivateL1PrivateL2CacheHierarchy(
+        l1d_size="32KiB", l1i_size="32KiB", l2_size="256KiB"
+    )
+
+
+def _mesi_hierarchy():
+    from gem5.components.cachehierarchies.ruby.\
+        mesi_two_level_cache_hierarchy import (
+            MESITwoLevelCacheHierarchy,
+        )
+
+    return MESITwoLevelCacheHierarchy(
+        l1d_size="32KiB",
+        l1d_assoc=8,
+        l1i_size="32KiB",
+        l1i_assoc=8,
+        l2_size="256KiB",
+        l2_assoc=16,
+        num_l2_banks=2,
+    )
+
+
+def _no_cache():
+    from gem5.components.cachehierarchies.classic.no_cache import NoCache
+
+    return NoCache()
+
+
+def _set_hello_workload(board) -> None:
+    from gem5.isas import ISA
+    from gem5.resources.resource import Resource
+    from gem5.runtime import get_runtime_isa
+
+    binaries = {
+        ISA.X86: "x86-hello64-static",
+        ISA.ARM: "arm-hello64-static",
+        ISA.RISCV: "riscv-hello",
+    }
+    board.set_se_binary_workload(Resource(binaries[get_runtime_isa()]))
+
+
+def build_components(case: str, cores: int) -> Dict[str, Any]:
+    """
+    Build the components of a board for one of the `CASES`.
+
+    :returns: The keyword arguments of the board, with the board class in
+    `board` and the function setting its workload, if any, in `workload`.
+    """
+    from gem5.components.memory import SingleChannelDDR3_1600
+
+    kind, hierarchy = case.split("-", 1)
+    if kind == "test":
+        from gem5.components.boards.test_board import TestBoard
+        from gem5.components.processors.linear_generator import (
+            LinearGenerator,
+        )
+
+        memory = SingleChannelDDR3_1600()
+        return {
+            "board": TestBoard,
+            "workload": None,
+            "processor": LinearGenerator(
+                num_cores=cores, max_addr=memory.get_size()
+            ),
+            "memory": memory,
+            "cache_hierarchy": (
+                _classic_hierarchy()
+                if hierarchy == "classic"
+                else _mesi_hierarchy()
+            ),
+        }
+    if kind == "simple":
+        from gem5.components.boards.simple_board import SimpleBoard
+        from gem5.components.processors.cpu_types import CPUTypes
+        from gem5.components.processors.simple_processor import (
+            SimpleProcessor,
+        )
+
+        hierarchies = {
+            "nocache": _no_cache,
+            "classic": _classic_hierarchy,
+            "mesi": _mesi_hierarchy,
+        }
+        return {
+            "board": SimpleBoard,
+            "workload": _set_hello_workload,
+            "processor": SimpleProcessor(
+                cpu_type=CPUTypes.TIMING, num_cores=cores
+            ),
+            "memory": SingleChannelDDR3_1600(),
+            "cache_hierarchy": hierarchies[hierarchy](),
+        }
+    if case == "x86-mesi-switchable":
+        from gem5.components.boards.x86_board import X86Board
+        from gem5.components.processors.cpu_types import CPUTypes
+        from gem5.components.processors.simple_switchable_processor import (
+            SimpleSwitchableProcessor,
+        )
+
+        # The X86Board only supports up to 3GiB of memory.
+        return {
+            "board": X86Board,
+            "workload": None,
+            "processor": SimpleSwitchableProcessor(
+                starting_core_type=CPUTypes.TIMING,
+                switch_core_type=CPUTypes.O3,
+                num_cores=cores,
+            ),
+            "memory": SingleChannelDDR3_1600("2GiB"),
+            "cache_hierarchy": _mesi_hierarchy(),
+        }
+    raise ValueError(f"Unknown case '{case}'.")
+
+
+def _time_method(
+    cls: type, name: str, timings: Dict[str, float], phase: str
+) -> None:
+    """
+    Add the time spent in `cls.name` to `timings[phase]`. Methods may be set
+    on SimObject classes, unlike other attributes.
+    """
+    method = getattr(cls, name)
+
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            timings[phase] += time.perf_counter() - start
+
+    setattr(cls, name, timed)
+
+
+def run_case(case: str, cores: int, outdir: str) -> Dict[str, Any]:
+    """
+    Set up one of the `CASES` with `cores` cores and time each phase. Only
+    one case can be run per gem5 process.
+    """
+    import sys
+
+    import m5
+
+    timings = {phase: 0.0 for phase in PHASES}
+
+    preloaded = sum(
+        1 for name in sys.modules if name.startswith("m5.objects.")
+    )
+    start = time.perf_counter()
+    import m5.objects
+
+    # What `import *` does once the module is imported.
+    dict(vars(m5.objects))
+    timings["import_objects"] = time.perf_counter() - start
+    if case == "none":
+        return {
+            "case": case,
+            "cores": cores,
+            "objects": 0,
+            "preloaded": preloaded,
+            "setup": timings["import_objects"],
+            **timings,
+        }
+
+    from m5.objects import Root
+
+    start = time.perf_counter()
+    components = build_components(case, cores)
+    board_class = components.pop("board")
+    set_workload = components.pop("workload")
+    for key, name in (
+        ("cache_hierarchy", "incorporate_cache"),
+        ("processor", "incorporate_processor"),
+        ("memory", "incorporate_memory"),
+    ):
+        _time_method(type(components[key]), name, timings, name)
+    board = board_class(clk_freq="3GHz", **components)
+    if set_workload is not None:
+        set_workload(board)
+    timings["construct"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if hasattr(board, "_pre_instantiate"):
+        board._pre_instantiate()
+    root = Root(full_system=board.is_fullsystem(), board=board)
+    timings["pre_instantiate"] = time.perf_counter() - start
+
+    # The config files are written below, so that they are timed apart.
+    m5.options.dump_config = False
+    m5.options.json_config = False
+    start = time.perf_counter()
+    m5.instantiate()
+    timings["instantiate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(os.path.join(outdir, "config.ini"), "w") as f:
+        for obj in sorted(root.descendants(), key=lambda obj: obj.path()):
+            obj.print_ini(f)
+    timings["config_ini"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(os.path.join(outdir, "config.json"), "w") as f:
+        json.dump(root.get_config_as_dict(), f, indent=4)
+    timings["config_json"] = time.perf_counter() - start
+
+    return {
+        "case": case,
+        "cores": cores,
+        "objects": sum(1 for _ in root.descendants()),
+        "preloaded": preloaded,
+        "setup": sum(timings[phase] for phase in TOP_PHASES),
+        **timings,
+    }
+
+
+def _profiled(
+    function: Callable[[], Dict[str, Any]], outdir: str
+) -> Dict[str, Any]:
+    import cProfile
+    import pstats
+
+    profile = cProfile.Profile()
+    result = profile.runcall(function)
+    profile.dump_stats(os.path.join(outdir, "instantiation.prof"))
+    with open(os.path.join(outdir, "instantiation-profile.txt"), "w") as f:
+        stats = pstats.Stats(profile, stream=f)
+        stats.sort_stats("cumulative").print_stats(40)
+    return result
+
+
+def _format_row(row: Dict[str, Any], columns: List[str]) -> str:
+    cells = []
+    for column in columns:
+        value = row[column]
+        if isinstance(value, float):
+            cells.append(f"{value:>12.3f}")
+        elif isinstance(value, int):
+            cells.append(f"{value:>12}")
+        else:
+            cells.append(f"{value:<20}")
+    return "".join(cells)
+
+
+def _format_header(columns: List[str]) -> str:
+    return "".join(
+        f"{column:<20}" if column == "case" else f"{column:>12}"
+        for column in columns
+    )
+
+
+def run_benchmark(
+    gem5: str,
+    cases: List[str],
+    cores: List[int],
+    outdir: str,
+    repeat: int = 1,
+    profile: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Run gem5 once per case, number of cores and repetition, one at a time so
+    that the runs do not slow each other down.
+
+    :returns: One row per case and number of cores, with the median time of
+    each phase over the repetitions.
+    """
+    import statistics
+
+    from util.sweep import point_name, run_point
+
+    script = os.path.abspath(__file__)
+    rows = []
+    for case in cases:
+        # Without a board, the number of cores makes no difference.
+        for count in cores[:1] if case == "none" else cores:
+            runs = []
+            for index in range(repeat):
+                point = {"case": case, "cores": count, "repeat": index}
+                point_dir = os.path.join(outdir, point_name(point))
+                command = [
+                    gem5,
+                    f"--outdir={point_dir}",
+                    script,
+                    f"--case={case}",
+                    f"--cores={count}",
+                ] + (["--profile"] if profile else [])
+                start = time.perf_counter()
+                exit_code = run_point(command, point_dir)
+                process = time.perf_counter() - start
+                result_file = os.path.join(point_dir, RESULT_FILE)
+                if exit_code != 0 or not os.path.exists(result_file):
+                    print(
+                        f"{case} with {count} cores failed, see "
+                        f"{os.path.join(point_dir, 'sweep.log')}."
+                    )
+                    break
+                with open(result_file) as f:
+                    run = json.load(f)
+                run["process"] = process
+                run["startup"] = process - run["setup"]
+                runs.append(run)
+            if not runs:
+                continue
+            row = dict(runs[0])
+            for key in ["setup"] + PHASES + PROCESS_TIMES:
+                row[key] = statistics.median(run[key] for run in runs)
+            rows.append(row)
+            print(_format_row(row, SUMMARY_COLUMNS))
+    return rows
+
+
+def compare(
+    rows: List[Dict[str, Any]], baseline: str, tolerance: float
+) -> List[str]:
+    """
+    Compare the setup times of `rows` with those of a CSV file written by an
+    earlier run.
+
+    :param tolerance: The relative slowdown of a phase reported as a
+    regression.
+
+    :returns: A description of each regression.
+    """
+    import csv
+
+    with open(baseline, newline="") as f:
+        previous = {
+            (row["case"], int(row["cores"])): row for row in csv.DictReader(f)
+        }
+    regressions = []
+    for row in rows:
+        old = previous.get((row["case"], row["cores"]))
+        if old is None:
+            continue
+        for phase in ["setup"] + PHASES + PROCESS_TIMES:
+            if phase not in old:
+                continue
+            before = float(old[phase])
+            # Phases this short are dominated by noise.
+            if before > 0.01 and row[phase] > before * (1 + tolerance):
+                regressions.append(
+                    f"{row['case']} with {row['cores']} cores: {phase} took "
+                    f"{row[phase]:.3f}s, {before:.3f}s before."
+                )
+    return regressions
+
+
+if __name__ == "__m5_main__":
+    import m5
+
+    parser = argparse.ArgumentParser(
+        description="Time the setup of a stdlib board."
+    )
+    parser.add_argument("--case", type=str, required=True, choices=CASES)
+    parser.add_argument(
+        "--cores", type=int, default=1, help="The number of cores."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the setup with cProfile.",
+    )
+    args = parser.parse_args()
+
+    outdir = m5.options.outdir
+
+    def run():
+        return run_case(args.case, args.cores, outdir)
+
+    result = _profiled(run, outdir) if args.profile else run()
+    with open(os.path.join(outdir, RESULT_FILE), "w") as f:
+        json.dump(result, f, indent=4)
+    columns = ["case", "cores", "objects"] + TOP_PHASES
+    print(_format_header(columns))
+    print(_format_row(result, columns))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the setup of stdlib boards with a gem5 binary."
+    )
+    parser.add_argument(
+        "--gem5", type=str, required=True, help="The gem5 binary."
+    )
+    parser.add_argument(
+        "--cases",
+        type=str,
+        nargs="+",
+        default=["none", "test-classic", "test-mesi"],
+        choices=CASES,
+        help="The boards to set up.",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 64, 256],
+        help="The numbers of cores to set the boards up with.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="The number of runs of each point. The median is reported.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each run with cProfile.",
+    )
+    parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="instantiation-benchmark",
+        help="The directory the runs are made in.",
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        help="Write the results to this CSV file. Defaults to results.csv "
+        "in the output directory.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        help="A CSV file written by an earlier run to compare with.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="The relative slowdown reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    from util.sweep import write_table
+
+    print(_format_header(SUMMARY_COLUMNS))
+    rows = run_benchmark(
+        args.gem5,
+        args.cases,
+        args.cores,
+        args.outdir,
+        args.repeat,
+        args.profile,
+    )
+    table = args.csv or os.path.join(args.outdir, "results.csv")
+    write_table(rows, table)
+    print(f"Results written to {table}.")
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            exit(1)
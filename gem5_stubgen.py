@@ -24,17 +24,307 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+
+"""
+Generate type stubs for the Python modules embedded in a gem5 binary, for
+editors and mypy.
+
+The stubs of each module are cached, keyed by the digest of the module's
+compiled code and the version of mypy, so after a rebuild of gem5 only the
+modules which changed are passed to stubgen again, several at a time. The
+cache also keeps the list of modules of each gem5 build it has seen, and the
+stubs written to the output directory are only rewritten when they change,
+so editors do not re-index the unchanged ones.
+
+Usage:
+------
+
+```
+gem5 gem5_stubgen.py [-o <out>] [--cache <dir>] [--jobs <N>] [--force]
+```
+"""
+
+import argparse
+import hashlib
+import json
+import marshal
+import multiprocessing
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
 from mypy.stubgen import generate_stubs, parse_options
+from mypy.version import __version__ as mypy_version
 
+DEFAULT_CACHE = os.path.join(
+    os.path.expanduser("~"), ".cache", "gem5-stubgen"
+)
 
-if __name__ == "__m5_main__":
+# The file in the output directory listing the stubs written there.
+MANIFEST = ".stubgen-manifest.json"
+
+
+def embedded_modules() -> Dict[str, Tuple[str, object]]:
+    """
+    The modules embedded in the gem5 binary, as (path, code object) by name.
+    """
     import m5
 
-    # get a list of all modules exported by gem5
-    modules = m5.__spec__.loader_state
+    for finder in sys.meta_path:
+        modules = getattr(finder, "modules", None)
+        if isinstance(modules, dict):
+            return dict(modules)
+    # Fall back to the loader of each module.
+    import importlib.util
+
+    found = {}
+    for name in m5.__spec__.loader_state:
+        spec = importlib.util.find_spec(name)
+        found[name] = (spec.origin or "", spec.loader.code)
+    return found
+
+
+def module_digest(code: object) -> str:
+    """
+    The digest of a module's compiled code, with the version of mypy, which
+    the stubs also depend on.
+    """
+    digest = hashlib.sha256(marshal.dumps(code))
+    digest.update(mypy_version.encode())
+    return digest.hexdigest()
+
+
+def build_id() -> str:
+    """
+    An identifier of the running gem5 binary: its path, size and
+    modification time.
+    """
+    path = os.path.realpath("/proc/self/exe")
+    if not os.path.exists(path):
+        path = os.path.realpath(sys.executable)
+    stat = os.stat(path)
+    key = f"{path}\n{stat.st_size}\n{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def stub_path(name: str, is_package: bool) -> str:
+    """
+    The path of the stub of a module, relative to the output directory.
+    """
+    parts = name.split(".")
+    if is_package:
+        return os.path.join(*parts, "__init__.pyi")
+    return os.path.join(*parts) + ".pyi"
+
+
+def _generate(
+    modules: List[Tuple[str, bool]]
+) -> Dict[str, Optional[str]]:
+    """
+    Run stubgen on some modules.
+
+    :param modules: The name of each module and whether it is a package.
+    :returns: The stub of each module, or None if stubgen wrote none. The
+    modules stubgen failed on are left out.
+    """
+    with tempfile.TemporaryDirectory() as outdir:
+        args = ["-o", outdir, "--quiet"]
+        for name, _ in modules:
+            args += ["-m", name]
+        try:
+            generate_stubs(parse_options(args))
+        except (Exception, SystemExit) as error:
+            if len(modules) == 1:
+                print(f"stubgen failed on {modules[0][0]}: {error}")
+                return {}
+            # Find the modules which fail by halves.
+            half = len(modules) // 2
+            return {**_generate(modules[:half]), **_generate(modules[half:])}
+        stubs = {}
+        for name, is_package in modules:
+            path = os.path.join(outdir, stub_path(name, is_package))
+            if os.path.exists(path):
+                with open(path) as f:
+                    stubs[name] = f.read()
+            else:
+                stubs[name] = None
+        return stubs
+
+
+class StubCache:
+    def __init__(self, root: str) -> None:
+        self.root = root
+        for directory in ("stubs", "builds"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _stub_file(self, digest: str) -> str:
+        return os.path.join(self.root, "stubs", f"{digest}.json")
+
+    def _write_atomic(self, path: str, data: str) -> None:
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, digest: str) -> Tuple[bool, Optional[str]]:
+        """
+        :returns: Whether the stub of a module is cached, and the stub.
+        """
+        try:
+            with open(self._stub_file(digest)) as f:
+                return True, json.load(f)["stub"]
+        except (OSError, ValueError):
+            return False, None
+
+    def put(self, digest: str, stub: Optional[str]) -> None:
+        self._write_atomic(self._stub_file(digest), json.dumps({"stub": stub}))
+
+    def put_build(self, build: str, digests: Dict[str, str]) -> None:
+        """
+        Record the module digests of a gem5 build.
+        """
+        self._write_atomic(
+            os.path.join(self.root, "builds", f"{build}.json"),
+            json.dumps(digests, indent=4, sort_keys=True),
+        )
+
+
+def _generate_into(
+    modules: List[Tuple[str, bool]], digests: Dict[str, str], cache: StubCache
+) -> None:
+    for name, stub in _generate(modules).items():
+        cache.put(digests[name], stub)
+
+
+def _chunks(items: List, count: int) -> List[List]:
+    return [items[i::count] for i in range(count) if items[i::count]]
+
+
+def update_stubs(
+    outdir: str, cache: StubCache, jobs: int, force: bool = False
+) -> Tuple[int, int]:
+    """
+    Bring the stubs in `outdir` up to date with the running gem5 binary.
+
+    :param force: Regenerate every stub, ignoring the cache.
+    :returns: The number of modules passed to stubgen and the number of
+    stub files written.
+    """
+    modules = embedded_modules()
+    digests = {
+        name: module_digest(code) for name, (_, code) in modules.items()
+    }
+    packages = {
+        name: os.path.basename(path) == "__init__.py"
+        for name, (path, _) in modules.items()
+    }
+
+    stubs = {}
+    missing = []
+    for name in sorted(modules):
+        found, stub = (False, None) if force else cache.get(digests[name])
+        if found:
+            stubs[name] = stub
+        else:
+            missing.append(name)
+
+    if missing:
+        # The workers are forked, so they share the embedded modules, and
+        # store the stubs in the cache themselves: gem5 runs this script as
+        # `__m5_main__`, whose functions cannot be pickled for a Pool.
+        context = multiprocessing.get_context("fork")
+        workers = []
+        for chunk in _chunks(missing, jobs):
+            chunk_modules = [(name, packages[name]) for name in chunk]
+            workers.append(
+                context.Process(
+                    target=_generate_into,
+                    args=(chunk_modules, digests, cache),
+                )
+            )
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        for name in missing:
+            found, stub = cache.get(digests[name])
+            if found:
+                stubs[name] = stub
+    cache.put_build(build_id(), digests)
+
+    manifest_file = os.path.join(outdir, MANIFEST)
+    try:
+        with open(manifest_file) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    written = 0
+    current = {}
+    for name, stub in stubs.items():
+        if stub is None:
+            continue
+        path = stub_path(name, packages[name])
+        current[path] = digests[name]
+        target = os.path.join(outdir, path)
+        if previous.get(path) == digests[name] and os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w") as f:
+            f.write(stub)
+        written += 1
+    # Remove the stubs of the modules this build no longer has.
+    for path in set(previous) - set(current):
+        target = os.path.join(outdir, path)
+        if os.path.exists(target):
+            os.remove(target)
+
+    os.makedirs(outdir, exist_ok=True)
+    with open(manifest_file, "w") as f:
+        json.dump(current, f, indent=4, sort_keys=True)
+    return len(missing), written
+
+
+if __name__ == "__m5_main__":
+    parser = argparse.ArgumentParser(
+        description="Generate type stubs for the modules of a gem5 binary."
+    )
+    parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="out",
+        help="The directory the stubs are written to.",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=DEFAULT_CACHE,
+        help="The directory of the stub cache.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="The number of stubgen processes. Defaults to the number of "
+        "host cores.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate every stub, ignoring the cache.",
+    )
+    args = parser.parse_args()
 
-    options = parse_options(("-m " + " -m ".join(modules)).split(" "))
-    generate_stubs(options)
+    generated, written = update_stubs(
+        args.outdir, StubCache(args.cache), args.jobs, args.force
+    )
+    print(
+        f"Generated the stubs of {generated} modules, wrote {written} "
+        f"stub files to {args.outdir}."
+    )
 
 if __name__ == "__main__":
     print("Error: This script is meant to be run with the gem5 binary")
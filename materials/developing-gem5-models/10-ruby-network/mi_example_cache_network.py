@@ -27,9 +27,7 @@
 from .caches.mi_example.l1_cache import L1Cache
 from .caches.mi_example.dma_controller import DMAController
 from .caches.mi_example.directory import Directory
-from .topologies.garnet_mesh import GarnetMesh
-from .topologies.garnet_pt2pt import GarnetPt2Pt
-from .topologies.simple_pt2pt import SimplePt2Pt
+from .topologies.registry import create_network
 from .abstract_ruby_cache_hierarchy import AbstractRubyCacheHierarchy
 from ..abstract_cache_hierarchy import AbstractCacheHierarchy
 from ...boards.abstract_board import AbstractBoard
@@ -38,6 +36,7 @@ from ....isas import ISA
 from ....utils.override import overrides
 from ....utils.requires import requires
 
+from typing import Any, Dict, Optional
 
 from m5.objects import (
     RubySystem,
@@ -58,16 +57,22 @@ class MIExampleCacheNetwork(AbstractRubyCacheHierarchy):
         size: str,
         assoc: str,
         network = str,
+        network_options: Optional[Dict[str, Any]] = None,
     ):
         """
         :param size: The size of each cache in the heirarchy.
         :param assoc: The associativity of each cache.
+        :param network: The name of the network, as registered in
+        `topologies.registry`.
+        :param network_options: The keyword arguments of the network, e.g.
+        the rows, columns and placement policies of a GarnetMesh.
         """
         super().__init__()
 
         self._size = size
         self._assoc = assoc
         self._network = network
+        self._network_options = network_options or {}
     @overrides(AbstractCacheHierarchy)
     def incorporate_cache(self, board: AbstractBoard) -> None:
 
@@ -76,14 +81,9 @@ class MIExampleCacheNetwork(AbstractRubyCacheHierarchy):
         self.ruby_system = RubySystem()
 
         # Ruby's global network.
-        if self._network == 'SimplePt2Pt': 
-            self.ruby_system.network = SimplePt2Pt(self.ruby_system)
-        elif self._network == 'GarnetPt2Pt':
-            self.ruby_system.network = GarnetPt2Pt(self.ruby_system)
-        elif self._network == 'GarnetMesh':
-            self.ruby_system.network = GarnetMesh(self.ruby_system)
-        else:
-            raise ValueError(f"network {self._network} is not implemented.")
+        self.ruby_system.network = create_network(
+            self._network, self.ruby_system, **self._network_options
+        )
 
         # MI Example users 5 virtual networks.
         self.ruby_system.number_of_virtual_networks = 5
@@ -173,20 +173,13 @@ class MIExampleCacheNetwork(AbstractRubyCacheHierarchy):
         if len(self._dma_controllers) != 0:
             self.ruby_system.dma_controllers = self._dma_controllers
 
-        if (self._network == 'GarnetMesh'):
-            self.ruby_system.network.connectControllers(
-                self._controllers
-                + self._directory_controllers
-                + self._dma_controllers,
-                len(self._controllers)
-            )
-        else:
-            self.ruby_system.network.connectControllers(
-                self._controllers
-                + self._directory_controllers
-                + self._dma_controllers
-            )
-        if (self._network == 'SimplePt2Pt'):
+        self.ruby_system.network.connectControllers(
+            self._controllers
+            + self._directory_controllers
+            + self._dma_controllers
+        )
+        # The simple network needs its buffers set up once it is connected.
+        if hasattr(self.ruby_system.network, "setup_buffers"):
             self.ruby_system.network.setup_buffers()
 
         # Set up a proxy port for the system_port. Used for load binaries and
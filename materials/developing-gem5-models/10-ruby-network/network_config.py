@@ -31,8 +31,15 @@ from m5.objects import Root
 from gem5.components.boards.test_board import TestBoard
 from gem5.components.cachehierarchies.ruby.mi_example_cache_network import \
             MIExampleCacheNetwork
+from gem5.components.cachehierarchies.ruby.topologies.garnet_topology import \
+            GarnetTopology
+from gem5.components.cachehierarchies.ruby.topologies.registry import \
+            NETWORKS
 from gem5.components.processors.linear_generator import LinearGenerator
+from gem5.components.processors.random_generator import RandomGenerator
 from gem5.components.memory import SingleChannelDDR3_1600
+from gem5.components.memory.memory import ChanneledMemory
+from m5.objects import DDR3_1600_8x8
 
 parser = argparse.ArgumentParser(
     description="A traffic generator that can be used to test a gem5 "
@@ -47,7 +54,85 @@ parser.add_argument(
     "network_class",
     type=str,
     help="The cache class to import and instantiate.",
-    choices=["GarnetPt2Pt", "SimplePt2Pt", "GarnetMesh"],
+    choices=sorted(NETWORKS),
+)
+parser.add_argument(
+    "--generator",
+    type=str,
+    default="linear",
+    choices=["linear", "random"],
+    help="Whether the cores access memory linearly or randomly.",
+)
+parser.add_argument(
+    "--rate",
+    type=str,
+    default="40GB/s",
+    help="The rate at which each generator core injects requests.",
+)
+parser.add_argument(
+    "--duration",
+    type=str,
+    default="250us",
+    help="How long the generator cores inject requests for.",
+)
+parser.add_argument(
+    "--memory-channels",
+    type=int,
+    default=1,
+    help="The number of DDR3 channels, each with its own directory. More "
+    "directories spread the traffic over the network instead of "
+    "measuring the bandwidth of a single directory.",
+)
+parser.add_argument(
+    "--mesh-rows",
+    type=int,
+    help="The rows of a mesh, torus, flattened butterfly or clustered "
+    "mesh. Defaults to the squarest grid with one router per core (or per "
+    "cluster).",
+)
+parser.add_argument(
+    "--mesh-cols", type=int, help="The columns of the grid, as above."
+)
+parser.add_argument(
+    "--cluster-size",
+    type=int,
+    help="The number of cores per router of a clustered mesh.",
+)
+parser.add_argument(
+    "--directory-placement",
+    type=str,
+    default="spread",
+    help="Where a Garnet topology places the directories: corner, edge, "
+    "diagonal, spread, or a comma-separated list of router ids.",
+)
+parser.add_argument(
+    "--dma-placement",
+    type=str,
+    default="corner",
+    help="Where a Garnet topology places the DMA controllers, as above.",
+)
+parser.add_argument(
+    "--link-latency",
+    type=int,
+    default=8,
+    help="The latency of the links of a Garnet topology, in cycles.",
+)
+parser.add_argument(
+    "--router-latency",
+    type=int,
+    default=1,
+    help="The latency of the routers of a Garnet topology, in cycles.",
+)
+parser.add_argument(
+    "--link-width",
+    type=int,
+    help="The width of the links of a Garnet topology, in bits.",
+)
+parser.add_argument(
+    "--check-routes",
+    action="store_true",
+    help="Check that the routes of a Garnet topology cannot deadlock "
+    "before simulating it.",
 )
 parser.add_argument(
     "mem_args",
@@ -55,20 +140,60 @@ parser.add_argument(
     help="The arguments needed to instantiate the memory class.",
 )
 
+def placement(policy):
+    # An explicit placement is a list of router ids.
+    if policy[0].isdigit():
+        return [int(router) for router in policy.split(",")]
+    return policy
+
+def layout_options():
+    # The options of the layout, which only some layouts take.
+    return [
+        ("--mesh-rows", "num_rows", args.mesh_rows),
+        ("--mesh-cols", "num_cols", args.mesh_cols),
+        ("--cluster-size", "cluster_size", args.cluster_size),
+    ]
+
 def cache_factory():
+    network_options = None
+    if issubclass(NETWORKS[args.network_class], GarnetTopology):
+        network_options = {
+            "directory_placement": placement(args.directory_placement),
+            "dma_placement": placement(args.dma_placement),
+            "link_latency": args.link_latency,
+            "router_latency": args.router_latency,
+            "link_width": args.link_width,
+            "check_routes": args.check_routes,
+        }
+        for _, name, value in layout_options():
+            if value is not None:
+                network_options[name] = value
     return MIExampleCacheNetwork(
         size="32kB", 
         assoc=8,
-        network=args.network_class)
+        network=args.network_class,
+        network_options=network_options)
 
 
 
 args = parser.parse_args()
+if issubclass(NETWORKS[args.network_class], GarnetTopology):
+    parameters = NETWORKS[args.network_class].layout_parameters()
+    for option, name, value in layout_options():
+        if value is not None and name not in parameters:
+            parser.error(f"{args.network_class} does not take {option}.")
 cache_hierarchy = cache_factory()
-memory = SingleChannelDDR3_1600(*args.mem_args)
-generator = LinearGenerator(
-            duration="250us",
-            rate="40GB/s",
+if args.memory_channels > 1:
+    memory = ChanneledMemory(
+        DDR3_1600_8x8, args.memory_channels, 64, *args.mem_args
+    )
+else:
+    memory = SingleChannelDDR3_1600(*args.mem_args)
+generator_class = LinearGenerator if args.generator == "linear" else \
+            RandomGenerator
+generator = generator_class(
+            duration=args.duration,
+            rate=args.rate,
             num_cores=args.generator_cores,
             max_addr=memory.get_size(),
         )
@@ -0,0 +1,205 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import inspect
+from typing import Any, List, Optional, Sequence, Union
+
+from m5.objects import (
+    GarnetNetwork,
+    GarnetExtLink,
+    GarnetIntLink,
+    GarnetRouter,
+    GarnetNetworkInterface,
+)
+
+from ..caches.abstract_directory import AbstractDirectory
+from ..caches.abstract_dma_controller import AbstractDMAController
+from ..caches.abstract_l1_cache import AbstractL1Cache
+from .layouts import LAYOUTS, Layout
+from .routing import check_deadlock
+
+
+class GarnetTopology(GarnetNetwork):
+    """
+    A Garnet network built from one of the router graphs of `layouts`.
+
+    The L1 caches are attached to the routers of the layout in turn. The
+    directory and DMA controllers are placed by their own placement policy
+    (see `layouts.mesh_placement`), so they are not all piled on one router.
+
+    Subclasses set `_layout_name`, and `_check_routes` if the routes of
+    their layout must always be checked. The keyword arguments which are not
+    listed below are given to the layout function, e.g. `num_rows` and
+    `num_cols` for a mesh.
+    """
+
+    _layout_name = None
+    _check_routes = False
+
+    def __init__(
+        self,
+        ruby_system,
+        directory_placement: Union[str, Sequence[int]] = "spread",
+        dma_placement: Union[str, Sequence[int]] = "corner",
+        link_latency: int = 8,
+        router_latency: int = 1,
+        link_width: Optional[int] = None,
+        check_routes: bool = False,
+        **layout_options: Any,
+    ):
+        """
+        :param directory_placement: The placement of the directories.
+        :param dma_placement: The placement of the DMA controllers.
+        :param link_latency: The latency of every link, in cycles.
+        :param router_latency: The pipeline latency of every router, in
+        cycles.
+        :param link_width: The width of every link, in bits. Defaults to
+        Garnet's flit size.
+        :param check_routes: Compute the routing tables Garnet will use
+        when the controllers are connected, and raise a ValueError if they
+        can deadlock. Layouts with wraparound links are always checked.
+        """
+        super().__init__()
+        self.ruby_system = ruby_system
+
+        self._directory_placement = directory_placement
+        self._dma_placement = dma_placement
+        self._link_latency = link_latency
+        self._router_latency = router_latency
+        self._layout_options = layout_options
+        self._check_routes = check_routes or self._check_routes
+        if link_width is not None:
+            if link_width % 8:
+                raise ValueError("The link width must be a multiple of 8.")
+            self.ni_flit_size = link_width // 8
+
+    @classmethod
+    def layout_parameters(cls) -> List[str]:
+        """
+        The keyword arguments the layout of this topology takes.
+        """
+        parameters = inspect.signature(LAYOUTS[cls._layout_name]).parameters
+        return list(parameters)[1:]
+
+    def layout(self, num_caches: int) -> Layout:
+        """
+        The router graph for `num_caches` L1 caches.
+        """
+        return LAYOUTS[self._layout_name](num_caches, **self._layout_options)
+
+    def connectControllers(self, controllers):
+        caches = [c for c in controllers if isinstance(c, AbstractL1Cache)]
+        directories = [
+            c for c in controllers if isinstance(c, AbstractDirectory)
+        ]
+        dmas = [c for c in controllers if isinstance(c, AbstractDMAController)]
+        others = [
+            c
+            for c in controllers
+            if c not in caches and c not in directories and c not in dmas
+        ]
+        if others:
+            raise ValueError(
+                f"Cannot place the controllers {others} on the network."
+            )
+
+        layout = self.layout(len(caches))
+        if self._check_routes:
+            # Garnet routes by the weights of the links, so this is caught
+            # here rather than by a hung simulation.
+            check_deadlock(layout, "weighted")
+        self.routers = [
+            GarnetRouter(router_id=i, latency=self._router_latency)
+            for i in range(layout.num_routers)
+        ]
+
+        placement = [
+            (c, layout.cache_router(i)) for i, c in enumerate(caches)
+        ]
+        placement += zip(
+            directories,
+            layout.place(self._directory_placement, len(directories)),
+        )
+        placement += zip(dmas, layout.place(self._dma_placement, len(dmas)))
+
+        # link counter to set unique link ids
+        link_count = 0
+
+        ext_links = []
+        for cntrl, router_id in placement:
+            ext_links.append(
+                GarnetExtLink(
+                    link_id=link_count,
+                    ext_node=cntrl,
+                    int_node=self.routers[router_id],
+                    latency=self._link_latency,
+                )
+            )
+            link_count += 1
+        self.ext_links = ext_links
+
+        self.netifs = [
+            GarnetNetworkInterface(id=i) for i in range(len(self.ext_links))
+        ]
+
+        int_links = []
+        for link in layout.links:
+            int_links.append(
+                GarnetIntLink(
+                    link_id=link_count,
+                    src_node=self.routers[link.src],
+                    dst_node=self.routers[link.dst],
+                    src_outport=link.src_outport,
+                    dst_inport=link.dst_inport,
+                    latency=self._link_latency,
+                    weight=link.weight,
+                )
+            )
+            link_count += 1
+        self.int_links = int_links
+
+
+class GarnetTorus(GarnetTopology):
+    _layout_name = "torus"
+    _check_routes = True
+
+
+class GarnetRing(GarnetTopology):
+    _layout_name = "ring"
+    _check_routes = True
+
+
+class GarnetFlattenedButterfly(GarnetTopology):
+    _layout_name = "flattened_butterfly"
+
+
+class GarnetCrossbar(GarnetTopology):
+    _layout_name = "crossbar"
+
+
+class GarnetClusteredMesh(GarnetTopology):
+    _layout_name = "clustered_mesh"
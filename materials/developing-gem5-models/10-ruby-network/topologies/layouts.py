@@ -0,0 +1,378 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+The router graphs of the Garnet topologies in this package.
+
+This module does not import m5, so the graphs can be built and inspected
+(e.g. to check their routes or estimate their latency) without gem5. A
+`Layout` gives the routers, the links between them and where the L1 caches
+attach. The routers are laid out on a `num_rows` x `num_cols` grid, which
+the placement policies of the directory and DMA controllers use.
+"""
+
+import math
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# A unidirectional link between two routers. Links with a lower weight are
+# preferred by the routing tables.
+Link = namedtuple(
+    "Link", ["src", "dst", "src_outport", "dst_inport", "weight"]
+)
+
+# The placement policies of the directory and DMA controllers.
+PLACEMENTS = ["corner", "edge", "diagonal", "spread"]
+
+
+def mesh_shape(
+    num_routers: int,
+    num_rows: Optional[int] = None,
+    num_cols: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    The rows and columns of a mesh. If neither is given, the mesh of
+    `num_routers` routers closest to a square is used. If one is given, the
+    other is the smallest which fits `num_routers` routers.
+    """
+    if num_rows is None and num_cols is None:
+        num_rows = max(
+            d
+            for d in range(1, int(math.isqrt(num_routers)) + 1)
+            if num_routers % d == 0
+        )
+    if num_cols is None:
+        num_cols = -(-num_routers // num_rows)
+    if num_rows is None:
+        num_rows = -(-num_routers // num_cols)
+    if num_rows <= 0 or num_cols <= 0:
+        raise ValueError("A mesh needs at least one row and one column.")
+    return num_rows, num_cols
+
+
+def mesh_placement(
+    policy: Union[str, Sequence[int]],
+    count: int,
+    num_rows: int,
+    num_cols: int,
+) -> List[int]:
+    """
+    The routers of `count` controllers placed on a mesh.
+
+    :param policy: "corner" cycles through the corners of the mesh, "edge"
+    spaces the controllers evenly around its perimeter, "diagonal" along its
+    main diagonal and "spread" as far apart from each other as possible.
+    Otherwise, the explicit list of router ids, cycled if shorter than
+    `count`.
+    """
+    num_routers = num_rows * num_cols
+    if count == 0:
+        return []
+    if not isinstance(policy, str):
+        routers = list(policy)
+        if not routers or not all(0 <= r < num_routers for r in routers):
+            raise ValueError(
+                f"Placement {routers} is not within the {num_routers} "
+                "routers of the mesh."
+            )
+        return [routers[i % len(routers)] for i in range(count)]
+
+    if policy == "corner":
+        corners = []
+        for router in [
+            0,
+            num_cols - 1,
+            (num_rows - 1) * num_cols,
+            num_routers - 1,
+        ]:
+            if router not in corners:
+                corners.append(router)
+        return [corners[i % len(corners)] for i in range(count)]
+    if policy == "edge":
+        # The perimeter, clockwise from router 0.
+        perimeter = list(range(num_cols))
+        perimeter += [r * num_cols + num_cols - 1 for r in range(1, num_rows)]
+        if num_rows > 1:
+            perimeter += [
+                (num_rows - 1) * num_cols + c
+                for c in range(num_cols - 2, -1, -1)
+            ]
+        if num_cols > 1:
+            perimeter += [r * num_cols for r in range(num_rows - 2, 0, -1)]
+        return [
+            perimeter[i * len(perimeter) // count] for i in range(count)
+        ]
+    if policy == "diagonal":
+        return [
+            int((i + 0.5) * num_rows / count) * num_cols
+            + int((i + 0.5) * num_cols / count)
+            for i in range(count)
+        ]
+    if policy == "spread":
+        # Greedily pick the router farthest from those already picked,
+        # starting from the center of the mesh.
+        def distance(a, b):
+            return abs(a // num_cols - b // num_cols) + abs(
+                a % num_cols - b % num_cols
+            )
+
+        picked = [(num_rows // 2) * num_cols + num_cols // 2]
+        while len(picked) < min(count, num_routers):
+            picked.append(
+                max(
+                    (r for r in range(num_routers) if r not in picked),
+                    key=lambda r: min(distance(r, p) for p in picked),
+                )
+            )
+        return [picked[i % len(picked)] for i in range(count)]
+    raise ValueError(
+        f"Unknown placement '{policy}'. Use one of {PLACEMENTS} or a list "
+        "of router ids."
+    )
+
+
+class Layout:
+    def __init__(
+        self,
+        name: str,
+        num_rows: int,
+        num_cols: int,
+        links: List[Link],
+        cache_routers: Optional[List[int]] = None,
+    ) -> None:
+        """
+        :param links: The links between the routers, in both directions.
+        :param cache_routers: The router of each L1 cache, cycled if there
+        are more caches. Defaults to every router in turn.
+        """
+        self.name = name
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.links = links
+        self.cache_routers = cache_routers or list(range(self.num_routers))
+
+    @property
+    def num_routers(self) -> int:
+        return self.num_rows * self.num_cols
+
+    def cache_router(self, index: int) -> int:
+        """
+        The router of the `index`th L1 cache.
+        """
+        return self.cache_routers[index % len(self.cache_routers)]
+
+    def place(
+        self, policy: Union[str, Sequence[int]], count: int
+    ) -> List[int]:
+        """
+        The routers of `count` controllers. See `mesh_placement`.
+        """
+        return mesh_placement(policy, count, self.num_rows, self.num_cols)
+
+
+def _grid_links(
+    num_rows: int, num_cols: int, wrap: bool = False
+) -> List[Link]:
+    """
+    The links between the neighbors of a grid, and between the ends of each
+    row and column if `wrap`. The East/West links have a weight of 1 and the
+    North/South ones a weight of 2, so packets travel along their row first.
+    """
+    links = []
+    directions = [
+        (0, 1, "East", "West", 1),
+        (0, -1, "West", "East", 1),
+        (1, 0, "North", "South", 2),
+        (-1, 0, "South", "North", 2),
+    ]
+    for d_row, d_col, outport, inport, weight in directions:
+        # A dimension of 2 is already connected both ways without wrapping,
+        # and a dimension of 1 has nothing to connect.
+        size = num_rows if d_row else num_cols
+        for row in range(num_rows):
+            for col in range(num_cols):
+                dst_row, dst_col = row + d_row, col + d_col
+                if wrap and size > 2:
+                    dst_row %= num_rows
+                    dst_col %= num_cols
+                if not (0 <= dst_row < num_rows and 0 <= dst_col < num_cols):
+                    continue
+                links.append(
+                    Link(
+                        row * num_cols + col,
+                        dst_row * num_cols + dst_col,
+                        outport,
+                        inport,
+                        weight,
+                    )
+                )
+    return links
+
+
+def mesh(
+    num_caches: int,
+    num_rows: Optional[int] = None,
+    num_cols: Optional[int] = None,
+) -> Layout:
+    """
+    A 2D mesh with one router per L1 cache, unless sized otherwise.
+    """
+    num_rows, num_cols = mesh_shape(num_caches, num_rows, num_cols)
+    return Layout("mesh", num_rows, num_cols, _grid_links(num_rows, num_cols))
+
+
+def _dateline_links(num_rows: int, num_cols: int) -> List[Link]:
+    """
+    The links of a grid whose rows and columns wrap around, weighted so
+    that Garnet's shortest-path routing cannot deadlock on them.
+
+    Garnet gives a packet any free virtual channel of its virtual network,
+    so the wraparound links cannot be broken into dateline classes of
+    virtual channels. Instead, the links on both sides of the first router
+    of every row and column (the dateline) are heavy enough that no route
+    runs through that router along that ring: the other way around the
+    ring is always lighter. This breaks the channel dependency cycle of
+    every ring, at the cost of longer routes for the pairs of routers on
+    either side of the dateline.
+
+    Every North/South link is also heavier than any East/West link, so each
+    router prefers the East/West links of its shortest paths and packets
+    finish their row before they turn: dimension-ordered routing, which
+    adds no cycle between the rows and the columns.
+    """
+    row_weight, col_weight = 1, num_cols + 1
+    links = []
+    for link in _grid_links(num_rows, num_cols, wrap=True):
+        if link.src_outport in ("East", "West"):
+            size, weight = num_cols, row_weight
+            positions = (link.src % num_cols, link.dst % num_cols)
+        else:
+            size, weight = num_rows, col_weight
+            positions = (link.src // num_cols, link.dst // num_cols)
+        # A ring of 2 has no route through its dateline to take.
+        if size > 2 and 0 in positions:
+            weight *= size
+        links.append(link._replace(weight=weight))
+    return links
+
+
+def torus(
+    num_caches: int,
+    num_rows: Optional[int] = None,
+    num_cols: Optional[int] = None,
+) -> Layout:
+    """
+    A 2D mesh whose rows and columns wrap around, which shortens its
+    routes. Its links are weighted with a dateline (see `_dateline_links`)
+    so that Garnet's routing cannot deadlock.
+    """
+    num_rows, num_cols = mesh_shape(num_caches, num_rows, num_cols)
+    return Layout(
+        "torus", num_rows, num_cols, _dateline_links(num_rows, num_cols)
+    )
+
+
+def ring(num_caches: int) -> Layout:
+    """
+    A bidirectional ring with one router per L1 cache. It has only 2 links
+    per router, but a diameter of half the routers. Its links are weighted
+    with a dateline (see `_dateline_links`) so that Garnet's routing cannot
+    deadlock.
+    """
+    return Layout("ring", 1, num_caches, _dateline_links(1, num_caches))
+
+
+def flattened_butterfly(
+    num_caches: int,
+    num_rows: Optional[int] = None,
+    num_cols: Optional[int] = None,
+) -> Layout:
+    """
+    A 2D flattened butterfly: a grid whose routers are directly linked to
+    every router of their row and of their column, so every route has at
+    most 2 hops.
+    """
+    num_rows, num_cols = mesh_shape(num_caches, num_rows, num_cols)
+    links = []
+    for src in range(num_rows * num_cols):
+        row, col = divmod(src, num_cols)
+        for dst_col in range(num_cols):
+            if dst_col != col:
+                outport, inport = (
+                    ("East", "West") if dst_col > col else ("West", "East")
+                )
+                links.append(
+                    Link(src, row * num_cols + dst_col, outport, inport, 1)
+                )
+        for dst_row in range(num_rows):
+            if dst_row != row:
+                outport, inport = (
+                    ("North", "South") if dst_row > row else ("South", "North")
+                )
+                links.append(
+                    Link(src, dst_row * num_cols + col, outport, inport, 2)
+                )
+    return Layout("flattened_butterfly", num_rows, num_cols, links)
+
+
+def crossbar(num_caches: int) -> Layout:
+    """
+    A single router which every controller is attached to.
+    """
+    return Layout("crossbar", 1, 1, [])
+
+
+def clustered_mesh(
+    num_caches: int,
+    cluster_size: int = 4,
+    num_rows: Optional[int] = None,
+    num_cols: Optional[int] = None,
+) -> Layout:
+    """
+    A 2D mesh with `cluster_size` L1 caches per router, which divides the
+    number of routers, and of hops, of a large mesh.
+    """
+    num_rows, num_cols = mesh_shape(
+        -(-num_caches // cluster_size), num_rows, num_cols
+    )
+    return Layout(
+        "clustered_mesh",
+        num_rows,
+        num_cols,
+        _grid_links(num_rows, num_cols),
+        [i // cluster_size for i in range(num_rows * num_cols * cluster_size)],
+    )
+
+
+LAYOUTS: Dict[str, Callable[..., Layout]] = {
+    "mesh": mesh,
+    "torus": torus,
+    "ring": ring,
+    "flattened_butterfly": flattened_butterfly,
+    "crossbar": crossbar,
+    "clustered_mesh": clustered_mesh,
+}
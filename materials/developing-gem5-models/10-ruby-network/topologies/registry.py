@@ -0,0 +1,83 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+The networks which MIExampleCacheNetwork can be built with, by name.
+
+Networks are registered with `register_network`, e.g. from a configuration
+script, and must take the Ruby system as their first argument and implement
+`connectControllers(controllers)`.
+"""
+
+from typing import Any, Dict, Type
+
+from .garnet_mesh import GarnetMesh
+from .garnet_pt2pt import GarnetPt2Pt
+from .garnet_topology import (
+    GarnetClusteredMesh,
+    GarnetCrossbar,
+    GarnetFlattenedButterfly,
+    GarnetRing,
+    GarnetTorus,
+)
+from .simple_pt2pt import SimplePt2Pt
+
+NETWORKS: Dict[str, Type] = {}
+
+
+def register_network(name: str, network: Type) -> None:
+    """
+    Make `network` available under `name`.
+    """
+    NETWORKS[name] = network
+
+
+def create_network(name: str, ruby_system, **options: Any):
+    """
+    Create the network registered under `name`.
+
+    :param options: The keyword arguments of the network.
+    """
+    if name not in NETWORKS:
+        raise ValueError(
+            f"network {name} is not implemented. Use one of "
+            f"{sorted(NETWORKS)}."
+        )
+    return NETWORKS[name](ruby_system, **options)
+
+
+for _network in [
+    SimplePt2Pt,
+    GarnetPt2Pt,
+    GarnetMesh,
+    GarnetTorus,
+    GarnetRing,
+    GarnetFlattenedButterfly,
+    GarnetCrossbar,
+    GarnetClusteredMesh,
+]:
+    register_network(_network.__name__, _network)
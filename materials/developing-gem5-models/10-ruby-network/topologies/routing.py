@@ -0,0 +1,191 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Routing tables and deadlock checks for the layouts of `layouts`.
+
+This module does not import m5. A routing table gives, for every router and
+destination router, the links a packet may take next:
+
+- "weighted" is what Garnet's table-based routing does: the links on a
+shortest path by link weight, keeping only those of the lowest weight;
+- "xy" takes the links on a shortest path by hops, East/West links first;
+- "west_first" takes the links on a shortest path by hops, West links first
+and then any of the others.
+
+A routing is free of deadlocks if its channel dependency graph, which links
+each link to the links a packet may take right after it, has no cycle
+(Dally and Seitz).
+"""
+
+import heapq
+from typing import Dict, List, Optional, Set
+
+from .layouts import Layout
+
+ROUTINGS = ["weighted", "xy", "west_first"]
+
+# The routing table: table[router][destination] is the list of the indices,
+# in `layout.links`, of the links a packet may take next.
+RouteTable = Dict[int, Dict[int, List[int]]]
+
+
+def _distances_to(layout: Layout, dst: int, weighted: bool) -> List[float]:
+    """
+    The distance from every router to `dst`, by link weight or by hops.
+    """
+    incoming = [[] for _ in range(layout.num_routers)]
+    for link in layout.links:
+        incoming[link.dst].append(link)
+    distances = [float("inf")] * layout.num_routers
+    distances[dst] = 0
+    queue = [(0, dst)]
+    while queue:
+        distance, router = heapq.heappop(queue)
+        if distance > distances[router]:
+            continue
+        for link in incoming[router]:
+            new = distance + (link.weight if weighted else 1)
+            if new < distances[link.src]:
+                distances[link.src] = new
+                heapq.heappush(queue, (new, link.src))
+    return distances
+
+
+def route_table(layout: Layout, routing: str = "weighted") -> RouteTable:
+    """
+    The routing table of a layout.
+
+    :raises ValueError: If a router cannot reach another.
+    """
+    if routing not in ROUTINGS:
+        raise ValueError(
+            f"Unknown routing '{routing}'. Use one of {ROUTINGS}."
+        )
+    weighted = routing == "weighted"
+    outgoing = [[] for _ in range(layout.num_routers)]
+    for i, link in enumerate(layout.links):
+        outgoing[link.src].append(i)
+
+    table = {router: {} for router in range(layout.num_routers)}
+    for dst in range(layout.num_routers):
+        distances = _distances_to(layout, dst, weighted)
+        for router in range(layout.num_routers):
+            if router == dst:
+                continue
+            if distances[router] == float("inf"):
+                raise ValueError(
+                    f"Router {router} of the {layout.name} cannot reach "
+                    f"router {dst}."
+                )
+            hops = [
+                i
+                for i in outgoing[router]
+                if (layout.links[i].weight if weighted else 1)
+                + distances[layout.links[i].dst]
+                == distances[router]
+            ]
+            if weighted:
+                lightest = min(layout.links[i].weight for i in hops)
+                hops = [i for i in hops if layout.links[i].weight == lightest]
+            else:
+                first = ["East", "West"] if routing == "xy" else ["West"]
+                preferred = [
+                    i for i in hops if layout.links[i].src_outport in first
+                ]
+                hops = preferred or hops
+            table[router][dst] = hops
+    return table
+
+
+def channel_dependencies(
+    layout: Layout, table: RouteTable
+) -> Dict[int, Set[int]]:
+    """
+    The channel dependency graph of a routing: the links a packet may take
+    right after each link.
+    """
+    graph = {i: set() for i in range(len(layout.links))}
+    for router, routes in table.items():
+        for dst, hops in routes.items():
+            for i in hops:
+                after = layout.links[i].dst
+                if after != dst:
+                    graph[i].update(table[after][dst])
+    return graph
+
+
+def find_cycle(graph: Dict[int, Set[int]]) -> Optional[List[int]]:
+    """
+    A cycle of a directed graph, as the list of its nodes, or None.
+    """
+    state = {node: 0 for node in graph}  # 0: new, 1: on the stack, 2: done
+    for start in graph:
+        if state[start]:
+            continue
+        stack = [(start, iter(graph[start]))]
+        path = [start]
+        state[start] = 1
+        while stack:
+            node, successors = stack[-1]
+            for successor in successors:
+                if state[successor] == 1:
+                    return path[path.index(successor) :]
+                if state[successor] == 0:
+                    state[successor] = 1
+                    path.append(successor)
+                    stack.append((successor, iter(graph[successor])))
+                    break
+            else:
+                state[node] = 2
+                path.pop()
+                stack.pop()
+    return None
+
+
+def check_deadlock(layout: Layout, routing: str = "weighted") -> RouteTable:
+    """
+    Check that a routing of a layout cannot deadlock.
+
+    :returns: The routing table.
+
+    :raises ValueError: If the channel dependency graph has a cycle. The
+    message lists the links of the cycle.
+    """
+    table = route_table(layout, routing)
+    cycle = find_cycle(channel_dependencies(layout, table))
+    if cycle is not None:
+        links = " -> ".join(
+            f"{layout.links[i].src}:{layout.links[i].src_outport}"
+            for i in cycle
+        )
+        raise ValueError(
+            f"The {routing} routing of the {layout.name} can deadlock: its "
+            f"channel dependency graph has the cycle {links}. Use another "
+            "routing or topology."
+        )
+    return table
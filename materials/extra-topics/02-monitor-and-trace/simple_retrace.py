@@ -25,9 +25,77 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+"""
+Replay memory traces recorded by simple_comm_trace.py.
+
+Each trace is replayed by its own PyTrafficGen, all of them sharing the
+memory bus. A window of a trace, or slices of it replayed side by side, are
+read from an indexed trace written by `python3 -m util.memtrace pack`:
+
+```
+gem5 simple_retrace.py --trace mem_trace.g5t --window 1000000:2000000
+gem5 simple_retrace.py --trace mem_trace.g5t --slices 4
+```
+"""
+
+import argparse
+import os
+import sys
+
 import m5
 from m5.objects import *
 
+# The util package, at the root of the repository.
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 3)
+)
+from util.memtrace import extract, split
+
+parser = argparse.ArgumentParser(description="Replay memory traces.")
+parser.add_argument(
+    "--trace",
+    type = str,
+    nargs = "+",
+    default = ["results/simple_comm_trace/mem_trace.gz"],
+    help = "The traces to replay, each by its own traffic generator.",
+)
+parser.add_argument(
+    "--window",
+    type = str,
+    help = "Only replay the ticks START:END of the trace. Either end can be "
+    "left out.",
+)
+parser.add_argument(
+    "--slices",
+    type = int,
+    help = "Cut the trace (or its window) into this many slices of equal "
+    "duration and replay them side by side.",
+)
+args = parser.parse_args()
+
+start_tick = end_tick = None
+if args.window is not None:
+    start, _, end = args.window.partition(":")
+    start_tick = int(start) if start else None
+    end_tick = int(end) if end else None
+
+trace_files = args.trace
+if args.window is not None or args.slices is not None:
+    if len(trace_files) != 1:
+        parser.error("--window and --slices take a single trace.")
+    if args.slices is not None:
+        trace_files = split(
+            trace_files[0],
+            os.path.join(m5.options.outdir, "slices"),
+            args.slices,
+            start_tick,
+            end_tick,
+        )
+    else:
+        window = os.path.join(m5.options.outdir, "window.gz")
+        extract(trace_files[0], window, start_tick, end_tick)
+        trace_files = [window]
+
 
 def retrace(generator, trace_file: str):
     yield generator.createTrace(0, trace_file)
@@ -42,11 +110,12 @@ system.clk_domain.voltage_domain = VoltageDomain()
 system.mem_mode = "timing"
 system.mem_ranges = [AddrRange("512MB")]
 
-system.cpu = PyTrafficGen()
+system.cpu = [PyTrafficGen() for _ in trace_files]
 
 system.membus = SystemXBar()
 
-system.cpu.port = system.membus.cpu_side_ports
+for generator in system.cpu:
+    generator.port = system.membus.cpu_side_ports
 
 system.mem_ctrl = MemCtrl()
 system.mem_ctrl.dram = DDR3_1600_8x8()
@@ -61,8 +130,13 @@ root = Root(full_system = False, system = system)
 
 m5.instantiate()
 
-system.cpu.start(retrace(system.cpu, "results/simple_comm_trace/mem_trace.gz"))
+for generator, trace_file in zip(system.cpu, trace_files):
+    generator.start(retrace(generator, trace_file))
 
 print("Beginning simulation!")
-exit_event = m5.simulate()
+# Each traffic generator exits the simulation loop when its trace ends.
+for _ in trace_files:
+    exit_event = m5.simulate()
+    if exit_event.getCause() == "simulate() limit reached":
+        break
 print('Exiting @ tick %i because %s' % (m5.curTick(), exit_event.getCause()))
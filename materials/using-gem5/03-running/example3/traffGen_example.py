@@ -3,8 +3,18 @@ import m5
 import argparse
 from m5.objects.DRAMInterface import *
 from m5.objects.NVMInterface import *
+import os
+import sys
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4)
+)
+from util.live_stats import LiveStats
+from util.load_curve import LoadCurve
+from util.sweep import write_table
 
 # sample cmd: build/NULL/gem5.opt --outdir=m5out1 traffGen_example.py DDR3_1600_8x8 linear 100
+# loaded-latency curve: build/NULL/gem5.opt traffGen_example.py DDR3_1600_8x8 random 100 --sweep
 
 args = argparse.ArgumentParser()
 
@@ -17,7 +27,7 @@ args.add_argument(
 args.add_argument(
     "traffic_mode",
     type = str,
-    help = "pattern of generated addresses, linear or random."
+    help = "pattern of generated addresses, linear, random or profile."
 )
 
 args.add_argument(
@@ -26,8 +36,61 @@ args.add_argument(
     help="Read Percentage, the rest will be writes, ex: 70",
 )
 
+args.add_argument(
+    "--profile",
+    type=str,
+    default=None,
+    help="Profile made by `python3 -m util.trace_profile extract` to draw "
+    "the traffic from in profile mode. rd_prct is ignored in this mode.",
+)
+
+args.add_argument(
+    "--sweep",
+    action="store_true",
+    help="Measure the loaded-latency curve: run the linear or random "
+    "traffic at each of --periods, from low to high load, and stop at the "
+    "first saturated period. Each period runs in windows until its "
+    "bandwidth and latency converge, for at most 1000000000 ticks.",
+)
+
+args.add_argument(
+    "--periods",
+    type=int,
+    nargs="+",
+    default=[16000, 8000, 4000, 3000, 2000, 1500, 1000, 750, 500],
+    help="The periods swept by --sweep, in ticks.",
+)
+
+args.add_argument(
+    "--window",
+    type=int,
+    default=10000000,
+    help="The ticks of each window of --sweep.",
+)
+
+args.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.05,
+    help="A period of --sweep ends once the bandwidth and latency of its "
+    "last windows are within this fraction of each other.",
+)
+
+args.add_argument(
+    "--latency-factor",
+    type=float,
+    default=3.0,
+    help="A period of --sweep whose latency is this many times the latency "
+    "of the first period is saturated.",
+)
+
 options = args.parse_args()
 
+if options.traffic_mode == 'profile' and options.profile is None:
+    args.error("profile mode needs --profile")
+if options.sweep and options.traffic_mode not in ('linear', 'random'):
+    args.error("--sweep needs linear or random traffic")
+
 system = System()
 system.clk_domain = SrcClockDomain()
 system.clk_domain.clock = "4GHz"
@@ -66,15 +129,89 @@ def createLinearTraffic(tgen):
                             0)                                   # data_limit
     yield tgen.createExit(0)
 
+def createProfileTraffic(tgen):
+    # The trace is drawn with NumPy up front, and then replayed by the
+    # generator without calling back into Python for each request. NumPy is
+    # only imported here, so the other modes run without it.
+    from util.trace_profile import load_profile, synthesize
+
+    trace_file = os.path.join(m5.options.outdir, "synthetic_trace.gz")
+    synthesize(load_profile(options.profile),
+               trace_file,
+               duration=1000000000,
+               max_addr=AddrRange('1GB').end)
+    yield tgen.createTrace(1000000000,                     # duration
+                           trace_file,                     # trace_file
+                           0)                              # addr_offset
+    yield tgen.createExit(0)
+
+def createSweepTraffic(tgen, curve):
+    create = tgen.createLinear if options.traffic_mode == 'linear' \
+        else tgen.createRandom
+    while curve.period is not None:
+        yield create(options.window,                       # duration
+                     0,                                    # min_addr
+                     AddrRange('1GB').end,                 # max_adr
+                     64,                                   # block_size
+                     curve.period,                         # min_period
+                     curve.period,                         # max_period
+                     options.rd_prct,                      # rd_perc
+                     0)                                    # data_limit
+        # The simulation loop hands the window to the curve at this exit.
+        yield tgen.createExit(0)
+        # The generator asks for its next state as soon as it exits, before
+        # the curve has seen the window, so the next window waits a tick.
+        yield tgen.createIdle(1)
+
+def runSweep():
+    curve = LoadCurve(options.periods,
+                      64,
+                      options.window,
+                      max_windows=1000000000 // options.window,
+                      tolerance=options.tolerance,
+                      latency_factor=options.latency_factor)
+    stats = LiveStats(root)
+    system.generator.start(createSweepTraffic(system.generator, curve))
+    while not curve.done:
+        m5.simulate()
+        period = curve.period
+        curve.add_window(
+            m5.curTick(),
+            stats.get("system.generator.bytesRead")
+            + stats.get("system.generator.bytesWritten"),
+            stats.get("system.generator.totalReads")
+            + stats.get("system.generator.totalWrites"),
+            stats.get("system.generator.totalReadLatency")
+            + stats.get("system.generator.totalWriteLatency"))
+        if curve.period != period:
+            point = curve.points[-1]
+            print("period {}: offered {:.3f}GB/s, accepted {:.3f}GB/s, "
+                  "latency {:.1f}ns after {} windows{}".format(
+                      period, point['offered'] / 2 ** 30,
+                      point['accepted'] / 2 ** 30, point['latency'] / 1000,
+                      point['windows'],
+                      ", saturated" if point['saturated'] else ""))
+    write_table(curve.points, os.path.join(m5.options.outdir, "curve.csv"))
+    if curve.saturation_period is None:
+        print("The memory did not saturate. Try shorter periods.")
+    else:
+        print("The memory saturates at a period of {} ticks.".format(
+            curve.saturation_period))
+
 
 root = Root(full_system=False, system=system)
 
 m5.instantiate()
 
-if options.traffic_mode == 'linear':
+if options.sweep:
+    runSweep()
+    exit()
+elif options.traffic_mode == 'linear':
     system.generator.start(createLinearTraffic(system.generator))
 elif options.traffic_mode == 'random':
     system.generator.start(createRandomTraffic(system.generator))
+elif options.traffic_mode == 'profile':
+    system.generator.start(createProfileTraffic(system.generator))
 else:
     print('Wrong traffic type! Exiting!')
     exit()
@@ -0,0 +1,214 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+A memory stress harness: N traffic generators against M interleaved memory
+channels.
+
+Each channel is a `MemCtrl` with its own memory interface. The interface
+classes are given on the command line and assigned to the channels in turn,
+so `DDR4_2400_16x4 NVM_2400_1x64` with four channels makes a hybrid memory
+of two DDR4 and two NVM channels. The channels are interleaved over the
+whole memory every `--interleave` bytes, and the generators reach them
+through a crossbar.
+
+In random mode every generator accesses the whole of `--max-addr`; in
+linear mode each generator walks its own slice of it. All the generators
+issue one request every `--period` ticks.
+
+The statistics of each channel are under `system.mem_ctrls<N>` and those of
+each generator under `system.generators<N>`. `util/mem_sweep.py` sweeps the
+read percentage and the period of this script and reports the bandwidth and
+latency curves of each channel.
+
+```
+build/NULL/gem5.opt traffGen_multichannel.py DDR4_2400_16x4 NVM_2400_1x64 \
+    --channels 4 --generators 4 --interleave 256B --rd-prct 70
+```
+"""
+
+import argparse
+import math
+
+import m5
+from m5.objects import *
+from m5.util.convert import toMemorySize
+
+args = argparse.ArgumentParser()
+
+args.add_argument(
+    "mem_dev_types",
+    type=str,
+    nargs="+",
+    help="The memory interface classes, e.g. DDR3_1600_8x8 or "
+    "NVM_2400_1x64, assigned to the channels in turn.",
+)
+args.add_argument(
+    "--channels",
+    type=int,
+    default=1,
+    help="The number of memory channels. Must be a power of two.",
+)
+args.add_argument(
+    "--generators", type=int, default=1, help="The number of generators."
+)
+args.add_argument(
+    "--interleave",
+    type=str,
+    default="256B",
+    help="The granularity the channels are interleaved at.",
+)
+args.add_argument(
+    "--mode",
+    type=str,
+    choices=["linear", "random"],
+    default="random",
+    help="The pattern of the generated addresses.",
+)
+args.add_argument(
+    "--rd-prct",
+    type=int,
+    default=100,
+    help="Read percentage, the rest will be writes.",
+)
+args.add_argument(
+    "--period",
+    type=int,
+    default=1000,
+    help="The ticks between two requests of a generator.",
+)
+args.add_argument(
+    "--duration",
+    type=int,
+    default=1000000000,
+    help="The ticks of traffic to generate.",
+)
+args.add_argument(
+    "--block-size", type=int, default=64, help="The size of the requests."
+)
+args.add_argument(
+    "--max-addr",
+    type=str,
+    default="1GB",
+    help="The generators access the addresses below this one.",
+)
+args.add_argument(
+    "--mem-size", type=str, default="8GB", help="The size of the memory."
+)
+
+options = args.parse_args()
+
+interleave = toMemorySize(options.interleave)
+if options.channels < 1 or options.channels & (options.channels - 1):
+    args.error("--channels must be a power of two")
+if interleave & (interleave - 1) or interleave < options.block_size:
+    args.error(
+        "--interleave must be a power of two of at least the block size"
+    )
+max_addr = toMemorySize(options.max_addr)
+if max_addr > toMemorySize(options.mem_size):
+    args.error("--max-addr is beyond the memory")
+
+system = System()
+system.clk_domain = SrcClockDomain()
+system.clk_domain.clock = "4GHz"
+system.clk_domain.voltage_domain = VoltageDomain()
+system.mem_mode = "timing"
+
+system.membus = SystemXBar()
+system.mem_ranges = [AddrRange(options.mem_size)]
+
+system.generators = [PyTrafficGen() for _ in range(options.generators)]
+for generator in system.generators:
+    generator.port = system.membus.cpu_side_ports
+
+# The channel of an address is given by the bits just above the interleaving
+# granularity.
+intlv_low_bit = int(math.log2(interleave))
+intlv_bits = int(math.log2(options.channels))
+mem_ctrls = []
+for i in range(options.channels):
+    device_type = options.mem_dev_types[i % len(options.mem_dev_types)]
+    device = getattr(m5.objects, device_type)
+    if intlv_bits:
+        addr_range = AddrRange(
+            0,
+            size=options.mem_size,
+            intlvHighBit=intlv_low_bit + intlv_bits - 1,
+            xorHighBit=0,
+            intlvBits=intlv_bits,
+            intlvMatch=i,
+        )
+    else:
+        addr_range = AddrRange(options.mem_size)
+    mem_ctrl = MemCtrl()
+    mem_ctrl.dram = device(range=addr_range)
+    mem_ctrl.port = system.membus.mem_side_ports
+    mem_ctrls.append(mem_ctrl)
+    print(f"Channel {i}: {device_type}")
+system.mem_ctrls = mem_ctrls
+
+
+def createTraffic(tgen, index):
+    if options.mode == "linear":
+        # Each generator walks its own slice of the addresses.
+        size = max_addr // options.generators
+        size -= size % options.block_size
+        min_addr = index * size
+        yield tgen.createLinear(
+            options.duration,
+            min_addr,
+            min_addr + size,
+            options.block_size,
+            options.period,
+            options.period,
+            options.rd_prct,
+            0,
+        )
+    else:
+        yield tgen.createRandom(
+            options.duration,
+            0,
+            max_addr,
+            options.block_size,
+            options.period,
+            options.period,
+            options.rd_prct,
+            0,
+        )
+    yield tgen.createExit(0)
+
+
+root = Root(full_system=False, system=system)
+
+m5.instantiate()
+
+for i, generator in enumerate(system.generators):
+    generator.start(createTraffic(generator, i))
+
+exit_event = m5.simulate()
+print(f"Exiting @ tick {m5.curTick()} because {exit_event.getCause()}.")
@@ -30,7 +30,6 @@ import importlib
 from m5.objects import Root
 from gem5.components.boards.test_board import TestBoard
 from gem5.components.processors.linear_generator import LinearGenerator
-from gem5.components.memory import SingleChannelDDR3_1600
 
 parser = argparse.ArgumentParser(
     description="A traffic generator that can be used to test a gem5 "
@@ -52,6 +51,35 @@ parser.add_argument(
     nargs="*",
     help="The arguments needed to instantiate the memory class.",
 )
+parser.add_argument(
+    "--memory",
+    type=str,
+    default="SingleChannelDDR3_1600",
+    help="The memory class to import and instantiate.",
+    choices=[
+        "SingleChannelDDR3_1600",
+        "SingleChannelDDR3_2133",
+        "SingleChannelDDR4_2400",
+        "SingleChannelLPDDR3_1600",
+        "SingleChannelHBM",
+        "DualChannelDDR3_1600",
+        "DualChannelDDR3_2133",
+        "DualChannelDDR4_2400",
+        "DualChannelLPDDR3_1600",
+    ],
+)
+parser.add_argument(
+    "--rate",
+    type=str,
+    default="40GB/s",
+    help="The rate at which each generator core injects requests.",
+)
+parser.add_argument(
+    "--duration",
+    type=str,
+    default="250us",
+    help="How long the generator cores inject requests for.",
+)
 
 def cache_factory(cache):
     if cache == 'Classic':
@@ -81,14 +109,17 @@ def cache_factory(cache):
     else:
         raise ValueError(f"The cache class {cache} is not supported.")
 
+def memory_factory(memory, mem_args):
+    memory_module = importlib.import_module("gem5.components.memory")
+    return getattr(memory_module, memory)(*mem_args)
 
 
 args = parser.parse_args()
 cache_hierarchy = cache_factory(args.cache_system)
-memory = SingleChannelDDR3_1600(*args.mem_args)
+memory = memory_factory(args.memory, args.mem_args)
 generator = LinearGenerator(
-            duration="250us",
-            rate="40GB/s",
+            duration=args.duration,
+            rate=args.rate,
             num_cores=args.generator_cores,
             max_addr=memory.get_size(),
         )
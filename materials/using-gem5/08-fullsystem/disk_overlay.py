@@ -0,0 +1,106 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Copy-on-write overlays for the disk images of full-system boards.
+
+The boards of the standard library attach their disk image through a
+`CowDiskImage` whose child, a `RawDiskImage`, opens the image read-only. The
+sectors the simulated system writes are kept in the copy-on-write layer and
+the image itself is never modified, so any number of simulations can share
+one disk image, which the host page cache then holds once for all of them.
+There is no need to copy the image for each run.
+
+The copy-on-write layer is kept in memory and lost when gem5 exits unless it
+is given a file. `use_disk_overlay` gives it one: the sectors written during
+the simulation are saved to it when gem5 exits. The overlay only holds the
+written sectors, so it stays small however large the image is. A run can
+start from the disk state left by an earlier run by giving its overlay as
+`base`, which is copied first; the earlier overlay is not modified.
+
+```
+board.set_kernel_disk_workload(kernel=..., disk_image=...)
+use_disk_overlay(board, os.path.join(m5.options.outdir, "disk.cow"))
+```
+"""
+
+import os
+import shutil
+from typing import List, Optional
+
+from m5.objects import CowDiskImage
+
+
+def disk_images(board) -> List[CowDiskImage]:
+    """
+    The copy-on-write disk images of a board.
+    """
+    return [
+        obj for obj in board.descendants() if isinstance(obj, CowDiskImage)
+    ]
+
+
+def use_disk_overlay(
+    board, path: str, base: Optional[str] = None
+) -> List[str]:
+    """
+    Save the sectors written to the disk images of a board to an overlay
+    file. This must be called after the disk image is set, e.g. by
+    `set_kernel_disk_workload`.
+
+    :param path: The overlay file. A file already there is replaced. If the
+    board has more than one disk image, the index of each image is appended.
+    :param base: An overlay saved by an earlier run to start from. By
+    default, the simulation starts from the unmodified disk image. If
+    `base` is `path` itself, the overlay is updated in place.
+
+    :returns: The overlay file of each disk image.
+    """
+    images = disk_images(board)
+    if not images:
+        raise ValueError(
+            "The board has no copy-on-write disk image. Set its disk image "
+            "first."
+        )
+
+    overlays = []
+    for index, image in enumerate(images):
+        suffix = "" if len(images) == 1 else f".{index}"
+        overlay = path + suffix
+        if os.path.dirname(overlay):
+            os.makedirs(os.path.dirname(overlay), exist_ok=True)
+        if base is not None:
+            if os.path.abspath(base + suffix) != os.path.abspath(overlay):
+                shutil.copyfile(base + suffix, overlay)
+        elif os.path.exists(overlay):
+            os.remove(overlay)
+        image.image_file = overlay
+        image.read_only = False
+        # The writes go to the overlay and the shared image stays read-only.
+        image.child.read_only = True
+        overlays.append(overlay)
+    return overlays
@@ -37,8 +37,16 @@ Characteristics
 * Automatically generates the DTB file
 * Will boot but requires a user to login using `m5term` (username: `root`,
   password: `root`)
+* With `--save-disk`, saves what the simulated system wrote to the disk to
+  `disk.cow` in the output directory, and with `--disk-overlay <disk.cow>`,
+  starts from the disk left by an earlier run
 """
 
+import argparse
+import os
+
+import m5
+
 from gem5.components.boards.riscv_board import RiscvBoard
 from gem5.components.memory import SingleChannelDDR3_1600
 from gem5.components.processors.simple_processor import SimpleProcessor
@@ -52,6 +60,23 @@ from gem5.utils.requires import requires
 from gem5.resources.resource import Resource
 from gem5.simulate.simulator import Simulator
 
+from disk_overlay import use_disk_overlay
+
+parser = argparse.ArgumentParser(description="Boot linux on a RISC-V board.")
+parser.add_argument(
+    "--save-disk",
+    action="store_true",
+    help="Save the sectors written to the disk image to disk.cow in the "
+    "output directory. The disk image itself is never modified.",
+)
+parser.add_argument(
+    "--disk-overlay",
+    type=str,
+    help="Start from the disk state saved to disk.cow by an earlier run. "
+    "Implies --save-disk.",
+)
+args = parser.parse_args()
+
 # Run a check to ensure the right version of gem5 is being used.
 requires(isa_required=ISA.RISCV)
 
@@ -84,6 +109,15 @@ board.set_kernel_disk_workload(
                    disk_image=Resource("riscv-disk-img"),
 )
 
+# The disk image is shared by all the runs and only read. What the simulated
+# system writes is kept in a copy-on-write layer, saved if asked for.
+if args.save_disk or args.disk_overlay:
+    use_disk_overlay(
+        board,
+        os.path.join(m5.options.outdir, "disk.cow"),
+        base=args.disk_overlay,
+    )
+
 simulator = Simulator(board=board)
 print("Beginning simulation!")
 # Note: This simulation will never stop. You can access the terminal upon boot
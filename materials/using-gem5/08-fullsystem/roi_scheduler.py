@@ -0,0 +1,267 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A region-of-interest (ROI) scheduler for full-system simulations with a
+switchable processor.
+
+The workload is fast-forwarded on the starting (e.g. KVM) cores and each ROI,
+marked by a `workbegin`/`workend` pair, is simulated on the switch (e.g.
+TIMING) cores. The processor is switched back to the starting cores after
+each ROI, so any number of ROIs can be simulated in one run.
+
+Inside an ROI, the simulation can also be sampled: the switch cores simulate
+`detailed_insts` instructions, then the starting cores fast-forward
+`ffwd_insts` instructions, and so on until the ROI ends.
+
+The instruction count events which end the periods cannot be descheduled,
+so an event left over from an ROI which ended mid-sample can still fire in
+a later ROI. The scheduler records the core and the instruction count of
+the last event it scheduled and ignores the others.
+
+The statistics are reset when a detailed period starts and dumped when it
+ends, so stats.txt holds one dump per ROI, or one per sample when sampling.
+`periods` records the ROI, tick range and instruction count of each dump.
+
+The scheduler is driven by the exit event generators of the Simulator:
+
+```
+scheduler = RoiScheduler(processor, max_rois=2)
+simulator = Simulator(board=board, on_exit_event=scheduler.on_exit_event())
+scheduler.run(simulator)
+```
+"""
+
+from typing import Callable, Dict, Generator, List, Optional
+
+import m5
+
+from gem5.simulate.exit_event import ExitEvent
+
+# The cause given to the instruction count exit events which end the
+# detailed and fast-forward periods of a sampled ROI.
+SWITCH_CAUSE = "switchcpu"
+
+
+class RoiScheduler:
+    def __init__(
+        self,
+        processor,
+        max_rois: Optional[int] = None,
+        roi_ticks: Optional[int] = None,
+        detailed_insts: Optional[int] = None,
+        ffwd_insts: Optional[int] = None,
+        count_insts: Optional[Callable[[], float]] = None,
+    ) -> None:
+        """
+        :param processor: A switchable processor. It must be on its starting
+        cores when the simulation starts.
+        :param max_rois: Stop the simulation at the end of this many ROIs.
+        If not given, the workload runs to its end.
+        :param roi_ticks: End each ROI after at most this many ticks.
+        :param detailed_insts: The length of each detailed sample, in
+        instructions of the first core. ROIs are not sampled if not given.
+        :param ffwd_insts: The number of instructions of the first core
+        fast-forwarded between two samples.
+        :param count_insts: Returns the number of instructions simulated
+        since the statistics were last reset. It is called before each dump
+        and its result is recorded in `periods`.
+        """
+        if (detailed_insts is None) != (ffwd_insts is None):
+            raise ValueError(
+                "Sampling needs both `detailed_insts` and `ffwd_insts`."
+            )
+
+        self._processor = processor
+        self._max_rois = max_rois
+        self._roi_ticks = roi_ticks
+        self._detailed_insts = detailed_insts
+        self._ffwd_insts = ffwd_insts
+        self._count_insts = count_insts
+
+        self._roi = 0
+        self._in_roi = False
+        self._roi_start_tick = 0
+        self._detailed = False
+        self._period_start_tick = 0
+        self._rerun = False
+        # The core and instruction count the pending switch is due at.
+        self._switch_at = None
+        self.done = False
+
+        # One entry per stats dump.
+        self.periods: List[Dict[str, Optional[float]]] = []
+
+    @property
+    def rois(self) -> int:
+        """
+        The number of ROIs reached so far.
+        """
+        return self._roi
+
+    def on_exit_event(self) -> Dict[ExitEvent, Generator]:
+        """
+        The exit event generators to give to the Simulator.
+        """
+        return {
+            ExitEvent.WORKBEGIN: self._handler(self._begin_roi),
+            ExitEvent.WORKEND: self._handler(self._end_roi),
+            ExitEvent.SWITCHCPU: self._handler(self._switch),
+            ExitEvent.MAX_TICK: self._handler(self._max_tick),
+            ExitEvent.EXIT: self._handler(self._exit),
+        }
+
+    def run(self, simulator) -> None:
+        """
+        Run the simulation until the workload exits or `max_rois` ROIs have
+        been simulated.
+        """
+        while True:
+            self._rerun = False
+            simulator.run(self._max_ticks())
+            if not self._rerun:
+                break
+
+    def _handler(self, handle) -> Generator[bool, None, None]:
+        while True:
+            yield handle()
+
+    def _max_ticks(self) -> int:
+        # The Simulator limits each of its `m5.simulate` calls to
+        # `max_ticks`, so the limit of an ROI is set by running it again
+        # once the ROI has started.
+        if self._in_roi and self._roi_ticks is not None:
+            elapsed = m5.curTick() - self._roi_start_tick
+            return max(self._roi_ticks - elapsed, 1)
+        return m5.MaxTick
+
+    def _first_core(self):
+        return self._processor.get_cores()[0].core
+
+    def _schedule_switch(self, insts: int) -> None:
+        core = self._first_core()
+        core.scheduleInstStop(0, insts, SWITCH_CAUSE)
+        self._switch_at = (core, core.getCurrentInstCount(0) + insts)
+
+    def _is_scheduled_switch(self) -> bool:
+        # Only the event of the last call to `_schedule_switch` is expected:
+        # it fires on the same core, once its instructions are reached.
+        if self._switch_at is None:
+            return False
+        core, insts = self._switch_at
+        return (
+            core is self._first_core()
+            and core.getCurrentInstCount(0) >= insts
+        )
+
+    def _start_detailed(self) -> None:
+        self._processor.switch()
+        self._detailed = True
+        m5.stats.reset()
+        self._period_start_tick = m5.curTick()
+        if self._detailed_insts is not None:
+            self._schedule_switch(self._detailed_insts)
+
+    def _end_detailed(self, switch: bool = True) -> None:
+        insts = self._count_insts() if self._count_insts else None
+        m5.stats.dump()
+        self.periods.append(
+            {
+                "roi": self._roi,
+                "start_tick": self._period_start_tick,
+                "end_tick": m5.curTick(),
+                "insts": insts,
+            }
+        )
+        if switch:
+            self._processor.switch()
+            self._detailed = False
+
+    def _stop_after_roi(self) -> bool:
+        if self._max_rois is not None and self._roi >= self._max_rois:
+            self.done = True
+        return self.done
+
+    def _begin_roi(self) -> bool:
+        if self._in_roi:
+            return False
+        self._roi += 1
+        self._in_roi = True
+        self._roi_start_tick = m5.curTick()
+        print("ROI {} begins @ tick {}.".format(self._roi, m5.curTick()))
+        self._start_detailed()
+        # Run again, with the tick limit of the ROI.
+        self._rerun = self._roi_ticks is not None
+        return self._rerun
+
+    def _end_roi(self) -> bool:
+        if not self._in_roi:
+            return False
+        print("ROI {} ends @ tick {}.".format(self._roi, m5.curTick()))
+        self._in_roi = False
+        # A pending switch of this ROI must not end a period of the next.
+        self._switch_at = None
+        stop = self._stop_after_roi()
+        if self._detailed:
+            # There is no need to switch back if nothing is simulated after.
+            self._end_detailed(switch=not stop)
+        if stop:
+            return True
+        # Run again, without the tick limit of the ROI.
+        self._rerun = self._roi_ticks is not None
+        return self._rerun
+
+    def _switch(self) -> bool:
+        # Instruction count events scheduled in an ROI which has since ended
+        # are ignored, even if they fire in a later ROI.
+        if (
+            not self._in_roi
+            or self._detailed_insts is None
+            or not self._is_scheduled_switch()
+        ):
+            return False
+        self._switch_at = None
+        if self._detailed:
+            self._end_detailed()
+            self._schedule_switch(self._ffwd_insts)
+        else:
+            self._start_detailed()
+        # Run again, with what is left of the tick limit of the ROI.
+        self._rerun = self._roi_ticks is not None
+        return self._rerun
+
+    def _max_tick(self) -> bool:
+        if self._in_roi and self._roi_ticks is not None:
+            return self._end_roi()
+        # The Simulator's own limit was reached.
+        self.done = True
+        return True
+
+    def _exit(self) -> bool:
+        self.done = True
+        if self._in_roi:
+            self._end_roi()
+        return True
@@ -33,6 +33,13 @@ Two Level system cache and 3 GB DDR4 memory. It uses the x86 board.
 This script will count the total number of instructions executed
 in the ROI. It also tracks how much wallclock and simulated time.
 
+The ROI is simulated on timing cores and the rest of the program on KVM
+cores. With --max-rois, more than one ROI can be simulated, and with
+--detailed-insts and --ffwd-insts each ROI is sampled: the timing cores
+simulate a number of instructions, then the KVM cores fast-forward a number
+of instructions, and so on. The stats are dumped at the end of every ROI or
+sample.
+
 Usage:
 ------
 
@@ -41,11 +48,14 @@ scons build/X86/gem5.opt
 ./build/X86/gem5.opt \
     configs/example/gem5_library/x86-npb-benchmarks.py \
     --benchmark <benchmark_name> \
-    --size <benchmark_class>
+    --size <benchmark_class> \
+    [--max-rois <N>] [--detailed-insts <X> --ffwd-insts <Y>]
 ```
 """
 
 import argparse
+import os
+import sys
 import time
 
 import m5
@@ -61,10 +71,19 @@ from gem5.components.processors.cpu_types import CPUTypes
 from gem5.isas import ISA
 from gem5.coherence_protocol import CoherenceProtocol
 from gem5.resources.resource import Resource, CustomResource, CustomDiskImageResource
+from gem5.simulate.simulator import Simulator
 
-from m5.stats.gem5stats import get_simstat
 from m5.util import warn
 
+# The util package, at the root of the repository.
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 3)
+)
+from util.live_stats import LiveStats
+
+from disk_overlay import use_disk_overlay
+from roi_scheduler import RoiScheduler
+
 requires(
     isa_required = ISA.X86,
     coherence_protocol_required=CoherenceProtocol.MESI_TWO_LEVEL,
@@ -114,8 +133,46 @@ parser.add_argument(
         "ROI. It accepts an integer value."
 )
 
+parser.add_argument(
+    "--max-rois",
+    type = int,
+    default = 1,
+    help = "The number of ROIs to simulate before exiting. 0 runs the "\
+        "benchmark to its end."
+)
+
+parser.add_argument(
+    "--detailed-insts",
+    type = int,
+    help = "Sample each ROI: simulate this many instructions on the timing "\
+        "cores, then fast-forward --ffwd-insts instructions on the KVM cores."
+)
+
+parser.add_argument(
+    "--ffwd-insts",
+    type = int,
+    help = "The number of instructions fast-forwarded between two samples."
+)
+
+parser.add_argument(
+    "--save-disk",
+    action = "store_true",
+    help = "Save the sectors written to the disk image to disk.cow in the "\
+        "output directory. The disk image itself is never modified."
+)
+
+parser.add_argument(
+    "--disk-overlay",
+    type = str,
+    help = "Start from the disk state saved to disk.cow by an earlier run. "\
+        "Implies --save-disk."
+)
+
 args = parser.parse_args()
 
+if (args.detailed_insts is None) != (args.ffwd_insts is None):
+    parser.error("--detailed-insts and --ffwd-insts must be given together.")
+
 # The simulation may fail in the case of `mg` with class C as it uses 3.3 GB
 # of memory (more information is availabe at https://arxiv.org/abs/2010.13216).
 # We warn the user here.
@@ -221,16 +278,50 @@ board.set_kernel_disk_workload(
     readfile_contents=command,
 )
 
+# All the runs share the disk image, which the board opens read-only, and the
+# sectors written by each run are kept apart in a copy-on-write layer. The
+# layer is only saved when asked for.
+
+if args.save_disk or args.disk_overlay:
+    use_disk_overlay(
+        board,
+        os.path.join(m5.options.outdir, "disk.cow"),
+        base = args.disk_overlay,
+    )
+
 # We need this for long running processes.
 m5.disableAllListeners()
 
-root = Root(full_system = True, system = board)
+# The ROI scheduler switches the processor to the timing cores at each
+# `workbegin` and back to the KVM cores at each `workend`, dumping the stats
+# of every ROI. With --detailed-insts and --ffwd-insts, each ROI is sampled
+# instead: the timing cores simulate a sample, the KVM cores fast-forward to
+# the next one, and the stats of every sample are dumped.
 
-# sim_quantum must be set when KVM cores are used.
+# We count the committed instructions of the timing cores before each dump.
+# LiveStats only looks up the statistics we ask for, rather than converting
+# the whole statistics tree as `get_simstat(root).to_json()` would.
 
-root.sim_quantum = int(1e9)
+def count_insts():
+    return LiveStats(Root.getInstance()).sum(
+        "system.processor.cores*.core.exec_context.thread_0.numInsts"
+    )
 
-m5.instantiate()
+scheduler = RoiScheduler(
+    processor,
+    max_rois = args.max_rois or None,
+    roi_ticks = args.ticks,
+    detailed_insts = args.detailed_insts,
+    ffwd_insts = args.ffwd_insts,
+    count_insts = count_insts,
+)
+
+# The Simulator takes care of the sim_quantum needed by the KVM cores.
+
+simulator = Simulator(
+    board = board,
+    on_exit_event = scheduler.on_exit_event(),
+)
 
 # We maintain the wall clock time.
 
@@ -239,97 +330,20 @@ globalStart = time.time()
 print("Running the simulation")
 print("Using KVM cpu")
 
-# We start the simulation.
-
-exit_event = m5.simulate()
-
-# The first exit_event ends with a `workbegin` cause. This means that the
-# system started successfully and the execution on the program started.
-
-if exit_event.getCause() == "workbegin":
+scheduler.run(simulator)
 
-    print("Done booting Linux")
-    print("Resetting stats at the start of ROI!")
-
-    m5.stats.reset()
-    start_tick = m5.curTick()
-
-    # We have completed up to this step using KVM cpu. Now we switch to timing
-    # cpu for detailed simulation.
-
-    processor.switch()
-else:
-    # `workbegin` call was never encountered.
+# `workbegin` call was never encountered.
 
+if scheduler.rois == 0:
     print("Unexpected termination of simulation before ROI was reached!")
     print(
         "Exiting @ tick {} because {}.".format(
-            m5.curTick(),
-            exit_event.getCause()
-        )
-    )
-    exit(-1)
-
-# The next exit_event is to simulate the ROI. It should be exited with a cause
-# marked by `workend`.
-
-# Next, we need to check if the user passed a value for --ticks. If yes,
-# then we limit out execution to this number of ticks during the ROI.
-# Otherwise, we simulate until the ROI ends.
-if args.ticks:
-    exit_event = m5.simulate(args.ticks)
-else:
-    exit_event = m5.simulate()
-
-
-# Reached the end of ROI.
-# We dump the stats here.
-
-# We exepect that ROI ends with `workend` or `simulate() limit reached`.
-# Otherwise the simulation ended unexpectedly.
-if exit_event.getCause() == "workend":
-    print("Dump stats at the end of the ROI!")
-
-    m5.stats.dump()
-    end_tick = m5.curTick()
-elif exit_event.getCause() == "simulate() limit reached" and \
-    args.ticks is not None:
-    print("Dump stats at the end of {} ticks in the ROI".format(args.ticks))
-
-    m5.stats.dump()
-    end_tick = m5.curTick()
-else:
-    print("Unexpected termination of simulation while ROI was being executed!")
-    print(
-        "Exiting @ tick {} because {}.".format(
-            m5.curTick(),
-            exit_event.getCause()
+            simulator.get_current_tick(),
+            simulator.get_last_exit_event_cause(),
         )
     )
     exit(-1)
 
-# We need to note that the benchmark is not executed completely till this
-# point, but, the ROI has. We collect the essential statistics here before
-# resuming the simulation again.
-
-# We get simInsts using get_simstat and output it in the final
-# print statement.
-
-gem5stats = get_simstat(root)
-
-# We get the number of committed instructions from the timing
-# cores. We then sum and print them at the end.
-
-roi_insts = float(\
-    gem5stats.to_json()\
-    ["system"]["processor"]["cores2"]["core"]["exec_context.thread_0"]\
-    ["numInsts"]["value"]
-) + float(\
-    gem5stats.to_json()\
-    ["system"]["processor"]["cores3"]["core"]["exec_context.thread_0"]\
-    ["numInsts"]["value"]\
-)
-
 # Simulation is over at this point. We acknowledge that all the simulation
 # events were successful.
 print("All simulation events were successful.")
@@ -339,8 +353,25 @@ print("Done with the simulation")
 print()
 print("Performance statistics:")
 
-print("Simulated time in ROI: %.2fs" % ((end_tick-start_tick)/1e12))
-print("Instructions executed in ROI: %d" % ((roi_insts)))
-print("Ran a total of", m5.curTick()/1e12, "simulated seconds")
+# Each period is one stats dump: a whole ROI or one sample of an ROI.
+
+for dump, period in enumerate(scheduler.periods):
+    print(
+        "Dump %d, ROI %d: %.6fs simulated, %d instructions" % (
+            dump,
+            period["roi"],
+            (period["end_tick"] - period["start_tick"]) / 1e12,
+            period["insts"],
+        )
+    )
+
+print("Simulated time in ROIs: %.2fs" % (sum(
+    period["end_tick"] - period["start_tick"]
+    for period in scheduler.periods
+) / 1e12))
+print("Instructions executed in ROIs: %d" % (sum(
+    period["insts"] for period in scheduler.periods
+)))
+print("Ran a total of", simulator.get_current_tick()/1e12, "simulated seconds")
 print("Total wallclock time: %.2fs, %.2f min" % \
             (time.time()-globalStart, (time.time()-globalStart)/60))
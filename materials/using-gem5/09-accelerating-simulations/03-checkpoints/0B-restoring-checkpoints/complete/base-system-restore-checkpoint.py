@@ -45,11 +45,15 @@ Usage:
 scons build/X86/gem5.opt -j<num_proc>
 ./build/X86/gem5.opt base-system.py --binary <path/to/binary>
 ```
+
+`--checkpoint` may also be given the key of a checkpoint in a checkpoint store
+(see util/checkpoint_store.py), which is then materialized and restored.
 """
 
 # Importing the required python packages here
 
 import os
+import sys
 import argparse
 
 # We need to first determine which ISA that we want to use. Then we have to
@@ -80,6 +84,12 @@ from gem5.simulate.exit_event import ExitEvent
 
 from m5.util import fatal
 
+# The util package, at the root of the repository.
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 6)
+)
+from util.checkpoint_store import CheckpointStore, DEFAULT_ROOT
+
 # We are using argparse to supply the path to the binary.
 
 parser = argparse.ArgumentParser(
@@ -95,6 +105,20 @@ parser.add_argument(
     help = "Input the path to the matrix multiply binary."
 )
 
+parser.add_argument(
+    "--checkpoint",
+    type = str,
+    default = "checkpoint-directory",
+    help = "The checkpoint directory, or the key of a stored checkpoint."
+)
+
+parser.add_argument(
+    "--store",
+    type = str,
+    default = DEFAULT_ROOT,
+    help = "The checkpoint store keys are looked up in."
+)
+
 args = parser.parse_args()
 
 # Ensure that the binary exists.
@@ -152,12 +176,18 @@ board.set_se_binary_workload(
 
 # Lastly we instantiate the simulator module and simulate the program.
 
+# A checkpoint which is not a directory is looked up in the checkpoint store
+# by its key, or a prefix of it.
+
+if os.path.isdir(args.checkpoint):
+    checkpoint_path = os.path.join(os.getcwd(), args.checkpoint)
+else:
+    store = CheckpointStore(args.store)
+    checkpoint_path = os.path.abspath(store.materialize(args.checkpoint))
+
 simulator = Simulator(
         board=board,
-        checkpoint_path=os.path.join(
-                os.getcwd(),
-                "checkpoint-directory"
-        )
+        checkpoint_path=checkpoint_path
 )
 simulator.run(max_ticks = 1000000000000)
 
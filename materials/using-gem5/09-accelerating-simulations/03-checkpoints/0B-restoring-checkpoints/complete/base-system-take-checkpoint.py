@@ -45,13 +45,19 @@ Usage:
 scons build/X86/gem5.opt -j<num_proc>
 ./build/X86/gem5.opt base-system.py --binary <path/to/binary>
 ```
+
+With `--store <dir>`, the checkpoint is also added to a checkpoint store (see
+util/checkpoint_store.py) and its key is printed.
 """
 
 # Importing the required python packages here
 
 import os
+import sys
 import argparse
 
+import m5
+
 # We need to first determine which ISA that we want to use. Then we have to
 # make sure that we are using the correct ISA while executing this script.
 
@@ -80,6 +86,12 @@ from gem5.simulate.exit_event import ExitEvent
 
 from m5.util import fatal
 
+# The util package, at the root of the repository.
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 6)
+)
+from util.checkpoint_store import CheckpointStore
+
 # We are using argparse to supply the path to the binary.
 
 parser = argparse.ArgumentParser(
@@ -95,6 +107,19 @@ parser.add_argument(
     help = "Input the path to the matrix multiply binary."
 )
 
+parser.add_argument(
+    "--checkpoint-dir",
+    type = str,
+    default = "checkpoint-directory",
+    help = "The directory the checkpoint is written to."
+)
+
+parser.add_argument(
+    "--store",
+    type = str,
+    help = "Also add the checkpoint to the checkpoint store in this directory."
+)
+
 args = parser.parse_args()
 
 # Ensure that the binary exists.
@@ -164,4 +189,15 @@ print(
     )
 )
 
-simulator.save_checkpoint("checkpoint-directory")
+simulator.save_checkpoint(args.checkpoint_dir)
+
+# The key of the checkpoint is a hash of the configuration of the board, of
+# the binary and of the tick, so the same checkpoint is only stored once.
+
+if args.store:
+    key = CheckpointStore(args.store).put(
+        args.checkpoint_dir,
+        config_file = os.path.join(m5.options.outdir, "config.json"),
+        workloads = [os.path.join(os.getcwd(), args.binary)],
+    )
+    print("Checkpoint stored with key {}.".format(key))
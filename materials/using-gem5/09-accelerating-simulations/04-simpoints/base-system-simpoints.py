@@ -0,0 +1,318 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Hands-on Session 4: SimPoints
+-------------------------------------------
+This script runs a binary program on the SimpleBoard of the previous
+sessions in one of three modes:
+
+1. `profile`: The program is run to completion on an ATOMIC CPU, without
+caches, and the basic block vector (BBV) of every `--interval` instructions is
+written to `simpoint.bb.gz` in the output directory.
+
+2. `checkpoint`: The program is run again on an ATOMIC CPU and a checkpoint
+is taken `--warmup` instructions before each SimPoint picked from the BBVs.
+
+3. `restore`: One SimPoint checkpoint is restored on a TIMING or O3 CPU with
+caches. The caches are warmed up for `--warmup` instructions, the statistics
+are reset and the SimPoint's region is simulated in detail.
+
+The SimPoints are picked, and the regions replayed in parallel, with
+`util/simpoints.py`.
+
+* Limitations *
+---------------
+1. We are only simulating workloads with one CPU core.
+2. The binary cannot accept any arguments.
+
+Usage:
+------
+
+Run from the root of the repository:
+
+```
+gem5-x86 --outdir=simpoint-profile \
+    materials/using-gem5/09-accelerating-simulations/04-simpoints/base-system-simpoints.py \
+    --binary <path/to/binary> --mode profile
+python3 -m util.simpoints cluster simpoint-profile/simpoint.bb.gz -o simpoints
+gem5-x86 \
+    materials/using-gem5/09-accelerating-simulations/04-simpoints/base-system-simpoints.py \
+    --binary <path/to/binary> --mode checkpoint --simpoints-dir simpoints
+python3 -m util.simpoints replay simpoint-checkpoints --binary <path/to/binary>
+```
+"""
+
+import os
+import re
+import argparse
+
+import m5
+from m5.objects import Root
+from m5.util import fatal
+
+from gem5.isas import ISA
+from gem5.utils.requires import requires
+from gem5.resources.resource import CustomResource
+from gem5.components.cachehierarchies.classic.no_cache import NoCache
+from gem5.components.cachehierarchies.classic\
+    .private_l1_private_l2_cache_hierarchy import (
+    PrivateL1PrivateL2CacheHierarchy,
+)
+from gem5.components.memory import DualChannelDDR4_2400
+from gem5.components.processors.cpu_types import CPUTypes
+from gem5.components.boards.simple_board import SimpleBoard
+from gem5.components.processors.simple_processor import SimpleProcessor
+
+# The exit cause of the SimPoint start instruction events of the CPU.
+SIMPOINT_CAUSE = "simpoint starting point found"
+
+parser = argparse.ArgumentParser(
+    description="Profile, checkpoint and replay the SimPoints of a binary."
+)
+
+parser.add_argument(
+    "--binary",
+    "-b",
+    type=str,
+    required=True,
+    help="Input the path to the binary.",
+)
+
+parser.add_argument(
+    "--mode",
+    type=str,
+    choices=["profile", "checkpoint", "restore"],
+    required=True,
+    help="Collect BBVs, take the SimPoint checkpoints or restore one.",
+)
+
+parser.add_argument(
+    "--interval",
+    type=int,
+    default=1000000,
+    help="The length of each interval, in instructions.",
+)
+
+parser.add_argument(
+    "--warmup",
+    type=int,
+    default=100000,
+    help="The number of instructions simulated before each SimPoint to "
+    "warm the caches up.",
+)
+
+parser.add_argument(
+    "--simpoints-dir",
+    type=str,
+    default="simpoints",
+    help="The directory holding the simpoints and weights files.",
+)
+
+parser.add_argument(
+    "--checkpoint-dir",
+    type=str,
+    default="simpoint-checkpoints",
+    help="The directory the SimPoint checkpoints are written to.",
+)
+
+parser.add_argument(
+    "--checkpoint",
+    type=str,
+    help="The SimPoint checkpoint to restore.",
+)
+
+parser.add_argument(
+    "--cpu",
+    type=str,
+    choices=["timing", "o3"],
+    default="timing",
+    help="The CPU model a restored SimPoint is simulated with.",
+)
+
+args = parser.parse_args()
+
+# Ensure that the binary exists.
+
+if not os.path.exists(os.path.join(os.getcwd(), args.binary)):
+    fatal("The binary file does not exists!")
+
+requires(isa_required=ISA.X86)
+
+# Profiling and checkpointing only need the functional behaviour of the
+# program, so they use the fastest CPU and no caches. Checkpoints hold no
+# cache state, so the detailed system is free to use any cache hierarchy.
+
+if args.mode == "restore":
+    if not args.checkpoint:
+        fatal("--checkpoint is required to restore a SimPoint.")
+    cache_hierarchy = PrivateL1PrivateL2CacheHierarchy(
+        l1d_size="16kB",
+        l1i_size="16kB",
+        l2_size="256kB",
+    )
+    cpu_type = CPUTypes.O3 if args.cpu == "o3" else CPUTypes.TIMING
+else:
+    cache_hierarchy = NoCache()
+    cpu_type = CPUTypes.ATOMIC
+
+memory = DualChannelDDR4_2400(size="2GB")
+
+processor = SimpleProcessor(cpu_type=cpu_type, isa=ISA.X86, num_cores=1)
+
+board = SimpleBoard(
+    clk_freq="3GHz",
+    processor=processor,
+    memory=memory,
+    cache_hierarchy=cache_hierarchy,
+)
+
+board.set_se_binary_workload(
+    CustomResource(os.path.join(os.getcwd(), args.binary))
+)
+
+core = processor.get_cores()[0].core
+
+
+def read_simpoints(simpoints_dir):
+    """
+    Read the simpoints and weights files written by `util/simpoints.py` (or
+    by the SimPoint 3 tool).
+
+    :returns: (interval, weight, start instruction, warmup) for each
+    SimPoint, sorted by start instruction.
+    """
+    weights = {}
+    with open(os.path.join(simpoints_dir, "weights")) as f:
+        for line in f:
+            weight, cluster = line.split()
+            weights[cluster] = float(weight)
+
+    simpoints = []
+    with open(os.path.join(simpoints_dir, "simpoints")) as f:
+        for line in f:
+            interval, cluster = line.split()
+            interval = int(interval)
+            # A SimPoint too close to the start of the program gets a
+            # shorter warmup.
+            start = max(interval * args.interval - args.warmup, 0)
+            warmup = interval * args.interval - start
+            simpoints.append((interval, weights[cluster], start, warmup))
+    return sorted(simpoints, key=lambda simpoint: simpoint[2])
+
+
+if args.mode == "profile":
+    core.addSimPointProbe(args.interval)
+
+    root = Root(full_system=False, system=board)
+    m5.instantiate()
+    exit_event = m5.simulate()
+
+    print(
+        "Exiting @ tick {} because {}.".format(
+            m5.curTick(), exit_event.getCause()
+        )
+    )
+    print(
+        "BBVs written to {}.".format(
+            os.path.join(m5.options.outdir, "simpoint.bb.gz")
+        )
+    )
+
+elif args.mode == "checkpoint":
+    simpoints = read_simpoints(args.simpoints_dir)
+    core.simpoint_start_insts = sorted(
+        set(start for _, _, start, _ in simpoints)
+    )
+
+    root = Root(full_system=False, system=board)
+    m5.instantiate()
+
+    # gem5 only creates the last directory of a checkpoint's path.
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    last_start = None
+    for index, (interval, weight, start, warmup) in enumerate(simpoints):
+        # SimPoints within the warmup of the start of the program all start
+        # at instruction 0 and share its exit event.
+        if start != last_start:
+            exit_event = m5.simulate()
+            if exit_event.getCause() != SIMPOINT_CAUSE:
+                fatal(
+                    "Simulation ended before SimPoint {}: {}".format(
+                        index, exit_event.getCause()
+                    )
+                )
+            last_start = start
+        checkpoint = os.path.join(
+            args.checkpoint_dir,
+            "cpt.simpoint_{:02d}_inst_{}_weight_{}_interval_{}_warmup_{}"
+            .format(index, start, weight, args.interval, warmup),
+        )
+        m5.checkpoint(checkpoint)
+        print(
+            "Checkpoint for SimPoint {} (interval {}, weight {}) written to "
+            "{}.".format(index, interval, weight, checkpoint)
+        )
+
+    print("Took {} SimPoint checkpoints.".format(len(simpoints)))
+
+else:
+    match = re.search(
+        r"_interval_(\d+)_warmup_(\d+)$", os.path.normpath(args.checkpoint)
+    )
+    if not match:
+        fatal("{} is not a SimPoint checkpoint.".format(args.checkpoint))
+    interval, warmup = int(match.group(1)), int(match.group(2))
+
+    # The instruction counts restart from 0 after a checkpoint is restored.
+    if warmup > 0:
+        core.simpoint_start_insts = [warmup, warmup + interval]
+    else:
+        core.simpoint_start_insts = [interval]
+
+    root = Root(full_system=False, system=board)
+    m5.instantiate(args.checkpoint)
+
+    if warmup > 0:
+        exit_event = m5.simulate()
+        if exit_event.getCause() != SIMPOINT_CAUSE:
+            fatal("Simulation ended during the warmup: {}".format(
+                exit_event.getCause()
+            ))
+        print("Warmed up! Dumping and resetting stats!")
+        m5.stats.dump()
+        m5.stats.reset()
+
+    exit_event = m5.simulate()
+    print(
+        "Exiting @ tick {} because {}.".format(
+            m5.curTick(), exit_event.getCause()
+        )
+    )
+
+    # The statistics of the region are dumped when gem5 exits, after those
+    # of the warmup.
@@ -0,0 +1,584 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A content-addressed store of gem5 checkpoints.
+
+Each checkpoint is identified by a key, the hash of the configuration of the
+system it was taken from (config.json), of the workload binaries and of the
+tick it was taken at. The same system and workload checkpointed at the same
+tick therefore always gets the same key.
+
+The physical memory images (`*.pmem`) of a checkpoint are split into 4 KiB
+pages. Pages which only hold zeros are not stored at all and every other page
+is stored once, compressed, however many checkpoints it appears in. The other
+files of a checkpoint (m5.cpt, ...) are stored the same way, as whole files.
+The checkpoints of a system are mostly made of zero pages and of pages shared
+with its other checkpoints, so they take a fraction of their size on disk.
+
+A stored checkpoint is turned back into a directory gem5 can restore from
+with `materialize`, which is what `Simulator(checkpoint_path=...)` is given.
+Its memory images are written as raw sparse files, in which the zero pages
+are holes, rather than gzipped. gem5 reads them transparently (zlib's
+`gzread` passes non-gzip files through) and only copies their non-zero words
+into the simulated memory, whose zero pages are never touched. Disk space,
+materializing and the resident memory of a restored simulation then grow with
+the non-zero pages, and concurrent restores of the same checkpoint share it
+through the page cache. Restore time does not: gem5 still reads the whole
+image and scans every word of it before the first tick, holes included, so it
+grows with the configured memory size. Restoring in time proportional to the
+working set, by mapping the image and faulting pages in on demand, needs
+`PhysicalMemory::unserializeStore` in gem5 itself to be changed.
+`sparsify` converts the memory images of any checkpoint directory the same
+way.
+
+The store is a directory (by default `checkpoint-store`, or the
+`GEM5_CHECKPOINT_STORE` environment variable) holding:
+
+- `objects/`: the compressed pages and files, named by their SHA-256.
+- `checkpoints/<key>.json`: the manifest of each checkpoint.
+- `materialized/<key>/`: the checkpoints materialized so far.
+
+Usage:
+------
+
+```
+python3 -m util.checkpoint_store put checkpoint-directory \
+    --config m5out/config.json --workload <path/to/binary>
+python3 -m util.checkpoint_store list
+python3 -m util.checkpoint_store materialize <key> [-o <dir>] [--gzip]
+python3 -m util.checkpoint_store sparsify checkpoint-directory
+python3 -m util.checkpoint_store remove <key>
+python3 -m util.checkpoint_store gc
+```
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .compress import compress, decompress
+
+DEFAULT_ROOT = os.environ.get("GEM5_CHECKPOINT_STORE", "checkpoint-store")
+
+PAGE_SIZE = 4096
+ZERO_PAGE = bytes(PAGE_SIZE)
+
+# The number of pages read or written at a time.
+PAGES_PER_CHUNK = 256
+
+
+def file_digest(path: str) -> str:
+    """
+    The SHA-256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_digest(config_file: str) -> str:
+    """
+    The SHA-256 of a gem5 config.json file. The JSON is re-serialized with
+    sorted keys first, so the digest does not depend on how it was written.
+    """
+    with open(config_file) as f:
+        config = json.load(f)
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def read_tick(checkpoint_dir: str) -> int:
+    """
+    The tick a checkpoint was taken at, read from its m5.cpt file.
+    """
+    with open(os.path.join(checkpoint_dir, "m5.cpt")) as f:
+        for line in f:
+            match = re.match(r"curTick=(\d+)", line)
+            if match:
+                return int(match.group(1))
+    raise ValueError(f"No curTick in the m5.cpt of '{checkpoint_dir}'.")
+
+
+def checkpoint_key(config: str, workload: str, tick: int) -> str:
+    """
+    The key of a checkpoint, given the digests of its configuration and of
+    its workload, and its tick.
+    """
+    key = f"{config}\n{workload}\n{tick}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _open_pmem(path: str, mode: str):
+    """
+    Open a physical memory image. gem5 writes them gzipped, but raw images
+    are read too.
+    """
+    if "r" in mode:
+        with open(path, "rb") as f:
+            if f.read(2) != b"\x1f\x8b":
+                return open(path, mode)
+        return gzip.open(path, mode)
+    # Zero pages dominate these images and the fastest level compresses them
+    # just as well.
+    return gzip.open(path, mode, compresslevel=1)
+
+
+def _write_sparse(
+    path: str,
+    pages: Iterable[Tuple[int, bytes]],
+    page_size: int,
+    size: Optional[int] = None,
+) -> None:
+    """
+    Write a raw physical memory image holding `pages`, given as (page index,
+    contents). The pages not given are left as holes, which take no disk
+    space and read as zeros.
+
+    :param size: The size of the image. If not given, the caller must set it
+    with `os.truncate`.
+    """
+    with open(path, "wb") as f:
+        for index, page in pages:
+            f.seek(index * page_size)
+            f.write(page)
+        if size is not None:
+            f.truncate(size)
+
+
+def _iter_pages(f: BinaryIO) -> Iterator[bytes]:
+    """
+    Iterate over the pages of an open physical memory image. The last page
+    may be short.
+    """
+    while True:
+        chunk = f.read(PAGE_SIZE * PAGES_PER_CHUNK)
+        if not chunk:
+            break
+        for offset in range(0, len(chunk), PAGE_SIZE):
+            yield chunk[offset : offset + PAGE_SIZE]
+
+
+def sparsify(checkpoint_dir: str) -> int:
+    """
+    Rewrite the gzipped memory images of a checkpoint directory as raw
+    sparse files, which gem5 restores without decompressing them. The
+    directory is modified in place.
+
+    :returns: The number of memory images rewritten.
+    """
+    rewritten = 0
+    for directory, _, names in os.walk(checkpoint_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            if not name.endswith(".pmem"):
+                continue
+            with open(path, "rb") as f:
+                if f.read(2) != b"\x1f\x8b":
+                    continue
+
+            size = 0
+            tmp = f"{path}.tmp-{os.getpid()}"
+
+            def non_zero_pages(f):
+                nonlocal size
+                for index, page in enumerate(_iter_pages(f)):
+                    size += len(page)
+                    if page != ZERO_PAGE[: len(page)]:
+                        yield index, page
+
+            # The size is only known once all the pages have been read.
+            with gzip.open(path, "rb") as f:
+                _write_sparse(tmp, non_zero_pages(f), PAGE_SIZE)
+            os.truncate(tmp, size)
+            os.replace(tmp, path)
+            rewritten += 1
+    return rewritten
+
+
+class CheckpointStore:
+    def __init__(self, root: str = DEFAULT_ROOT) -> None:
+        """
+        :param root: The directory of the store. It is created if needed.
+        """
+        self.root = root
+        for directory in ("objects", "checkpoints", "materialized"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def _manifest_path(self, key: str) -> str:
+        return os.path.join(self.root, "checkpoints", f"{key}.json")
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        # Stores may be shared by concurrent gem5 runs, so an object or a
+        # manifest only appears under its final name once it is complete.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _put_object(self, data: bytes) -> Tuple[str, bool]:
+        """
+        Store `data` unless an identical object is already stored.
+
+        :returns: The digest of the object and whether it was new.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        self._write_atomic(path, compress(data))
+        return digest, True
+
+    def _get_object(self, digest: str) -> bytes:
+        with open(self._object_path(digest), "rb") as f:
+            return decompress(f.read())
+
+    def put(
+        self,
+        checkpoint_dir: str,
+        config_file: str,
+        workloads: List[str],
+        tick: Optional[int] = None,
+    ) -> str:
+        """
+        Add a checkpoint to the store.
+
+        :param checkpoint_dir: The directory written by gem5.
+        :param config_file: The config.json of the simulation which took the
+        checkpoint.
+        :param workloads: The binaries and disk images of the workload.
+        :param tick: The tick of the checkpoint. Read from m5.cpt by default.
+
+        :returns: The key of the checkpoint.
+        """
+        if tick is None:
+            tick = read_tick(checkpoint_dir)
+        workload = hashlib.sha256(
+            "\n".join(sorted(file_digest(w) for w in workloads)).encode()
+        ).hexdigest()
+        config = config_digest(config_file)
+        key = checkpoint_key(config, workload, tick)
+        if os.path.exists(self._manifest_path(key)):
+            return key
+
+        manifest = {
+            "key": key,
+            "config": config,
+            "workload": workload,
+            "tick": tick,
+            "files": {},
+            "memories": {},
+        }
+        new_pages = 0
+        for directory, _, names in os.walk(checkpoint_dir):
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                rel_path = os.path.relpath(path, checkpoint_dir)
+                if not name.endswith(".pmem"):
+                    with open(path, "rb") as f:
+                        digest, _ = self._put_object(f.read())
+                    manifest["files"][rel_path] = digest
+                    continue
+
+                pages = []
+                size = 0
+                with _open_pmem(path, "rb") as f:
+                    for index, page in enumerate(_iter_pages(f)):
+                        size += len(page)
+                        if page == ZERO_PAGE[: len(page)]:
+                            continue
+                        digest, new = self._put_object(page)
+                        pages.append([index, digest])
+                        new_pages += new
+                manifest["memories"][rel_path] = {
+                    "size": size,
+                    "page_size": PAGE_SIZE,
+                    "pages": pages,
+                }
+        manifest["new_pages"] = new_pages
+
+        self._write_atomic(
+            self._manifest_path(key), json.dumps(manifest).encode()
+        )
+        return key
+
+    def resolve(self, key: str) -> str:
+        """
+        Find the full key of a stored checkpoint from a unique prefix of it.
+
+        :raises KeyError: If no checkpoint, or more than one, matches.
+        """
+        matches = [k for k in self.keys() if k.startswith(key)]
+        if len(matches) != 1:
+            raise KeyError(
+                f"'{key}' matches {len(matches)} stored checkpoints, "
+                "expected 1."
+            )
+        return matches[0]
+
+    def keys(self) -> List[str]:
+        """
+        The keys of all the stored checkpoints.
+        """
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(os.path.join(self.root, "checkpoints"))
+            if name.endswith(".json")
+        )
+
+    def manifest(self, key: str) -> Dict[str, Any]:
+        """
+        The manifest of a stored checkpoint, given its key or a prefix of it.
+        """
+        with open(self._manifest_path(self.resolve(key))) as f:
+            return json.load(f)
+
+    def materialize(
+        self, key: str, path: Optional[str] = None, sparse: bool = True
+    ) -> str:
+        """
+        Write a stored checkpoint out as a directory gem5 can restore from.
+        A checkpoint already materialized at `path` is reused.
+
+        :param key: The key of the checkpoint, or a unique prefix of it.
+        :param path: The directory to write. Defaults to
+        `materialized/<key>` in the store.
+        :param sparse: Write the memory images as raw sparse files. If
+        False, they are gzipped as gem5 writes them, which is only useful to
+        copy the checkpoint to a file system without sparse files.
+
+        :returns: The checkpoint directory.
+        """
+        manifest = self.manifest(key)
+        if path is None:
+            path = os.path.join(self.root, "materialized", manifest["key"])
+        if os.path.isdir(path):
+            return path
+
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        for rel_path, digest in manifest["files"].items():
+            self._write_atomic(
+                os.path.join(tmp, rel_path), self._get_object(digest)
+            )
+        for rel_path, memory in manifest["memories"].items():
+            self._write_memory(os.path.join(tmp, rel_path), memory, sparse)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process materialized the same checkpoint first.
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(tmp)
+        return path
+
+    def _write_memory(
+        self, path: str, memory: Dict[str, Any], sparse: bool
+    ) -> None:
+        page_size = memory["page_size"]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if sparse:
+            _write_sparse(
+                path,
+                (
+                    (index, self._get_object(digest))
+                    for index, digest in memory["pages"]
+                ),
+                page_size,
+                memory["size"],
+            )
+            return
+
+        zeros = bytes(page_size * PAGES_PER_CHUNK)
+        with _open_pmem(path, "wb") as f:
+            position = 0
+            for index, digest in memory["pages"]:
+                gap = index * page_size - position
+                while gap > 0:
+                    position += f.write(zeros[: min(gap, len(zeros))])
+                    gap = index * page_size - position
+                position += f.write(self._get_object(digest))
+            while position < memory["size"]:
+                position += f.write(
+                    zeros[: min(memory["size"] - position, len(zeros))]
+                )
+
+    def remove(self, key: str) -> None:
+        """
+        Remove a checkpoint from the store. Its objects are only deleted by
+        `gc`, as other checkpoints may share them.
+        """
+        key = self.resolve(key)
+        os.remove(self._manifest_path(key))
+        shutil.rmtree(
+            os.path.join(self.root, "materialized", key), ignore_errors=True
+        )
+
+    def gc(self) -> int:
+        """
+        Delete the objects no stored checkpoint refers to.
+
+        :returns: The number of objects deleted.
+        """
+        referenced = set()
+        for key in self.keys():
+            manifest = self.manifest(key)
+            referenced.update(manifest["files"].values())
+            for memory in manifest["memories"].values():
+                referenced.update(digest for _, digest in memory["pages"])
+
+        deleted = 0
+        objects = os.path.join(self.root, "objects")
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                if ".tmp-" in name:
+                    # An object still being written by `put`.
+                    continue
+                if prefix + name not in referenced:
+                    os.remove(os.path.join(objects, prefix, name))
+                    deleted += 1
+        return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Store gem5 checkpoints by key, deduplicating their "
+        "memory pages."
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=DEFAULT_ROOT,
+        help="The directory of the store.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    put_parser = subparsers.add_parser("put", help="Add a checkpoint.")
+    put_parser.add_argument(
+        "checkpoint_dir", type=str, help="The checkpoint directory."
+    )
+    put_parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help="The config.json of the run which took the checkpoint.",
+    )
+    put_parser.add_argument(
+        "--workload",
+        type=str,
+        action="append",
+        required=True,
+        help="A binary or disk image of the workload. May be given more "
+        "than once.",
+    )
+    put_parser.add_argument(
+        "--tick",
+        type=int,
+        help="The tick of the checkpoint. Read from m5.cpt by default.",
+    )
+
+    get_parser = subparsers.add_parser(
+        "materialize", help="Write a checkpoint out as a directory."
+    )
+    get_parser.add_argument("key", type=str, help="The checkpoint key.")
+    get_parser.add_argument(
+        "-o", "--outdir", type=str, help="The directory to write."
+    )
+    get_parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Gzip the memory images instead of writing sparse files.",
+    )
+
+    sparsify_parser = subparsers.add_parser(
+        "sparsify",
+        help="Rewrite the memory images of a checkpoint directory as sparse "
+        "files.",
+    )
+    sparsify_parser.add_argument(
+        "checkpoint_dir", type=str, help="The checkpoint directory."
+    )
+
+    subparsers.add_parser("list", help="List the stored checkpoints.")
+
+    remove_parser = subparsers.add_parser(
+        "remove", help="Remove a checkpoint."
+    )
+    remove_parser.add_argument("key", type=str, help="The checkpoint key.")
+
+    subparsers.add_parser(
+        "gc", help="Delete the objects of removed checkpoints."
+    )
+    args = parser.parse_args()
+
+    store = CheckpointStore(args.store)
+    if args.command == "put":
+        print(
+            store.put(
+                args.checkpoint_dir, args.config, args.workload, args.tick
+            )
+        )
+    elif args.command == "materialize":
+        print(store.materialize(args.key, args.outdir, not args.gzip))
+    elif args.command == "sparsify":
+        print(f"Rewrote {sparsify(args.checkpoint_dir)} memory images.")
+    elif args.command == "list":
+        for key in store.keys():
+            manifest = store.manifest(key)
+            pages = sum(
+                len(memory["pages"])
+                for memory in manifest["memories"].values()
+            )
+            print(
+                f"{key}\ttick {manifest['tick']}\t{pages} non-zero pages, "
+                f"{manifest['new_pages']} not shared with earlier "
+                "checkpoints"
+            )
+    elif args.command == "remove":
+        store.remove(args.key)
+    else:
+        print(f"Deleted {store.gc()} objects.")
@@ -0,0 +1,72 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compression of the blobs written by the tools in this package.
+
+zstd is used if the `zstandard` package is installed, and zlib otherwise.
+Both formats are recognized by their header when decompressing, so data
+written on a host with zstd can be read on any host which also has it, and
+data written with zlib can be read everywhere.
+"""
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# The name of the algorithm `compress` uses on this host.
+ALGORITHM = "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data: bytes, level: int = 3) -> bytes:
+    """
+    Compress `data` with zstd if available, and zlib otherwise.
+    """
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompress data written by `compress`, whichever algorithm was used.
+
+    :raises ImportError: If the data is zstd compressed but the `zstandard`
+    package is not installed.
+    """
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ImportError(
+                "The zstandard package is required to read this data. "
+                "Install it with `pip install zstandard`."
+            )
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
@@ -0,0 +1,126 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Lazy access to the statistics of a running gem5 simulation.
+
+`get_simstat(root).to_json()` converts every statistic in the system before a
+single value can be read from it. `LiveStats` instead walks the statistics
+groups of the simulated system along the requested path only, so reading a
+statistic costs time proportional to the length of its path rather than to
+the size of the system.
+
+Paths are the names used in stats.txt and may contain glob patterns, e.g.:
+
+```
+stats = LiveStats(root)
+stats.sum("system.processor.cores*.core.exec_context.thread_0.numInsts")
+```
+
+This module is used from gem5 configuration scripts but does not import m5
+itself; it only relies on the `getStatGroups()` and `getStats()` methods of
+the objects it is given.
+"""
+
+import fnmatch
+from typing import Dict, List
+
+
+class LiveStats:
+    def __init__(self, root) -> None:
+        """
+        :param root: The simulation's Root object. It must have been
+        instantiated.
+        """
+        self._root = root
+
+    def resolve(self, path: str) -> Dict[str, float]:
+        """
+        Find all the statistics matching `path`.
+
+        :returns: A dictionary mapping the full name of each matching
+        statistic to its current value.
+        """
+        found = {}
+        self._resolve(self._root, path.split("."), "", found)
+        return found
+
+    def get(self, path: str) -> float:
+        """
+        Get the value of the single statistic at `path`.
+
+        :raises KeyError: If `path` does not match exactly one statistic.
+        """
+        found = self.resolve(path)
+        if len(found) != 1:
+            raise KeyError(
+                f"'{path}' matches {len(found)} statistics, expected 1."
+            )
+        return next(iter(found.values()))
+
+    def sum(self, path: str) -> float:
+        """
+        Get the sum of all the statistics matching `path`, e.g. the number of
+        instructions committed across all cores.
+
+        :raises KeyError: If `path` does not match any statistic.
+        """
+        found = self.resolve(path)
+        if not found:
+            raise KeyError(f"'{path}' does not match any statistic.")
+        return sum(found.values())
+
+    def _resolve(
+        self, group, parts: List[str], prefix: str, found: Dict[str, float]
+    ) -> None:
+        # The names of statistics groups may themselves contain dots (e.g.
+        # "exec_context.thread_0"), so every split of the remaining path is
+        # tried.
+        groups = None
+        for i in range(1, len(parts) + 1):
+            name = ".".join(parts[:i])
+            rest = parts[i:]
+            if rest:
+                if groups is None:
+                    groups = group.getStatGroups()
+                for key, subgroup in groups.items():
+                    if fnmatch.fnmatchcase(key, name):
+                        self._resolve(subgroup, rest, f"{prefix}{key}.", found)
+            else:
+                for info in group.getStats():
+                    if fnmatch.fnmatchcase(info.name, name):
+                        found[prefix + info.name] = _value(info)
+
+
+def _value(info) -> float:
+    """
+    The current value of a statistic. Vector statistics are summed.
+    """
+    info.prepare()
+    value = info.value
+    if isinstance(value, (list, tuple)):
+        return float(sum(value))
+    return float(value)
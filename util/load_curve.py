@@ -0,0 +1,225 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+A loaded-latency curve measured in a single simulation, window by window.
+
+A traffic generator is run at decreasing injection periods, from low to high
+load, in windows of a fixed number of ticks. After each window the
+simulation loop gives `LoadCurve` the generator's cumulative byte, request
+and latency counters, and `LoadCurve` decides what to simulate next:
+
+- A point ends early once the bandwidth and the mean latency of its last
+  `min_windows` windows are within `tolerance` of each other, and at the
+  latest after `max_windows` windows. The first window of each point is a
+  warm-up and is not measured.
+- A point is saturated when its latency is more than `latency_factor` times
+  the latency of the first point, or when the generator achieves less than
+  `min_acceptance` of the bandwidth it offers. A window whose latency
+  diverges past the limit ends its point at once.
+- The sweep stops at the first saturated point, so no time is spent on the
+  points past saturation.
+
+This module is used from gem5 configuration scripts but does not import m5
+itself:
+
+```
+curve = LoadCurve(periods=[8000, 4000, 2000, 1000], request_size=64,
+                  window_ticks=10000000, max_windows=100)
+while not curve.done:
+    m5.simulate()  # The generator exits at the end of each window.
+    curve.add_window(m5.curTick(), nbytes=..., requests=..., latency=...)
+```
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class LoadCurve:
+    def __init__(
+        self,
+        periods: Sequence[int],
+        request_size: int,
+        window_ticks: int,
+        max_windows: int,
+        min_windows: int = 3,
+        tolerance: float = 0.05,
+        latency_factor: float = 3.0,
+        min_acceptance: float = 0.9,
+        start_tick: int = 0,
+    ) -> None:
+        """
+        :param periods: The injection periods, in ticks. They are run from
+        the longest to the shortest.
+        :param request_size: The bytes of each request.
+        :param window_ticks: The length of a window.
+        :param max_windows: The most windows a point is run for.
+        :param min_windows: The number of measured windows which must agree
+        for a point to end early.
+        :param tolerance: The relative spread of their bandwidth and latency
+        below which the windows agree.
+        :param latency_factor: A point whose latency is this many times the
+        latency of the first point is saturated.
+        :param min_acceptance: A point which achieves less than this fraction
+        of the bandwidth it offers is saturated.
+        :param start_tick: The tick the counters were zero at.
+        """
+        if not periods:
+            raise ValueError("At least one period is needed.")
+        self._periods = sorted(periods, reverse=True)
+        self.request_size = request_size
+        self.window_ticks = window_ticks
+        self.max_windows = max(max_windows, 1)
+        self.min_windows = max(min_windows, 1)
+        self.tolerance = tolerance
+        self.latency_factor = latency_factor
+        self.min_acceptance = min_acceptance
+
+        self._last = (start_tick, 0.0, 0.0, 0.0)
+        self._windows: List[Dict[str, float]] = []
+        self._base_latency: Optional[float] = None
+        self.done = False
+
+        # One entry per point run, by increasing load.
+        self.points: List[Dict[str, Any]] = []
+
+    @property
+    def period(self) -> Optional[int]:
+        """
+        The period of the point being run, or None once the sweep is done.
+        """
+        if self.done:
+            return None
+        return self._periods[len(self.points)]
+
+    def offered(self, period: int) -> float:
+        """
+        The bandwidth offered at `period`, in bytes per second.
+        """
+        return self.request_size / (period * 1e-12)
+
+    def add_window(
+        self, tick: int, nbytes: float, requests: float, latency: float
+    ) -> None:
+        """
+        Record the end of a window of the current point.
+
+        :param tick: The current tick.
+        :param nbytes: The bytes read and written so far.
+        :param requests: The requests answered so far.
+        :param latency: The total latency of those requests, in ticks.
+        """
+        if self.done:
+            raise RuntimeError("The sweep is done.")
+        last_tick, last_bytes, last_requests, last_latency = self._last
+        self._last = (tick, nbytes, requests, latency)
+        self._windows.append(
+            {
+                "ticks": tick - last_tick,
+                "bytes": nbytes - last_bytes,
+                "requests": requests - last_requests,
+                "latency": latency - last_latency,
+            }
+        )
+
+        measured = self._windows[1:] or self._windows
+        window = self._measure([self._windows[-1]])
+        if self._diverged(window):
+            self._end_point(measured, converged=False, diverged=True)
+        elif len(self._windows) > self.min_windows and self._converged(
+            [self._measure([w]) for w in self._windows[-self.min_windows :]]
+        ):
+            self._end_point(measured, converged=True)
+        elif len(self._windows) >= self.max_windows:
+            self._end_point(measured, converged=False)
+
+    def _measure(self, windows: List[Dict[str, float]]) -> Dict[str, float]:
+        ticks = sum(w["ticks"] for w in windows)
+        requests = sum(w["requests"] for w in windows)
+        return {
+            "accepted": sum(w["bytes"] for w in windows) / (ticks * 1e-12)
+            if ticks
+            else 0.0,
+            # A window without responses has an unbounded latency.
+            "latency": sum(w["latency"] for w in windows) / requests
+            if requests
+            else float("inf"),
+        }
+
+    def _diverged(self, measure: Dict[str, float]) -> bool:
+        if self._base_latency is None:
+            return False
+        return measure["latency"] > self.latency_factor * self._base_latency
+
+    def _converged(self, measures: List[Dict[str, float]]) -> bool:
+        for key in ("accepted", "latency"):
+            values = [m[key] for m in measures]
+            mean = sum(values) / len(values)
+            if not mean or mean == float("inf"):
+                return False
+            if (max(values) - min(values)) / mean > self.tolerance:
+                return False
+        return True
+
+    def _end_point(
+        self,
+        windows: List[Dict[str, float]],
+        converged: bool,
+        diverged: bool = False,
+    ) -> None:
+        period = self.period
+        point = {
+            "period": period,
+            "offered": self.offered(period),
+            **self._measure(windows),
+            "windows": len(self._windows),
+            "ticks": sum(w["ticks"] for w in self._windows),
+            "converged": converged,
+        }
+        if self._base_latency is None:
+            self._base_latency = point["latency"]
+        point["saturated"] = (
+            diverged
+            or self._diverged(point)
+            or point["accepted"] < self.min_acceptance * point["offered"]
+        )
+        self.points.append(point)
+        self._windows = []
+        self.done = point["saturated"] or len(self.points) == len(
+            self._periods
+        )
+
+    @property
+    def saturation_period(self) -> Optional[int]:
+        """
+        The period of the first saturated point, or None if no point
+        saturated.
+        """
+        for point in self.points:
+            if point["saturated"]:
+                return point["period"]
+        return None
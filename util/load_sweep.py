@@ -0,0 +1,322 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Latency against offered load of the ruby-network configurations, and their
+saturation point.
+
+materials/developing-gem5-models/10-ruby-network/network_config.py is run
+at increasing injection rates, each in its own gem5 process, and the mean
+packet latency of the network and the bandwidth the generator cores achieve
+are read from every run. Only Garnet networks record their packet latency,
+so SimplePt2Pt cannot be swept. A run is saturated when its latency is more
+than `--latency-factor` times the latency of the lowest rate, or when the
+cores achieve less than `--min-acceptance` of the bandwidth they offer.
+
+Once the first saturated rate is found, the interval between it and the
+last rate which is not saturated is refined: each round runs `--jobs` rates
+spread over the interval at once and keeps the sub-interval where the
+network saturates.
+
+Usage:
+------
+
+```
+python3 -m util.load_sweep 16 GarnetMesh --gem5 <MI_example gem5 binary> \
+    --rates 1GB/s 2GB/s 4GB/s 8GB/s 16GB/s --refine 2 \
+    -- --memory-channels 4 --generator random
+```
+
+Arguments after `--` are given to network_config.py.
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+from .noc_estimate import parse_bandwidth
+from .sweep import run_sweep, write_table
+
+NETWORK_SCRIPT = os.path.join(
+    "materials",
+    "developing-gem5-models",
+    "10-ruby-network",
+    "network_config.py",
+)
+
+# Only Garnet networks record the latency of their packets.
+LATENCY_STAT = "*.network.average_packet_latency"
+BANDWIDTH_STATS = [
+    "system.processor.cores*.generator.readBW",
+    "system.processor.cores*.generator.writeBW",
+]
+
+
+def check_network(network: str) -> None:
+    """
+    Check that `network` records the packet latency the sweep reads.
+
+    :raises ValueError: If `network` is not a Garnet network.
+    """
+    if not network.startswith("Garnet"):
+        raise ValueError(
+            f"{network} does not record the packet latency. Sweep a Garnet "
+            "network, e.g. GarnetMesh."
+        )
+
+
+def run_loads(
+    rates: Sequence[str],
+    cores: int,
+    network: str,
+    gem5: str,
+    options: Sequence[str] = (),
+    outdir: str = "load-sweep",
+    jobs: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run network_config.py at each of `rates`.
+
+    :param network: A Garnet network class, e.g. GarnetMesh.
+
+    :raises ValueError: If `network` is not a Garnet network, which would
+    not record the packet latency.
+    :returns: One row per rate with the offered and accepted bandwidth of
+    all the cores, in bytes per second, and the mean packet latency, in
+    ticks.
+    """
+    check_network(network)
+    config = {
+        "command": [
+            gem5,
+            "--outdir={outdir}",
+            NETWORK_SCRIPT,
+            str(cores),
+            network,
+            "--rate={rate}",
+            *options,
+        ],
+        "parameters": {"rate": list(rates)},
+        "stats": [LATENCY_STAT] + BANDWIDTH_STATS,
+    }
+    rows = []
+    for result in run_sweep(config, outdir, jobs):
+        latency = [
+            v for k, v in result.items() if fnmatch.fnmatch(k, LATENCY_STAT)
+        ]
+        accepted = sum(
+            v
+            for k, v in result.items()
+            if any(fnmatch.fnmatch(k, p) for p in BANDWIDTH_STATS)
+        )
+        rows.append(
+            {
+                "rate": result["rate"],
+                "exit_code": result["exit_code"],
+                "offered": parse_bandwidth(result["rate"]) * cores,
+                "accepted": accepted,
+                "latency": latency[0] if latency else None,
+            }
+        )
+    return rows
+
+
+def is_saturated(
+    row: Dict[str, Any],
+    base_latency: float,
+    latency_factor: float = 3.0,
+    min_acceptance: float = 0.9,
+) -> bool:
+    """
+    Whether a run is saturated, compared to the latency of the lowest rate.
+    A run which failed counts as saturated.
+    """
+    if row["exit_code"] != 0 or row["latency"] is None:
+        return True
+    return (
+        row["latency"] > latency_factor * base_latency
+        or row["accepted"] < min_acceptance * row["offered"]
+    )
+
+
+def find_saturation(
+    rates: Sequence[str],
+    cores: int,
+    network: str,
+    gem5: str,
+    options: Sequence[str] = (),
+    outdir: str = "load-sweep",
+    jobs: Optional[int] = None,
+    refine: int = 0,
+    latency_factor: float = 3.0,
+    min_acceptance: float = 0.9,
+) -> Dict[str, Any]:
+    """
+    Run the sweep, then refine the saturation point `refine` times.
+
+    :returns: The rows of every run, sorted by rate, each with whether it
+    is saturated, and the lowest saturated rate per core, in bytes per
+    second, or None if no rate saturates the network.
+    """
+    rows = run_loads(rates, cores, network, gem5, options, outdir, jobs)
+    rows.sort(key=lambda row: row["offered"])
+    base = rows[0]
+    if base["exit_code"] != 0 or not base["latency"]:
+        raise RuntimeError(
+            f"The run at the lowest rate, {base['rate']}, failed. See its "
+            "sweep.log."
+        )
+
+    def saturated(row):
+        return is_saturated(
+            row, base["latency"], latency_factor, min_acceptance
+        )
+
+    for _ in range(refine):
+        first = next((i for i, row in enumerate(rows) if saturated(row)), None)
+        if first is None or first == 0:
+            break
+        low = rows[first - 1]["offered"] / cores
+        high = rows[first]["offered"] / cores
+        points = jobs or os.cpu_count()
+        new_rates = []
+        for i in range(points):
+            rate = low + (high - low) * (i + 1) / (points + 1)
+            new_rates.append(f"{rate / 2 ** 20:.6g}MB/s")
+        rows += run_loads(
+            new_rates, cores, network, gem5, options, outdir, jobs
+        )
+        rows.sort(key=lambda row: row["offered"])
+
+    for row in rows:
+        row["saturated"] = saturated(row)
+    first = next((row for row in rows if row["saturated"]), None)
+    return {
+        "rows": rows,
+        "saturation_rate": first["offered"] / cores if first else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep the injection rate of network_config.py and find "
+        "where the network saturates. Arguments after `--` are given to "
+        "network_config.py."
+    )
+    parser.add_argument(
+        "cores", type=int, help="The number of generator cores."
+    )
+    parser.add_argument(
+        "network", type=str, help="The Garnet network class."
+    )
+    parser.add_argument(
+        "--gem5",
+        type=str,
+        required=True,
+        help="A gem5 binary built with the MI_example protocol.",
+    )
+    parser.add_argument(
+        "--rates",
+        type=str,
+        nargs="+",
+        default=["1GB/s", "2GB/s", "4GB/s", "8GB/s", "16GB/s", "32GB/s"],
+        help="The injection rates of each core.",
+    )
+    parser.add_argument(
+        "--refine",
+        type=int,
+        default=1,
+        help="The rounds of refinement of the saturation point.",
+    )
+    parser.add_argument(
+        "--latency-factor",
+        type=float,
+        default=3.0,
+        help="A run whose latency is this many times the latency of the "
+        "lowest rate is saturated.",
+    )
+    parser.add_argument(
+        "--min-acceptance",
+        type=float,
+        default=0.9,
+        help="A run whose cores achieve less than this fraction of the "
+        "bandwidth they offer is saturated.",
+    )
+    parser.add_argument(
+        "--jobs", type=int, help="The number of runs at a time."
+    )
+    parser.add_argument(
+        "--outdir",
+        type=str,
+        default="load-sweep",
+        help="The output directory of the runs and of results.csv.",
+    )
+    # The arguments after `--` are given to network_config.py.
+    argv = sys.argv[1:]
+    options = []
+    if "--" in argv:
+        index = argv.index("--")
+        argv, options = argv[:index], argv[index + 1 :]
+    args = parser.parse_args(argv)
+    try:
+        check_network(args.network)
+    except ValueError as e:
+        parser.error(str(e))
+
+    result = find_saturation(
+        args.rates,
+        args.cores,
+        args.network,
+        args.gem5,
+        options,
+        args.outdir,
+        args.jobs,
+        args.refine,
+        args.latency_factor,
+        args.min_acceptance,
+    )
+    print(
+        f"{'rate':>14} {'offered GB/s':>12} {'accepted GB/s':>13} "
+        f"{'latency':>10}"
+    )
+    for row in result["rows"]:
+        print(
+            f"{row['rate']:>14} {row['offered'] / 2 ** 30:>12.3f} "
+            f"{row['accepted'] / 2 ** 30:>13.3f} "
+            f"{row['latency'] or float('nan'):>10.1f}"
+            + (" saturated" if row["saturated"] else "")
+        )
+    if result["saturation_rate"] is None:
+        print("The network did not saturate. Try higher rates.")
+    else:
+        print(
+            "The network saturates at "
+            f"{result['saturation_rate'] / 2 ** 30:.3f}GB/s per core."
+        )
+    write_table(result["rows"], os.path.join(args.outdir, "results.csv"))
@@ -0,0 +1,281 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Bandwidth and latency curves of each channel of a multi-channel memory.
+
+materials/using-gem5/03-running/example3/traffGen_multichannel.py is run
+for every combination of read percentage and injection period, each in its
+own gem5 process, and the bandwidth, read latency, bus utilization and row
+buffer hit rate of every channel are read from each run. With several
+channels, the curves show whether the interleaving spreads the load evenly
+and where each channel saturates; the row hit rate shows the bank conflicts
+the interleaving granularity causes.
+
+Usage:
+------
+
+```
+python3 -m util.mem_sweep DDR4_2400_16x4 NVM_2400_1x64 --gem5 <gem5 binary> \
+    --channels 4 --generators 4 --interleave 256B \
+    --rd-prct 100 70 0 --periods 4000 2000 1000 500 -- --mode linear
+```
+
+Arguments after `--` are given to traffGen_multichannel.py.
+"""
+
+import argparse
+import collections
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+from .sweep import run_sweep, write_table
+
+HARNESS_SCRIPT = os.path.join(
+    "materials",
+    "using-gem5",
+    "03-running",
+    "example3",
+    "traffGen_multichannel.py",
+)
+
+# The statistics of each channel, by their column in the results. The row
+# hit rate is only measured by DRAM interfaces.
+CHANNEL_STATS = {
+    "read_bw": "avgRdBWSys",
+    "write_bw": "avgWrBWSys",
+    "read_latency": "dram.avgMemAccLat",
+    "bus_util": "dram.busUtil",
+    "row_hit_rate": "dram.pageHitRate",
+}
+
+# A single channel or generator is not numbered.
+CHANNEL_STAT = re.compile(r"^system\.mem_ctrls(\d*)\.(.+)$")
+GENERATOR_STAT = re.compile(r"^system\.generators(\d*)\.(.+)$")
+
+
+def run_channels(
+    devices: Sequence[str],
+    gem5: str,
+    channels: int = 1,
+    generators: int = 1,
+    interleave: str = "256B",
+    rd_prcts: Sequence[int] = (100,),
+    periods: Sequence[int] = (1000,),
+    block_size: int = 64,
+    options: Sequence[str] = (),
+    outdir: str = "mem-sweep",
+    jobs: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run the harness at every read percentage and period.
+
+    :returns: One row per run and channel with the bandwidth offered to
+    the channel and the bandwidth it achieved, in bytes per second, and its
+    mean read latency, in ticks. Each run also gets a row for the whole
+    memory, whose channel is "all" and whose read latency is the one the
+    generators see.
+    """
+    config = {
+        "command": [
+            gem5,
+            "--outdir={outdir}",
+            HARNESS_SCRIPT,
+            *devices,
+            f"--channels={channels}",
+            f"--generators={generators}",
+            f"--interleave={interleave}",
+            f"--block-size={block_size}",
+            "--rd-prct={rd_prct}",
+            "--period={period}",
+            *options,
+        ],
+        "parameters": {"rd_prct": list(rd_prcts), "period": list(periods)},
+        "stats": [
+            "system.mem_ctrls*." + stat for stat in CHANNEL_STATS.values()
+        ]
+        + ["system.generators*.avgReadLatency"],
+    }
+    rows = []
+    for result in run_sweep(config, outdir, jobs):
+        # Requests of `block_size` bytes every `period` picoseconds.
+        offered = generators * block_size / (result["period"] * 1e-12)
+        point = {
+            "rd_prct": result["rd_prct"],
+            "period": result["period"],
+            "exit_code": result["exit_code"],
+        }
+        stats = collections.defaultdict(dict)
+        latencies = []
+        for name, value in result.items():
+            match = CHANNEL_STAT.match(name)
+            if match:
+                stats[int(match.group(1) or 0)][match.group(2)] = value
+            elif GENERATOR_STAT.match(name):
+                latencies.append(value)
+
+        channel_rows = []
+        for channel in range(channels):
+            row = dict(point)
+            row["channel"] = channel
+            row["device"] = devices[channel % len(devices)]
+            row["offered"] = offered / channels
+            for column, stat in CHANNEL_STATS.items():
+                row[column] = stats[channel].get(stat)
+            row["accepted"] = (row["read_bw"] or 0) + (row["write_bw"] or 0)
+            channel_rows.append(row)
+
+        total = dict(point)
+        total["channel"] = "all"
+        total["device"] = "+".join(sorted(set(devices)))
+        total["offered"] = offered
+        total["read_bw"] = sum(row["read_bw"] or 0 for row in channel_rows)
+        total["write_bw"] = sum(row["write_bw"] or 0 for row in channel_rows)
+        total["accepted"] = total["read_bw"] + total["write_bw"]
+        total["read_latency"] = (
+            sum(latencies) / len(latencies) if latencies else None
+        )
+        rows += channel_rows + [total]
+    return rows
+
+
+def _cell(value: Any, scale: float = 1, digits: int = 3) -> str:
+    if value is None:
+        return "-"
+    return f"{value / scale:.{digits}f}"
+
+
+def print_curves(rows: List[Dict[str, Any]]) -> None:
+    """
+    Print the latency against the bandwidth of each channel, one table per
+    channel and read percentage, by increasing offered load.
+    """
+    curves = collections.defaultdict(list)
+    for row in rows:
+        curves[(str(row["channel"]), row["device"], row["rd_prct"])].append(
+            row
+        )
+    for (channel, device, rd_prct), curve in sorted(curves.items()):
+        print(f"\nChannel {channel} ({device}), {rd_prct}% reads")
+        print(
+            f"{'period':>8} {'offered GB/s':>12} {'accepted GB/s':>13} "
+            f"{'latency ns':>10} {'bus util %':>10} {'row hits %':>10}"
+        )
+        for row in sorted(curve, key=lambda row: row["offered"]):
+            print(
+                f"{row['period']:>8} {row['offered'] / 2 ** 30:>12.3f} "
+                f"{row['accepted'] / 2 ** 30:>13.3f} "
+                f"{_cell(row['read_latency'], 1000, 1):>10} "
+                f"{_cell(row.get('bus_util'), 1, 1):>10} "
+                f"{_cell(row.get('row_hit_rate'), 1, 1):>10}"
+                + ("" if row["exit_code"] == 0 else " failed")
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep the read percentage and the injection period of "
+        "traffGen_multichannel.py and report the bandwidth and latency of "
+        "each memory channel. Arguments after `--` are given to "
+        "traffGen_multichannel.py."
+    )
+    parser.add_argument(
+        "devices",
+        type=str,
+        nargs="+",
+        help="The memory interface classes, assigned to the channels in "
+        "turn.",
+    )
+    parser.add_argument(
+        "--gem5", type=str, required=True, help="The gem5 binary."
+    )
+    parser.add_argument(
+        "--channels", type=int, default=1, help="The number of channels."
+    )
+    parser.add_argument(
+        "--generators",
+        type=int,
+        default=1,
+        help="The number of traffic generators.",
+    )
+    parser.add_argument(
+        "--interleave",
+        type=str,
+        default="256B",
+        help="The granularity the channels are interleaved at.",
+    )
+    parser.add_argument(
+        "--rd-prct",
+        type=int,
+        nargs="+",
+        default=[100, 50, 0],
+        help="The read percentages.",
+    )
+    parser.add_argument(
+        "--periods",
+        type=int,
+        nargs="+",
+        default=[8000, 4000, 2000, 1000, 500],
+        help="The ticks between two requests of each generator.",
+    )
+    parser.add_argument(
+        "--block-size", type=int, default=64, help="The size of the requests."
+    )
+    parser.add_argument(
+        "--jobs", type=int, help="The number of runs at a time."
+    )
+    parser.add_argument(
+        "--outdir",
+        type=str,
+        default="mem-sweep",
+        help="The output directory of the runs and of results.csv.",
+    )
+    # The arguments after `--` are given to traffGen_multichannel.py.
+    argv = sys.argv[1:]
+    options = []
+    if "--" in argv:
+        index = argv.index("--")
+        argv, options = argv[:index], argv[index + 1 :]
+    args = parser.parse_args(argv)
+
+    rows = run_channels(
+        args.devices,
+        args.gem5,
+        args.channels,
+        args.generators,
+        args.interleave,
+        args.rd_prct,
+        args.periods,
+        args.block_size,
+        options,
+        args.outdir,
+        args.jobs,
+    )
+    print_curves(rows)
+    write_table(rows, os.path.join(args.outdir, "results.csv"))
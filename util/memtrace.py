@@ -0,0 +1,698 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Memory traces in gem5's packet trace format, and an indexed container for
+them.
+
+gem5's MemTraceProbe writes a gzipped stream of protobuf messages: the magic
+number "gem5", a `PacketHeader`, then one `Packet` per request. The stream
+can only be read from its start, so replaying a window of a large trace with
+`PyTrafficGen.createTrace` means inflating and skipping everything before it.
+This module reads and writes that format without gem5 or the protobuf
+package.
+
+`pack` converts a trace to an indexed trace: the packets are stored in
+chunks, one column per field, each chunk compressed on its own (with zstd if
+the `zstandard` package is installed, zlib otherwise). An index of the first
+and last tick of every chunk is stored at the end of the file, so a window
+of the trace is read by decompressing only the chunks it overlaps.
+
+`extract` writes a window of a trace, with its ticks rebased to 0, back to
+gem5's format for `createTrace`, and `split` cuts a window into slices of
+equal duration which several PyTrafficGens can replay side by side.
+
+Usage:
+------
+
+```
+python3 -m util.memtrace pack m5out/mem_trace.gz -o mem_trace.g5t
+python3 -m util.memtrace info mem_trace.g5t
+python3 -m util.memtrace extract mem_trace.g5t -o window.gz \
+    --start-tick 1000000 --end-tick 2000000
+python3 -m util.memtrace split mem_trace.g5t --slices 4 -o slices
+```
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .compress import compress, decompress
+
+# The magic number at the start of gem5's protobuf streams.
+PROTO_MAGIC = b"gem5"
+
+# The magic numbers at the start and at the end of an indexed trace.
+INDEXED_MAGIC = b"G5TRACE1"
+INDEX_MAGIC = b"G5TRIDX1"
+
+Packet = namedtuple(
+    "Packet", ["tick", "cmd", "addr", "size", "flags", "pkt_id", "pc"]
+)
+
+# The field number, array type code and whether the field is optional, of
+# every field of gem5's Packet message, in the order of `Packet`.
+PACKET_FIELDS = [
+    (1, "Q", False),
+    (2, "I", False),
+    (3, "Q", False),
+    (4, "I", False),
+    (5, "I", True),
+    (6, "Q", True),
+    (7, "Q", True),
+]
+
+_CHUNK_HEADER = struct.Struct("<IB")
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _parse_fields(message: bytes) -> Iterator[Tuple[int, Any]]:
+    """
+    Iterate over the (field number, value) pairs of a protobuf message.
+    Length-delimited values are returned as bytes.
+    """
+    pos = 0
+    end = len(message)
+    while pos < end:
+        key, pos = _read_varint(message, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(message, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(message, pos)
+            value = message[pos : pos + length]
+            pos += length
+        elif wire_type == 1:
+            value = struct.unpack_from("<Q", message, pos)[0]
+            pos += 8
+        elif wire_type == 5:
+            value = struct.unpack_from("<I", message, pos)[0]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}.")
+        yield field, value
+
+
+def _parse_header(message: bytes) -> Dict[str, Any]:
+    header = {"obj_id": "", "ver": 0, "tick_freq": 0, "id_strings": []}
+    for field, value in _parse_fields(message):
+        if field == 1:
+            header["obj_id"] = value.decode()
+        elif field == 2:
+            header["ver"] = value
+        elif field == 3:
+            header["tick_freq"] = value
+        elif field == 4:
+            entry = dict(_parse_fields(value))
+            header["id_strings"].append(
+                [entry.get(1, 0), entry.get(2, b"").decode()]
+            )
+    return header
+
+
+def _parse_packet(message: bytes) -> Packet:
+    values = [0] * 7
+    for field, value in _parse_fields(message):
+        if 1 <= field <= 7:
+            values[field - 1] = value
+    return Packet(*values)
+
+
+def _encode_header(header: Dict[str, Any]) -> bytes:
+    obj_id = header["obj_id"].encode()
+    out = bytearray(b"\x0a" + _varint(len(obj_id)) + obj_id)
+    out += b"\x10" + _varint(header["ver"])
+    out += b"\x18" + _varint(header["tick_freq"])
+    for key, value in header["id_strings"]:
+        value = value.encode()
+        entry = b"\x08" + _varint(key) + b"\x12" + _varint(len(value)) + value
+        out += b"\x22" + _varint(len(entry)) + entry
+    return bytes(out)
+
+
+def _encode_packet(packet: Packet, optional: Tuple[bool, ...]) -> bytes:
+    """
+    Encode a packet. `optional` tells which of the optional fields (flags,
+    pkt_id, pc) are written.
+    """
+    out = (
+        b"\x08"
+        + _varint(packet.tick)
+        + b"\x10"
+        + _varint(packet.cmd)
+        + b"\x18"
+        + _varint(packet.addr)
+        + b"\x20"
+        + _varint(packet.size)
+    )
+    if optional[0]:
+        out += b"\x28" + _varint(packet.flags)
+    if optional[1]:
+        out += b"\x30" + _varint(packet.pkt_id)
+    if optional[2]:
+        out += b"\x38" + _varint(packet.pc)
+    return out
+
+
+def _open_proto(path: str, mode: str) -> BinaryIO:
+    # gem5 gzips its protobuf streams when their name ends in ".gz".
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def read_proto_trace(path: str) -> Tuple[Dict[str, Any], Iterator[Packet]]:
+    """
+    Read a trace in gem5's packet trace format.
+
+    :returns: The trace header and an iterator over its packets. The
+    packets are read as the iterator is consumed.
+    """
+    f = _open_proto(path, "rb")
+    buf = f.read(1 << 20)
+    if buf[:4] != PROTO_MAGIC:
+        f.close()
+        raise ValueError(f"'{path}' is not a gem5 protobuf stream.")
+    length, pos = _read_varint(buf, 4)
+    header = _parse_header(buf[pos : pos + length])
+    pos += length
+
+    def packets() -> Iterator[Packet]:
+        nonlocal buf, pos
+        with f:
+            while True:
+                # Only parse the messages which are complete in the buffer.
+                end = len(buf)
+                while pos < end:
+                    try:
+                        length, start = _read_varint(buf, pos)
+                    except IndexError:
+                        break
+                    if start + length > end:
+                        break
+                    yield _parse_packet(buf[start : start + length])
+                    pos = start + length
+                more = f.read(1 << 20)
+                if not more:
+                    break
+                buf = buf[pos:] + more
+                pos = 0
+
+    return header, packets()
+
+
+def write_encoded_trace(
+    path: str, header: Dict[str, Any], chunks: Iterable[bytes]
+) -> None:
+    """
+    Write a trace in gem5's packet trace format, gzipped if `path` ends in
+    ".gz", from packets which are already encoded.
+
+    :param chunks: Any number of packet messages per chunk, each preceded
+    by its length as a varint.
+    """
+    with _open_proto(path, "wb") as f:
+        encoded = _encode_header(header)
+        f.write(PROTO_MAGIC + _varint(len(encoded)) + encoded)
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def write_proto_trace(
+    path: str,
+    header: Dict[str, Any],
+    packets: Iterator[Packet],
+    optional: Tuple[bool, bool, bool] = (True, True, True),
+) -> int:
+    """
+    Write a trace in gem5's packet trace format, gzipped if `path` ends in
+    ".gz".
+
+    :param optional: Whether the flags, pkt_id and pc fields are written.
+
+    :returns: The number of packets written.
+    """
+    count = 0
+
+    def chunks() -> Iterator[bytes]:
+        nonlocal count
+        batch = []
+        for packet in packets:
+            message = _encode_packet(packet, optional)
+            batch.append(_varint(len(message)))
+            batch.append(message)
+            count += 1
+            if len(batch) >= 1 << 16:
+                yield b"".join(batch)
+                batch = []
+        yield b"".join(batch)
+
+    write_encoded_trace(path, header, chunks())
+    return count
+
+
+def _encode_chunk(packets: List[Packet]) -> bytes:
+    """
+    Encode a chunk of packets as one column per field. An optional field
+    which is 0 in every packet of the chunk is left out.
+    """
+    columns = []
+    present = 0
+    for i, (_, typecode, optional) in enumerate(PACKET_FIELDS):
+        column = array(typecode, (packet[i] for packet in packets))
+        if optional and not any(column):
+            continue
+        present |= 1 << i
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column.tobytes())
+    return compress(
+        _CHUNK_HEADER.pack(len(packets), present) + b"".join(columns)
+    )
+
+
+def _decode_chunk(data: bytes) -> Dict[str, array]:
+    data = decompress(data)
+    count, present = _CHUNK_HEADER.unpack_from(data)
+    pos = _CHUNK_HEADER.size
+    columns = {}
+    for i, (_, typecode, _) in enumerate(PACKET_FIELDS):
+        column = array(typecode)
+        if present & (1 << i):
+            size = count * column.itemsize
+            column.frombytes(data[pos : pos + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            pos += size
+        else:
+            column.frombytes(bytes(count * column.itemsize))
+        columns[Packet._fields[i]] = column
+    return columns
+
+
+def pack(src: str, dst: str, chunk_packets: int = 1 << 16) -> int:
+    """
+    Convert a trace in gem5's format to an indexed trace.
+
+    :param chunk_packets: The number of packets per chunk. Smaller chunks
+    make windows cheaper to read, larger ones compress better.
+
+    :returns: The number of packets written.
+    """
+    header, packets = read_proto_trace(src)
+    chunks = []
+    count = 0
+    ordered = True
+    last_tick = 0
+    with open(dst, "wb") as f:
+        f.write(INDEXED_MAGIC)
+
+        def flush(batch):
+            offset = f.tell()
+            data = _encode_chunk(batch)
+            f.write(data)
+            chunks.append(
+                [offset, len(data), batch[0].tick, batch[-1].tick, len(batch)]
+            )
+
+        batch = []
+        for packet in packets:
+            if packet.tick < last_tick:
+                ordered = False
+            last_tick = packet.tick
+            batch.append(packet)
+            if len(batch) == chunk_packets:
+                flush(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            count += len(batch)
+
+        index_offset = f.tell()
+        f.write(
+            json.dumps(
+                {"header": header, "ordered": ordered, "chunks": chunks}
+            ).encode()
+        )
+        f.write(struct.pack("<Q", index_offset) + INDEX_MAGIC)
+    return count
+
+
+class IndexedTrace:
+    def __init__(self, path: str) -> None:
+        """
+        :param path: A trace written by `pack`.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(INDEXED_MAGIC)) != INDEXED_MAGIC:
+                raise ValueError(f"'{path}' is not an indexed trace.")
+            f.seek(-8 - len(INDEX_MAGIC), os.SEEK_END)
+            index_offset = struct.unpack("<Q", f.read(8))[0]
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"The index of '{path}' is missing.")
+            f.seek(index_offset)
+            index = json.loads(f.read()[: -8 - len(INDEX_MAGIC)])
+        self.header = index["header"]
+        self.chunks = index["chunks"]
+        # Packets are only out of tick order if the trace was recorded so,
+        # in which case windows are found by reading every chunk.
+        self.ordered = index["ordered"]
+        self._last_ticks = [chunk[3] for chunk in self.chunks]
+
+    @property
+    def num_packets(self) -> int:
+        return sum(chunk[4] for chunk in self.chunks)
+
+    @property
+    def first_tick(self) -> int:
+        return self.chunks[0][2] if self.chunks else 0
+
+    @property
+    def last_tick(self) -> int:
+        return self.chunks[-1][3] if self.chunks else 0
+
+    def iter_chunks(
+        self, start_tick: Optional[int] = None, end_tick: Optional[int] = None
+    ) -> Iterator[Dict[str, array]]:
+        """
+        Iterate over the packets with `start_tick <= tick < end_tick`, one
+        chunk at a time.
+
+        :returns: An iterator of dictionaries mapping each field name of
+        `Packet` to an array of the values of that field.
+        """
+        first = 0
+        if self.ordered and start_tick is not None:
+            first = bisect.bisect_left(self._last_ticks, start_tick)
+        with open(self.path, "rb") as f:
+            for offset, size, first_tick, last_tick, _ in self.chunks[first:]:
+                if end_tick is not None and first_tick >= end_tick:
+                    if self.ordered:
+                        break
+                    continue
+                if start_tick is not None and last_tick < start_tick:
+                    continue
+                f.seek(offset)
+                columns = _decode_chunk(f.read(size))
+                ticks = columns["tick"]
+                if self.ordered:
+                    lo, hi = 0, len(ticks)
+                    if start_tick is not None:
+                        lo = bisect.bisect_left(ticks, start_tick)
+                    if end_tick is not None:
+                        hi = bisect.bisect_left(ticks, end_tick)
+                    if lo != 0 or hi != len(ticks):
+                        columns = {
+                            name: column[lo:hi]
+                            for name, column in columns.items()
+                        }
+                else:
+                    keep = [
+                        i
+                        for i, tick in enumerate(ticks)
+                        if (start_tick is None or tick >= start_tick)
+                        and (end_tick is None or tick < end_tick)
+                    ]
+                    columns = {
+                        name: array(column.typecode, (column[i] for i in keep))
+                        for name, column in columns.items()
+                    }
+                if len(columns["tick"]):
+                    yield columns
+
+    def packets(
+        self, start_tick: Optional[int] = None, end_tick: Optional[int] = None
+    ) -> Iterator[Packet]:
+        """
+        Iterate over the packets with `start_tick <= tick < end_tick`.
+        """
+        for columns in self.iter_chunks(start_tick, end_tick):
+            yield from map(Packet, *(columns[name] for name in Packet._fields))
+
+
+def open_trace(
+    path: str,
+) -> Tuple[Dict[str, Any], Optional[IndexedTrace]]:
+    """
+    Open an indexed trace, or a trace in gem5's format.
+
+    :returns: The trace header, and the IndexedTrace or None.
+    """
+    with open(path, "rb") as f:
+        indexed = f.read(len(INDEXED_MAGIC)) == INDEXED_MAGIC
+    if indexed:
+        trace = IndexedTrace(path)
+        return trace.header, trace
+    header, _ = read_proto_trace(path)
+    return header, None
+
+
+def iter_window(
+    path: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None
+) -> Tuple[Dict[str, Any], Iterator[Packet]]:
+    """
+    Read the packets with `start_tick <= tick < end_tick` of an indexed
+    trace or of a trace in gem5's format. Only an indexed trace can skip to
+    the start of the window.
+
+    :returns: The trace header and an iterator over the packets.
+    """
+    header, trace = open_trace(path)
+    if trace is not None:
+        return header, trace.packets(start_tick, end_tick)
+
+    header, packets = read_proto_trace(path)
+
+    def window() -> Iterator[Packet]:
+        for packet in packets:
+            if start_tick is not None and packet.tick < start_tick:
+                continue
+            if end_tick is not None and packet.tick >= end_tick:
+                continue
+            yield packet
+
+    return header, window()
+
+
+def extract(
+    src: str,
+    dst: str,
+    start_tick: Optional[int] = None,
+    end_tick: Optional[int] = None,
+    rebase: bool = True,
+) -> int:
+    """
+    Write the packets with `start_tick <= tick < end_tick` of a trace to a
+    trace in gem5's format, which `PyTrafficGen.createTrace` can replay.
+
+    :param rebase: Shift the ticks so the window starts at tick 0. The
+    TraceGen issues each packet at its tick relative to when it started
+    replaying, so without this the window is replayed after a long idle
+    period.
+
+    :returns: The number of packets written.
+    """
+    header, packets = iter_window(src, start_tick, end_tick)
+    if rebase:
+        base = start_tick or 0
+        packets = (
+            packet._replace(tick=packet.tick - base) for packet in packets
+        )
+    return write_proto_trace(dst, header, packets)
+
+
+def split(
+    src: str,
+    outdir: str,
+    slices: int,
+    start_tick: Optional[int] = None,
+    end_tick: Optional[int] = None,
+) -> List[str]:
+    """
+    Cut a window of a trace into `slices` slices of equal duration, each
+    written to its own trace in gem5's format with its ticks rebased to 0.
+    The slices are disjoint, so each can be replayed by its own PyTrafficGen
+    at the same time.
+
+    :returns: The paths of the slices.
+    """
+    header, trace = open_trace(src)
+    if trace is None:
+        raise ValueError(
+            f"'{src}' is not an indexed trace. Convert it with `pack` first."
+        )
+    start = trace.first_tick if start_tick is None else start_tick
+    end = trace.last_tick + 1 if end_tick is None else end_tick
+    step = -(-(end - start) // slices)
+
+    os.makedirs(outdir, exist_ok=True)
+    paths = []
+    for i in range(slices):
+        path = os.path.join(outdir, f"slice{i}.gz")
+        lo = start + i * step
+        extract(src, path, lo, min(lo + step, end))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert gem5 memory traces to indexed traces and "
+        "extract windows of them."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser(
+        "pack", help="Convert a gem5 trace to an indexed trace."
+    )
+    pack_parser.add_argument("trace", type=str, help="The gem5 trace.")
+    pack_parser.add_argument(
+        "-o", "--output", type=str, required=True, help="The indexed trace."
+    )
+    pack_parser.add_argument(
+        "--chunk-packets",
+        type=int,
+        default=1 << 16,
+        help="The number of packets per chunk.",
+    )
+
+    info_parser = subparsers.add_parser(
+        "info", help="Print the header and size of an indexed trace."
+    )
+    info_parser.add_argument("trace", type=str, help="The indexed trace.")
+
+    window_args = argparse.ArgumentParser(add_help=False)
+    window_args.add_argument(
+        "--start-tick", type=int, help="The first tick of the window."
+    )
+    window_args.add_argument(
+        "--end-tick", type=int, help="The tick the window ends before."
+    )
+
+    extract_parser = subparsers.add_parser(
+        "extract",
+        parents=[window_args],
+        help="Write a window of a trace as a gem5 trace.",
+    )
+    extract_parser.add_argument("trace", type=str, help="The trace.")
+    extract_parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=True,
+        help="The gem5 trace to write, e.g. window.gz.",
+    )
+    extract_parser.add_argument(
+        "--no-rebase",
+        action="store_true",
+        help="Keep the original ticks instead of starting at 0.",
+    )
+
+    split_parser = subparsers.add_parser(
+        "split",
+        parents=[window_args],
+        help="Cut a window of an indexed trace into slices.",
+    )
+    split_parser.add_argument("trace", type=str, help="The indexed trace.")
+    split_parser.add_argument(
+        "--slices", type=int, required=True, help="The number of slices."
+    )
+    split_parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="slices",
+        help="The directory the slices are written to.",
+    )
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack(args.trace, args.output, args.chunk_packets)
+        print(f"Packed {count} packets into {args.output}.")
+    elif args.command == "info":
+        trace = IndexedTrace(args.trace)
+        print(f"Object: {trace.header['obj_id']}")
+        print(f"Tick frequency: {trace.header['tick_freq']}")
+        print(f"Packets: {trace.num_packets} in {len(trace.chunks)} chunks")
+        print(f"Ticks: {trace.first_tick} to {trace.last_tick}")
+    elif args.command == "extract":
+        count = extract(
+            args.trace,
+            args.output,
+            args.start_tick,
+            args.end_tick,
+            not args.no_rebase,
+        )
+        print(f"Wrote {count} packets to {args.output}.")
+    else:
+        paths = split(
+            args.trace,
+            args.outdir,
+            args.slices,
+            args.start_tick,
+            args.end_tick,
+        )
+        for path in paths:
+            print(path)
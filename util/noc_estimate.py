@@ -0,0 +1,847 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Analytical latency and throughput estimates of the Garnet topologies of
+materials/developing-gem5-models/10-ruby-network, to screen topologies and
+controller placements before simulating them.
+
+The router graph and the routing tables Garnet will use are built by the
+m5-free `topologies.layouts` and `topologies.routing` modules of that
+directory. The traffic is either generated from the rate of network_config's
+LinearGenerator, or read from a JSON traffic matrix:
+
+- Generated traffic: each core sends `rate` of cache misses to the
+directories, the blocks being interleaved over the directories. With
+MI_example, each miss is a request (a control message) answered with the
+data, and evicts a dirty block which is written back with its data and
+acknowledged (`--writebacks` is the fraction of misses which do).
+- A synthetic pattern between the L1 caches, which are numbered in
+row-major order on the squarest grid which fits them: uniform_random,
+transpose, bit_complement, hotspot, tornado or nearest_neighbor (see
+`pattern_destinations`). Each cache injects `--injection-rate` flits per
+cycle.
+- A JSON matrix: a list of `{"src": <router>, "dst": <router>,
+"flits_per_cycle": <rate>, "packet_flits": <flits>}` flows.
+
+Flows are split evenly over the next hops of the routing tables, like
+Garnet's random choice between equally good links, which gives the load of
+every link in flits per cycle. The latency of a packet is its zero-load
+latency (routers, links and serialization) plus, at every link it crosses,
+the mean wait of an M/D/1 queue served at one flit per cycle:
+`load / (2 * (1 - load))` cycles. A link with a load of 1 or more is
+saturated.
+
+As the link loads grow linearly with the offered load, the headroom of a
+candidate, the factor by which its offered load can grow before a link
+saturates, is the inverse of its highest link load. `--curve` prints the
+latency of the best candidates against their offered load, up to their
+saturation point.
+
+Usage:
+------
+
+```
+python3 -m util.noc_estimate --cores 64 --rate 40GB/s \
+    --topology mesh torus flattened_butterfly clustered_mesh \
+    --directory-placement corner spread --link-width 128 256 --top 5
+python3 -m util.noc_estimate --cores 64 --pattern transpose \
+    --injection-rate 0.05 --topology mesh torus --curve 10
+```
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import math
+import os
+import re
+import sys
+from collections import namedtuple
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+# The layouts and routing tables of the Garnet topologies do not import m5,
+# so they are imported from the materials, as a namespace package.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        os.pardir,
+        "materials",
+        "developing-gem5-models",
+        "10-ruby-network",
+    )
+)
+from topologies.layouts import LAYOUTS, Layout, mesh_shape
+from topologies.routing import channel_dependencies, find_cycle, route_table
+
+from .sweep import write_table
+
+# A stream of packets from the `src` endpoint, attached to `src_router`, to
+# the `dst` endpoint. Endpoints are named after their controller, and have
+# their own link to their router.
+Flow = namedtuple(
+    "Flow",
+    ["src", "dst", "src_router", "dst_router", "flits_per_cycle", "flits"],
+)
+
+# The routing of a layout, which `estimate` needs for every placement and
+# link width: its routing table, the routers of `_toward` and the expected
+# hops from every router for each destination, and whether it cannot
+# deadlock.
+Routes = namedtuple(
+    "Routes", ["table", "orders", "expected_hops", "deadlock_free"]
+)
+
+_UNITS = {"": 1, "k": 2 ** 10, "m": 2 ** 20, "g": 2 ** 30, "t": 2 ** 40}
+
+
+def parse_bandwidth(value: str) -> float:
+    """
+    Parse a bandwidth such as "40GB/s" to bytes per second. As in gem5, the
+    prefixes of bandwidths are binary.
+    """
+    match = re.fullmatch(
+        r"\s*([0-9.eE+-]+)\s*([kKmMgGtT]?)i?B/s\s*", value
+    )
+    if match is None:
+        raise ValueError(f"Cannot parse the bandwidth '{value}'.")
+    return float(match.group(1)) * _UNITS[match.group(2).lower()]
+
+
+def parse_frequency(value: str) -> float:
+    """
+    Parse a frequency such as "3GHz" to Hz.
+    """
+    match = re.fullmatch(r"\s*([0-9.eE+-]+)\s*([kKMG]?)Hz\s*", value)
+    if match is None:
+        raise ValueError(f"Cannot parse the frequency '{value}'.")
+    prefix = match.group(2).lower()
+    return float(match.group(1)) * {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}[
+        prefix
+    ]
+
+
+def generator_flows(
+    layout: Layout,
+    cores: int,
+    directories: int,
+    bytes_per_cycle: float,
+    directory_placement: Union[str, Sequence[int]] = "spread",
+    flit_size: int = 16,
+    block_size: int = 64,
+    control_size: int = 8,
+    writebacks: float = 1.0,
+) -> List[Flow]:
+    """
+    The flows of MI_example traffic generated by `cores` cores, each missing
+    on `bytes_per_cycle` bytes per cycle.
+    """
+    control = math.ceil(control_size / flit_size)
+    data = math.ceil((block_size + control_size) / flit_size)
+    misses = bytes_per_cycle / block_size / directories
+    dir_routers = layout.place(directory_placement, directories)
+
+    flows = []
+    for core in range(cores):
+        core_name = f"l1_{core}"
+        core_router = layout.cache_router(core)
+        for d, dir_router in enumerate(dir_routers):
+            dir_name = f"dir_{d}"
+            messages = [
+                (core_name, dir_name, misses, control),
+                (dir_name, core_name, misses, data),
+                (core_name, dir_name, misses * writebacks, data),
+                (dir_name, core_name, misses * writebacks, control),
+            ]
+            for src, dst, rate, flits in messages:
+                if rate == 0:
+                    continue
+                flows.append(
+                    Flow(
+                        src,
+                        dst,
+                        core_router if src == core_name else dir_router,
+                        dir_router if src == core_name else core_router,
+                        rate * flits,
+                        flits,
+                    )
+                )
+    return flows
+
+
+PATTERNS = [
+    "uniform_random",
+    "transpose",
+    "bit_complement",
+    "hotspot",
+    "tornado",
+    "nearest_neighbor",
+]
+
+
+def pattern_destinations(
+    pattern: str,
+    nodes: int,
+    hotspots: Sequence[int] = (0,),
+    hotspot_fraction: float = 0.2,
+) -> Dict[int, Dict[int, float]]:
+    """
+    The destinations of each node of a synthetic traffic pattern, with the
+    fraction of the node's traffic sent to each. The nodes are laid out in
+    row-major order on the squarest grid which fits them, and the patterns
+    are defined as in Garnet's synthetic traffic tester:
+
+    - uniform_random: every other node equally;
+    - transpose: the node at (row, col) sends to (col, row);
+    - bit_complement: node i sends to node ~i;
+    - hotspot: `hotspot_fraction` to the `hotspots`, the rest uniformly;
+    - tornado: halfway minus one along its row;
+    - nearest_neighbor: the next node along its row.
+
+    Nodes which would send to themselves send nothing.
+    """
+    rows, cols = mesh_shape(nodes)
+    destinations = {}
+    for node in range(nodes):
+        row, col = divmod(node, cols)
+        others = [n for n in range(nodes) if n != node]
+        if pattern == "uniform_random":
+            shares = {n: 1 / len(others) for n in others}
+        elif pattern == "transpose":
+            if rows != cols:
+                raise ValueError("transpose needs a square number of nodes.")
+            shares = {col * cols + row: 1.0}
+        elif pattern == "bit_complement":
+            if nodes & (nodes - 1):
+                raise ValueError(
+                    "bit_complement needs a power of 2 number of nodes."
+                )
+            shares = {~node & (nodes - 1): 1.0}
+        elif pattern == "hotspot":
+            shares = {}
+            for n in others:
+                shares[n] = (1 - hotspot_fraction) / len(others)
+            for n in hotspots:
+                shares[n] = shares.get(n, 0.0) + hotspot_fraction / len(
+                    hotspots
+                )
+        elif pattern == "tornado":
+            shares = {row * cols + (col + -(-cols // 2) - 1) % cols: 1.0}
+        elif pattern == "nearest_neighbor":
+            shares = {row * cols + (col + 1) % cols: 1.0}
+        else:
+            raise ValueError(
+                f"Unknown pattern '{pattern}'. Use one of {PATTERNS}."
+            )
+        destinations[node] = {
+            n: share for n, share in shares.items() if n != node and share
+        }
+    return destinations
+
+
+def pattern_flows(
+    layout: Layout,
+    nodes: int,
+    pattern: str,
+    injection_rate: float,
+    packet_flits: int = 1,
+    hotspots: Sequence[int] = (0,),
+    hotspot_fraction: float = 0.2,
+) -> List[Flow]:
+    """
+    The flows of a synthetic pattern between `nodes` L1 caches, each
+    injecting `injection_rate` flits per cycle.
+    """
+    flows = []
+    destinations = pattern_destinations(
+        pattern, nodes, hotspots, hotspot_fraction
+    )
+    for src, shares in destinations.items():
+        for dst, share in shares.items():
+            flows.append(
+                Flow(
+                    f"l1_{src}",
+                    f"l1_{dst}",
+                    layout.cache_router(src),
+                    layout.cache_router(dst),
+                    injection_rate * share,
+                    packet_flits,
+                )
+            )
+    return flows
+
+
+def matrix_flows(path: str) -> List[Flow]:
+    """
+    Read the flows of a JSON traffic matrix. Each router is one endpoint.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    return [
+        Flow(
+            f"router_{entry['src']}",
+            f"router_{entry['dst']}",
+            entry["src"],
+            entry["dst"],
+            entry["flits_per_cycle"],
+            entry.get("packet_flits", 1),
+        )
+        for entry in entries
+    ]
+
+
+def _wait(load: float) -> float:
+    # The mean wait of an M/D/1 queue with a service time of 1 cycle.
+    if load >= 1:
+        return math.inf
+    return load / (2 * (1 - load))
+
+
+def _toward(table, dst: int, num_routers: int) -> List[int]:
+    """
+    The routers in an order where each router comes after all of its next
+    hops toward `dst`.
+    """
+    order = []
+    done = {dst}
+    for start in range(num_routers):
+        stack = [start]
+        while stack:
+            router = stack[-1]
+            if router in done:
+                stack.pop()
+                continue
+            pending = [
+                hop for hop in table[router][dst] if hop not in done
+            ]
+            if pending:
+                stack.extend(pending)
+            else:
+                done.add(router)
+                order.append(router)
+                stack.pop()
+    return order
+
+
+def layout_routes(layout: Layout, routing: str = "weighted") -> Routes:
+    """
+    Build the routing table of a layout and check it for deadlocks.
+    """
+    table = route_table(layout, routing)
+    links = layout.links
+    hops = {
+        router: {
+            dst: [links[i].dst for i in route] for dst, route in routes.items()
+        }
+        for router, routes in table.items()
+    }
+    orders = {}
+    expected_hops = {}
+    for dst in range(layout.num_routers):
+        orders[dst] = _toward(hops, dst, layout.num_routers)
+        expected_hops[dst] = {dst: 0.0}
+        for router in orders[dst]:
+            route = hops[router][dst]
+            expected_hops[dst][router] = sum(
+                1 + expected_hops[dst][hop] for hop in route
+            ) / len(route)
+    return Routes(
+        table,
+        orders,
+        expected_hops,
+        find_cycle(channel_dependencies(layout, table)) is None,
+    )
+
+
+def estimate(
+    layout: Layout,
+    flows: List[Flow],
+    link_latency: int = 8,
+    router_latency: int = 1,
+    routing: str = "weighted",
+    routes: Optional[Routes] = None,
+) -> Dict[str, Any]:
+    """
+    Estimate the link loads and packet latencies of `flows` on a layout.
+
+    :param routes: The `layout_routes` of the layout, to reuse them between
+    estimates. Built with `routing` if not given.
+
+    :returns: The mean hops, zero-load latency and latency of a packet (in
+    cycles), the highest load (in flits per cycle) of any link and of the
+    links between routers, whether a link is saturated and the load of every
+    link between routers.
+    """
+    if routes is None:
+        routes = layout_routes(layout, routing)
+    table = routes.table
+    links = layout.links
+    orders = routes.orders
+
+    loads = [0.0] * len(links)
+    ext_loads: Dict[str, float] = {}
+    by_dst: Dict[int, List[Flow]] = {}
+    for flow in flows:
+        by_dst.setdefault(flow.dst_router, []).append(flow)
+        for endpoint in ["in " + flow.src, "out " + flow.dst]:
+            ext_loads[endpoint] = (
+                ext_loads.get(endpoint, 0.0) + flow.flits_per_cycle
+            )
+
+    for dst, dst_flows in by_dst.items():
+        carried = [0.0] * layout.num_routers
+        for flow in dst_flows:
+            carried[flow.src_router] += flow.flits_per_cycle
+        # From the farthest routers to the nearest.
+        for router in reversed(orders[dst]):
+            route = table[router][dst]
+            share = carried[router] / len(route)
+            for i in route:
+                loads[i] += share
+                carried[links[i].dst] += share
+
+    waits = [_wait(load) for load in loads]
+    packets = 0.0
+    total_hops = 0.0
+    zero_load = 0.0
+    latency = 0.0
+    for dst, dst_flows in by_dst.items():
+        # The expected queueing delay from each router to `dst`.
+        expected_hops = routes.expected_hops[dst]
+        expected_wait = {dst: 0.0}
+        for router in orders[dst]:
+            route = table[router][dst]
+            expected_wait[router] = sum(
+                waits[i] + expected_wait[links[i].dst] for i in route
+            ) / len(route)
+        for flow in dst_flows:
+            rate = flow.flits_per_cycle / flow.flits
+            flow_hops = expected_hops[flow.src_router]
+            flow_zero_load = (
+                (flow_hops + 1) * router_latency
+                + (flow_hops + 2) * link_latency
+                + flow.flits
+                - 1
+            )
+            flow_wait = (
+                _wait(ext_loads["in " + flow.src])
+                + expected_wait[flow.src_router]
+                + _wait(ext_loads["out " + flow.dst])
+            )
+            packets += rate
+            total_hops += rate * flow_hops
+            zero_load += rate * flow_zero_load
+            latency += rate * (flow_zero_load + flow_wait)
+
+    max_load = max(loads + list(ext_loads.values()), default=0.0)
+    return {
+        "hops": total_hops / packets if packets else 0.0,
+        "zero_load_latency": zero_load / packets if packets else 0.0,
+        "latency": latency / packets if packets else 0.0,
+        "max_load": max_load,
+        "max_link_load": max(loads, default=0.0),
+        "saturated": max_load >= 1,
+        "link_loads": loads,
+    }
+
+
+def _layout(topology: str, cores: int, options: Dict[str, Any]) -> Layout:
+    # Only give a layout the options it takes, e.g. a ring has no rows.
+    function = LAYOUTS[topology]
+    parameters = inspect.signature(function).parameters
+    return function(
+        cores,
+        **{
+            name: value
+            for name, value in options.items()
+            if value is not None and name in parameters
+        },
+    )
+
+
+def candidates(
+    topologies: Sequence[str],
+    cores: int,
+    directories: int,
+    bytes_per_cycle: float,
+    placements: Sequence[Union[str, Sequence[int]]] = ("spread",),
+    link_widths: Sequence[int] = (128,),
+    layout_options: Optional[Dict[str, Any]] = None,
+    writebacks: float = 1.0,
+    matrix: Optional[str] = None,
+    pattern: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[Dict[str, Any], Layout, List[Flow]]]:
+    """
+    Every combination of topology, directory placement and link width,
+    with its traffic.
+
+    :param matrix: A JSON traffic matrix to use instead of the generated
+    traffic. The placement and link width do not change it.
+    :param pattern: The keyword arguments of `pattern_flows`, except the
+    layout and nodes, to use a synthetic pattern between the L1 caches
+    instead of the generated traffic. The placement does not change it.
+
+    :returns: An iterator of the description of each candidate, its layout
+    and its flows.
+    """
+    matrix_traffic = matrix_flows(matrix) if matrix else None
+    for topology, placement, width in itertools.product(
+        topologies, placements, link_widths
+    ):
+        layout = _layout(topology, cores, layout_options or {})
+        if matrix_traffic is not None:
+            flows = matrix_traffic
+        elif pattern is not None:
+            flows = pattern_flows(layout, cores, **pattern)
+        else:
+            flows = generator_flows(
+                layout,
+                cores,
+                directories,
+                bytes_per_cycle,
+                placement,
+                flit_size=width // 8,
+                writebacks=writebacks,
+            )
+        description = {
+            "topology": topology,
+            "rows": layout.num_rows,
+            "cols": layout.num_cols,
+            "directory_placement": placement
+            if isinstance(placement, str)
+            else ",".join(map(str, placement)),
+            "link_width": width,
+        }
+        yield description, layout, flows
+
+
+def screen(
+    candidates: Iterable[Tuple[Dict[str, Any], Layout, List[Flow]]],
+    link_latency: int = 8,
+    router_latency: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Estimate every candidate returned by `candidates`.
+
+    :returns: One row per candidate, best first: the candidates which are
+    not saturated, by increasing latency, then the saturated ones by
+    increasing highest link load. The candidates whose routes can deadlock
+    come after all the others, however fast they are.
+    """
+    rows = []
+    # The routes of each topology and shape, shared by its placements and
+    # link widths.
+    cache: Dict[Tuple[str, int, int], Routes] = {}
+    for description, layout, flows in candidates:
+        key = (layout.name, layout.num_rows, layout.num_cols)
+        if key not in cache:
+            cache[key] = layout_routes(layout)
+        routes = cache[key]
+        result = estimate(
+            layout, flows, link_latency, router_latency, routes=routes
+        )
+        row = dict(description)
+        row.update(
+            {
+                "routers": layout.num_routers,
+                "links": len(layout.links),
+                "hops": round(result["hops"], 3),
+                "zero_load_latency": round(result["zero_load_latency"], 3),
+                "latency": round(result["latency"], 3),
+                "max_load": round(result["max_load"], 4),
+                "max_link_load": round(result["max_link_load"], 4),
+                "headroom": round(1 / result["max_load"], 3)
+                if result["max_load"]
+                else math.inf,
+                "saturated": result["saturated"],
+                "deadlock_free": routes.deadlock_free,
+            }
+        )
+        rows.append(row)
+    rows.sort(
+        key=lambda row: (
+            not row["deadlock_free"],
+            row["saturated"],
+            row["max_load"] if row["saturated"] else row["latency"],
+        )
+    )
+    return rows
+
+
+def load_curve(
+    layout: Layout,
+    flows: List[Flow],
+    steps: int = 10,
+    link_latency: int = 8,
+    router_latency: int = 1,
+) -> List[Dict[str, float]]:
+    """
+    The latency of `flows` scaled to `steps` offered loads, evenly spaced up
+    to the load which saturates the busiest link.
+
+    :returns: One row per offered load: the scale of the flows, the
+    fraction of the saturation load and the mean packet latency.
+    """
+    routes = layout_routes(layout)
+    max_load = estimate(
+        layout, flows, link_latency, router_latency, routes=routes
+    )["max_load"]
+    if not max_load:
+        return []
+    curve = []
+    for step in range(1, steps + 1):
+        fraction = step / (steps + 1)
+        scale = fraction / max_load
+        scaled = [
+            flow._replace(flits_per_cycle=flow.flits_per_cycle * scale)
+            for flow in flows
+        ]
+        result = estimate(
+            layout, scaled, link_latency, router_latency, routes=routes
+        )
+        curve.append(
+            {
+                "scale": round(scale, 4),
+                "saturation_fraction": round(fraction, 4),
+                "latency": round(result["latency"], 3),
+            }
+        )
+    return curve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Estimate the latency and link loads of Garnet "
+        "topologies without simulating them."
+    )
+    parser.add_argument(
+        "--cores", type=int, required=True, help="The number of L1 caches."
+    )
+    parser.add_argument(
+        "--directories",
+        type=int,
+        default=1,
+        help="The number of directories.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=str,
+        default="40GB/s",
+        help="The rate of each core of the LinearGenerator.",
+    )
+    parser.add_argument(
+        "--clock",
+        type=str,
+        default="3GHz",
+        help="The clock of the network.",
+    )
+    parser.add_argument(
+        "--matrix",
+        type=str,
+        help="A JSON traffic matrix to use instead of the generated traffic.",
+    )
+    parser.add_argument(
+        "--pattern",
+        type=str,
+        choices=PATTERNS,
+        help="A synthetic pattern between the L1 caches to use instead of "
+        "the generated traffic.",
+    )
+    parser.add_argument(
+        "--injection-rate",
+        type=float,
+        default=0.1,
+        help="The flits per cycle injected by each L1 cache with --pattern.",
+    )
+    parser.add_argument(
+        "--packet-flits",
+        type=int,
+        default=1,
+        help="The flits per packet with --pattern.",
+    )
+    parser.add_argument(
+        "--hotspots",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="The hotspot nodes of the hotspot pattern.",
+    )
+    parser.add_argument(
+        "--hotspot-fraction",
+        type=float,
+        default=0.2,
+        help="The fraction of the traffic sent to the hotspots.",
+    )
+    parser.add_argument(
+        "--topology",
+        type=str,
+        nargs="+",
+        default=["mesh"],
+        choices=sorted(LAYOUTS),
+        help="The topologies to estimate.",
+    )
+    parser.add_argument(
+        "--directory-placement",
+        type=str,
+        nargs="+",
+        default=["spread"],
+        help="The directory placements to estimate: corner, edge, diagonal, "
+        "spread, or comma-separated lists of router ids.",
+    )
+    parser.add_argument(
+        "--link-width",
+        type=int,
+        nargs="+",
+        default=[128],
+        help="The link widths to estimate, in bits.",
+    )
+    parser.add_argument("--rows", type=int, help="The rows of grid layouts.")
+    parser.add_argument(
+        "--cols", type=int, help="The columns of grid layouts."
+    )
+    parser.add_argument(
+        "--cluster-size",
+        type=int,
+        help="The number of cores per router of a clustered mesh.",
+    )
+    parser.add_argument(
+        "--link-latency", type=int, default=8, help="In cycles."
+    )
+    parser.add_argument(
+        "--router-latency", type=int, default=1, help="In cycles."
+    )
+    parser.add_argument(
+        "--writebacks",
+        type=float,
+        default=1.0,
+        help="The fraction of misses which write back a dirty block.",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="The number of candidates shown."
+    )
+    parser.add_argument(
+        "--curve",
+        type=int,
+        metavar="STEPS",
+        help="Print the latency of the best candidates at this many offered "
+        "loads, up to their saturation.",
+    )
+    parser.add_argument(
+        "--csv", type=str, help="Write every candidate to this CSV file."
+    )
+    args = parser.parse_args()
+
+    placements = [
+        [int(router) for router in placement.split(",")]
+        if placement[0].isdigit()
+        else placement
+        for placement in args.directory_placement
+    ]
+    pattern = None
+    if args.pattern is not None:
+        pattern = {
+            "pattern": args.pattern,
+            "injection_rate": args.injection_rate,
+            "packet_flits": args.packet_flits,
+            "hotspots": args.hotspots,
+            "hotspot_fraction": args.hotspot_fraction,
+        }
+    all_candidates = list(
+        candidates(
+            args.topology,
+            args.cores,
+            args.directories,
+            parse_bandwidth(args.rate) / parse_frequency(args.clock),
+            placements,
+            args.link_width,
+            {
+                "num_rows": args.rows,
+                "num_cols": args.cols,
+                "cluster_size": args.cluster_size,
+            },
+            args.writebacks,
+            args.matrix,
+            pattern,
+        )
+    )
+    rows = screen(all_candidates, args.link_latency, args.router_latency)
+
+    columns = [
+        "topology",
+        "rows",
+        "cols",
+        "directory_placement",
+        "link_width",
+        "links",
+        "hops",
+        "latency",
+        "max_load",
+        "max_link_load",
+        "headroom",
+        "deadlock_free",
+    ]
+    widths = [max(len(column), 8) for column in columns]
+    print(" ".join(f"{c:>{w}}" for c, w in zip(columns, widths)))
+    for row in rows[: args.top]:
+        print(
+            " ".join(f"{str(row[c]):>{w}}" for c, w in zip(columns, widths))
+        )
+    if args.curve:
+        for row in rows[: args.top]:
+            description, layout, flows = next(
+                c
+                for c in all_candidates
+                if all(row[key] == value for key, value in c[0].items())
+            )
+            print()
+            print(", ".join(f"{k}={v}" for k, v in description.items()))
+            print(f"{'scale':>8} {'of saturation':>14} {'latency':>10}")
+            for point in load_curve(
+                layout,
+                flows,
+                args.curve,
+                args.link_latency,
+                args.router_latency,
+            ):
+                print(
+                    f"{point['scale']:>8} "
+                    f"{point['saturation_fraction']:>14} "
+                    f"{point['latency']:>10}"
+                )
+    if args.csv:
+        write_table(rows, args.csv)
@@ -0,0 +1,484 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+A prefetcher for gem5 resources.
+
+`Resource("riscv-disk-img")` downloads a resource the first time it is used,
+one at a time, into the resource directory of the host (`~/.cache/gem5`, or
+the `GEM5_RESOURCE_DIR` environment variable). This tool downloads a list of
+resources concurrently, ahead of the simulations which use them, into the
+same directory and with the same file names, so gem5 finds them in place.
+
+Each resource is downloaded to a temporary file, decompressed if it is
+zipped, checked against the MD5 sum of the resources.json index and only
+then renamed to its final name, so no job ever sees a partial file. While a
+resource is being fetched, `<path>.lock.lock` is held, the same lock gem5
+takes while it downloads a resource itself (its downloader asks for a lock on
+`<path>.lock`, and its `FileLock` appends `.lock` again), so concurrent jobs
+sharing a resource directory fetch each resource once.
+
+Resources may be fetched from a mirror instead: a directory or an HTTP
+server laid out like the resources server. `mirror` builds one, and writes a
+resources.json pointing at it which gem5 itself can be given through the
+`GEM5_RESOURCE_JSON` environment variable, e.g. for hosts without access to
+the internet.
+
+Usage:
+------
+
+```
+python3 -m util.resources prefetch riscv-disk-img \
+    riscv-bootloader-vmlinux-5.10 x86-hello64-static [--jobs <N>]
+python3 -m util.resources prefetch --manifest resources.txt \
+    --mirror /nfs/gem5-mirror
+python3 -m util.resources mirror /nfs/gem5-mirror --manifest resources.txt
+```
+
+A manifest lists one resource name per line. Lines starting with `#` are
+ignored.
+"""
+
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_INDEX = os.environ.get(
+    "GEM5_RESOURCE_JSON", "http://resources.gem5.org/resources.json"
+)
+DEFAULT_RESOURCE_DIR = os.environ.get(
+    "GEM5_RESOURCE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "gem5"),
+)
+
+
+def _open(location: str):
+    """
+    Open a URL or a local path for reading.
+    """
+    if "://" in location:
+        return urllib.request.urlopen(location)
+    return open(location, "rb")
+
+
+def load_index(location: str = DEFAULT_INDEX) -> Dict[str, Any]:
+    """
+    Load a resources.json index from a URL or a local path.
+    """
+    with _open(location) as f:
+        return json.load(f)
+
+
+def index_resources(index: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    The resources of an index by name, with the groups flattened and the
+    `{url_base}` of their URLs filled in.
+    """
+    resources = {}
+
+    def visit(entries):
+        for entry in entries:
+            if entry.get("type") == "group":
+                visit(entry.get("contents", []))
+            elif "name" in entry and "url" in entry:
+                resource = dict(entry)
+                resource["url"] = resource["url"].format(
+                    url_base=index.get("url_base", "")
+                )
+                resources[resource["name"]] = resource
+
+    visit(index.get("resources", []))
+    return resources
+
+
+def read_manifest(path: str) -> List[str]:
+    """
+    Read the resource names of a manifest, one per line.
+    """
+    with open(path) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def md5_file(path: str, gzipped: bool = False) -> str:
+    """
+    The MD5 sum of a file, as given in resources.json.
+
+    :param gzipped: The file is gzipped and the sum of its decompressed
+    contents is wanted.
+    """
+    digest = hashlib.md5()
+    with (gzip.open if gzipped else open)(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_zipped(resource: Dict[str, Any]) -> bool:
+    # resources.json gives this as a string.
+    return str(resource.get("is_zipped", False)).lower() == "true"
+
+
+def mirror_url(
+    resource: Dict[str, Any], index: Dict[str, Any], mirror: str
+) -> str:
+    """
+    The location of a resource in a mirror: the path of its URL below the
+    `url_base` of the index, below the mirror directory or URL.
+    """
+    base = index.get("url_base", "")
+    url = resource["url"]
+    if base and url.startswith(base):
+        relative = url[len(base) :].lstrip("/")
+    else:
+        relative = url.split("://", 1)[-1].split("/", 1)[-1]
+    if "://" in mirror:
+        return f"{mirror.rstrip('/')}/{relative}"
+    return os.path.join(mirror, *relative.split("/"))
+
+
+class Lock:
+    """
+    An exclusive lock on a file, held by creating `<path>.lock.lock` as
+    gem5's `FileLock("<path>.lock")` does. The lock file holds the host name
+    and process ID of its owner, and a lock left by a process of this host
+    which has died is taken over.
+    """
+
+    def __init__(
+        self, path: str, timeout: float = 3600, poll: float = 1
+    ) -> None:
+        self.path = f"{path}.lock.lock"
+        self.timeout = timeout
+        self.poll = poll
+
+    def _stale(self) -> bool:
+        try:
+            with open(self.path) as f:
+                host, pid = f.read().split()
+        except (OSError, ValueError):
+            # Not written yet, or written by gem5, which leaves it empty.
+            return False
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            pass
+        return False
+
+    def _take_over(self) -> None:
+        """
+        Remove the lock file if it is stale. Takeovers are serialized by
+        `flock` on `<lock>.takeover`, so no two processes both find the same
+        lock stale and one of them then removes the lock the other has just
+        created in its place.
+        """
+        with open(f"{self.path}.takeover", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            if self._stale():
+                os.remove(self.path)
+
+    def __enter__(self) -> "Lock":
+        start = time.time()
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+            except FileExistsError:
+                self._take_over()
+                if not os.path.exists(self.path):
+                    continue
+                if time.time() - start > self.timeout:
+                    raise TimeoutError(
+                        f"Timed out waiting for the lock {self.path}."
+                    )
+                time.sleep(self.poll)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{socket.gethostname()} {os.getpid()}\n")
+            return self
+
+    def __exit__(self, *exc) -> None:
+        os.remove(self.path)
+
+
+def _copy(source: str, path: str) -> None:
+    with _open(source) as src, open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def fetch(
+    resource: Dict[str, Any],
+    path: str,
+    source: Optional[str] = None,
+    unzip: bool = True,
+) -> bool:
+    """
+    Fetch a resource to `path` unless it is already there with the right
+    MD5 sum.
+
+    :param resource: The entry of the resource in resources.json.
+    :param source: The URL or path to fetch the resource from. Defaults to
+    the URL given in resources.json.
+    :param unzip: Decompress zipped resources, as gem5 does. Otherwise they
+    are stored as they are served.
+
+    :raises ValueError: If the fetched resource does not have the MD5 sum
+    given in resources.json.
+    :returns: Whether the resource was fetched.
+    """
+    md5sum = resource.get("md5sum")
+    # The MD5 sum in resources.json is that of the resource as gem5 uses it,
+    # i.e. after decompression.
+    gzipped = is_zipped(resource) and not unzip
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with Lock(path):
+        if os.path.isfile(path) and (
+            md5sum is None or md5_file(path, gzipped) == md5sum
+        ):
+            return False
+
+        tmp = f"{path}.tmp-{os.getpid()}"
+        try:
+            _copy(source or resource["url"], tmp)
+            if is_zipped(resource) and unzip:
+                with gzip.open(tmp, "rb") as src, open(
+                    f"{tmp}.unzipped", "wb"
+                ) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.replace(f"{tmp}.unzipped", tmp)
+            if md5sum is not None and md5_file(tmp, gzipped) != md5sum:
+                raise ValueError(
+                    f"The MD5 sum of '{resource['name']}' fetched from "
+                    f"'{source or resource['url']}' is "
+                    f"{md5_file(tmp, gzipped)}, expected {md5sum}."
+                )
+            os.replace(tmp, path)
+        finally:
+            for name in (tmp, f"{tmp}.unzipped"):
+                if os.path.exists(name):
+                    os.remove(name)
+    return True
+
+
+def prefetch(
+    names: Iterable[str],
+    index_location: str = DEFAULT_INDEX,
+    resource_dir: str = DEFAULT_RESOURCE_DIR,
+    mirror: Optional[str] = None,
+    jobs: int = 4,
+) -> Dict[str, str]:
+    """
+    Fetch resources into the resource directory, `jobs` at a time.
+
+    :param index_location: The URL or path of resources.json.
+    :param mirror: Fetch the resources from this mirror directory or URL
+    instead of their own URLs.
+
+    :raises KeyError: If a resource is not in resources.json.
+    :returns: The local path of each resource, by name.
+    """
+    index = load_index(index_location)
+    resources = index_resources(index)
+    names = list(dict.fromkeys(names))
+    missing = [name for name in names if name not in resources]
+    if missing:
+        raise KeyError(f"Unknown resources: {', '.join(missing)}.")
+
+    paths = {name: os.path.join(resource_dir, name) for name in names}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(
+                fetch,
+                resources[name],
+                paths[name],
+                mirror_url(resources[name], index, mirror) if mirror else None,
+            ): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            state = "fetched" if future.result() else "already present"
+            print(f"{name}: {state} at {paths[name]}.")
+    return paths
+
+
+def build_mirror(
+    directory: str,
+    names: Optional[Iterable[str]] = None,
+    index_location: str = DEFAULT_INDEX,
+    url_base: Optional[str] = None,
+    jobs: int = 4,
+) -> str:
+    """
+    Download resources, as they are stored on the resources server, into a
+    mirror directory, and write a resources.json whose URLs point into it.
+
+    :param names: The resources to mirror. Defaults to all of them.
+    :param url_base: The URL the mirror directory is served at. Defaults to
+    a `file://` URL of the directory.
+
+    :returns: The path of the mirror's resources.json.
+    """
+    index = load_index(index_location)
+    resources = index_resources(index)
+    names = list(names) if names is not None else sorted(resources)
+    missing = [name for name in names if name not in resources]
+    if missing:
+        raise KeyError(f"Unknown resources: {', '.join(missing)}.")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(
+                fetch,
+                resources[name],
+                mirror_url(resources[name], index, directory),
+                None,
+                False,
+            ): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f"{futures[future]}: mirrored.")
+
+    if url_base is None:
+        url_base = "file://" + os.path.abspath(directory)
+    if "url_base" in index:
+        index = dict(index, url_base=url_base)
+    else:
+        # The URLs are absolute: point each one into the mirror.
+        def rewrite(entries):
+            for entry in entries:
+                if "url" in entry:
+                    entry["url"] = mirror_url(entry, index, url_base)
+                rewrite(entry.get("contents", []))
+
+        index = json.loads(json.dumps(index))
+        rewrite(index.get("resources", []))
+    path = os.path.join(directory, "resources.json")
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download gem5 resources ahead of the simulations which "
+        "use them."
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=DEFAULT_INDEX,
+        help="The URL or path of resources.json.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefetch_parser = subparsers.add_parser(
+        "prefetch", help="Fetch resources into the resource directory."
+    )
+    mirror_parser = subparsers.add_parser(
+        "mirror", help="Build a mirror of the resources server."
+    )
+    mirror_parser.add_argument(
+        "directory", type=str, help="The directory of the mirror."
+    )
+    mirror_parser.add_argument(
+        "--url-base",
+        type=str,
+        help="The URL the mirror is served at. Defaults to a file:// URL.",
+    )
+    for subparser in (prefetch_parser, mirror_parser):
+        subparser.add_argument(
+            "names", nargs="*", help="The names of the resources."
+        )
+        subparser.add_argument(
+            "--manifest",
+            type=str,
+            action="append",
+            default=[],
+            help="A file listing resource names, one per line. May be "
+            "given more than once.",
+        )
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=4,
+            help="The number of resources fetched at once.",
+        )
+    prefetch_parser.add_argument(
+        "--resource-dir",
+        type=str,
+        default=DEFAULT_RESOURCE_DIR,
+        help="The directory gem5 looks for resources in.",
+    )
+    prefetch_parser.add_argument(
+        "--mirror",
+        type=str,
+        help="A mirror directory or URL to fetch the resources from.",
+    )
+    args = parser.parse_args()
+
+    names = list(args.names)
+    for manifest in args.manifest:
+        names.extend(read_manifest(manifest))
+
+    if args.command == "prefetch":
+        if not names:
+            parser.error("No resources given.")
+        prefetch(
+            names, args.index, args.resource_dir, args.mirror, args.jobs
+        )
+    else:
+        path = build_mirror(
+            args.directory,
+            names or None,
+            args.index,
+            args.url_base,
+            args.jobs,
+        )
+        print(
+            "Run gem5 with "
+            f"GEM5_RESOURCE_JSON=file://{os.path.abspath(path)}."
+        )
@@ -0,0 +1,561 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+A cache of the results of gem5 runs.
+
+A run is identified by its fingerprint: the hash of the configuration of the
+simulated system (config.json, with the output directory left out), of the
+workload files that configuration refers to and of the gem5 binary. Its
+results are the files gem5 writes in the output directory (stats.txt,
+config.ini and config.json).
+
+The configuration is only known once gem5 has instantiated the system, so
+each run is also recorded under an invocation key, the hash of its command
+line and of the files it names: the gem5 binary, the configuration script
+and the other Python files in the script's directory. Running the same
+command again finds the fingerprint from the invocation key and, if the
+workload files have not changed since, copies the stored results into the
+output directory instead of simulating. Different commands which build the
+same system share one stored result.
+
+The cache is a directory (by default `result-cache`, or the
+`GEM5_RESULT_CACHE` environment variable) holding:
+
+- `objects/`: the compressed result files, named by their SHA-256.
+- `results/<fingerprint>.json`: the manifest of each stored result. Its
+  modification time is the last time it was used.
+- `invocations/<key>.json`: the fingerprint each invocation led to.
+
+`evict` removes the least recently used results until the cache fits in a
+given size.
+
+Usage:
+------
+
+```
+python3 -m util.result_cache run --outdir m5out -- \
+    gem5 --outdir=m5out materials/using-gem5/05-cpu-models/cpu-models.py
+python3 -m util.result_cache list
+python3 -m util.result_cache evict --max-size 2GiB
+```
+
+`python3 -m util.sweep` uses the cache unless given `--no-cache`.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .compress import compress, decompress
+
+DEFAULT_ROOT = os.environ.get("GEM5_RESULT_CACHE", "result-cache")
+
+# The files of the output directory which make up a result.
+RESULT_FILES = ["stats.txt", "config.ini", "config.json"]
+
+# Objects modified in the last this many seconds are never collected, as a
+# concurrent `put` may have written them without listing them in a manifest
+# yet.
+COLLECT_GRACE = 600
+
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size such as "512MiB" or "2G" to bytes. The prefixes are binary.
+    """
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([kKmMgGtT]?)(?:i?B)?\s*", value)
+    if match is None:
+        raise ValueError(f"Cannot parse the size '{value}'.")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def _hash(*parts: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _normalize(text: str, outdir: str) -> str:
+    """
+    Replace the output directory in `text` with a placeholder, so that the
+    same run in another directory gets the same key.
+    """
+    for path in sorted({os.path.abspath(outdir), outdir}, key=len)[::-1]:
+        text = text.replace(path, "{outdir}")
+    return text
+
+
+class ResultCache:
+    def __init__(self, root: str = DEFAULT_ROOT) -> None:
+        """
+        :param root: The directory of the cache. It is created if needed.
+        """
+        self.root = root
+        for directory in ("objects", "results", "invocations"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        # File digests by (path, size, modification time), as workloads
+        # and gem5 binaries are large and rarely change.
+        self._digests: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def _result_path(self, fingerprint: str) -> str:
+        return os.path.join(self.root, "results", f"{fingerprint}.json")
+
+    def _invocation_path(self, key: str) -> str:
+        return os.path.join(self.root, "invocations", f"{key}.json")
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        # Caches may be shared by concurrent runs, so a file only appears
+        # under its final name once it is complete.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_json(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def file_digest(self, path: str) -> str:
+        """
+        The SHA-256 of a file's contents. Digests are remembered for as long
+        as the file keeps its size and modification time.
+        """
+        stat = os.stat(path)
+        memo = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if memo in self._digests:
+                return self._digests[memo]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self._digests[memo] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def invocation_key(self, command: List[str], outdir: str) -> str:
+        """
+        The key of a command line: its arguments, with the output directory
+        left out, and the digests of the files it names. The first argument
+        is looked up on the PATH. The other Python files in the directory
+        of a script are included, as the script may import them.
+        """
+        files = {}
+        for index, arg in enumerate(command):
+            values = [arg] + arg.split("=", 1)[1:]
+            if index == 0:
+                values.append(shutil.which(arg) or arg)
+            for value in values:
+                if not os.path.isfile(value):
+                    continue
+                files[value] = self.file_digest(value)
+                if value.endswith(".py"):
+                    pattern = os.path.join(os.path.dirname(value), "*.py")
+                    for path in glob.glob(pattern):
+                        files[path] = self.file_digest(path)
+        arguments = [_normalize(arg, outdir) for arg in command]
+        return _hash(arguments, files)
+
+    def _config(self, outdir: str) -> str:
+        for name in ("config.json", "config.ini"):
+            path = os.path.join(outdir, name)
+            if os.path.isfile(path):
+                with open(path) as f:
+                    text = f.read()
+                if name == "config.json":
+                    # Re-serialized so the key does not depend on how it
+                    # was written.
+                    text = json.dumps(json.loads(text), sort_keys=True)
+                return _normalize(text, outdir)
+        raise FileNotFoundError(f"No config.json or config.ini in '{outdir}'.")
+
+    def workload_files(self, outdir: str) -> List[str]:
+        """
+        The files the configuration in `outdir` refers to, other than those
+        in `outdir` itself: the binaries, kernels and disk images of the
+        workload.
+        """
+        path = os.path.join(outdir, "config.json")
+        if not os.path.isfile(path):
+            return []
+        with open(path) as f:
+            config = json.load(f)
+
+        files = set()
+        outdir = os.path.abspath(outdir)
+
+        def visit(value):
+            if isinstance(value, dict):
+                for item in value.values():
+                    visit(item)
+            elif isinstance(value, list):
+                for item in value:
+                    visit(item)
+            elif isinstance(value, str) and os.sep in value:
+                absolute = os.path.abspath(value)
+                if os.path.isfile(absolute) and not absolute.startswith(
+                    outdir + os.sep
+                ):
+                    files.add(absolute)
+
+        visit(config)
+        return sorted(files)
+
+    def fingerprint(
+        self, outdir: str, gem5: str, workloads: Dict[str, str]
+    ) -> str:
+        """
+        The fingerprint of the run whose output directory is `outdir`.
+
+        :param gem5: The digest of the gem5 binary.
+        :param workloads: The digests of the workload files, by path.
+        """
+        return _hash(self._config(outdir), sorted(workloads.values()), gem5)
+
+    def lookup(self, command: List[str], outdir: str) -> Optional[str]:
+        """
+        Find the stored result of a command.
+
+        :returns: The fingerprint of the result, or None if the command has
+        not been run, its workload files have changed or its result was
+        evicted.
+        """
+        invocation = self._read_json(
+            self._invocation_path(self.invocation_key(command, outdir))
+        )
+        if invocation is None:
+            return None
+        for path, digest in invocation["workloads"].items():
+            if not os.path.isfile(path) or self.file_digest(path) != digest:
+                return None
+        if self._stored(invocation["fingerprint"]) is None:
+            return None
+        return invocation["fingerprint"]
+
+    def _stored(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        The manifest of a stored result, or None if it or any of its objects
+        is missing.
+        """
+        manifest = self._read_json(self._result_path(fingerprint))
+        if manifest is None or not all(
+            os.path.isfile(self._object_path(digest))
+            for digest in manifest.get("files", {}).values()
+        ):
+            return None
+        return manifest
+
+    def put(self, command: List[str], outdir: str) -> str:
+        """
+        Store the result of a command which has just run in `outdir`.
+
+        :returns: The fingerprint of the result.
+        """
+        gem5 = shutil.which(command[0]) or command[0]
+        workloads = {
+            path: self.file_digest(path)
+            for path in self.workload_files(outdir)
+        }
+        fingerprint = self.fingerprint(
+            outdir, self.file_digest(gem5), workloads
+        )
+
+        # A result whose objects went missing is stored again.
+        if self._stored(fingerprint) is None:
+            manifest = {"fingerprint": fingerprint, "files": {}, "size": 0}
+            for name in RESULT_FILES:
+                path = os.path.join(outdir, name)
+                if not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                try:
+                    # Protect the object from a concurrent `evict` until
+                    # the manifest refers to it.
+                    os.utime(self._object_path(digest))
+                except FileNotFoundError:
+                    self._write_atomic(
+                        self._object_path(digest), compress(data)
+                    )
+                manifest["files"][name] = digest
+                manifest["size"] += os.path.getsize(
+                    self._object_path(digest)
+                )
+            self._write_atomic(
+                self._result_path(fingerprint), json.dumps(manifest).encode()
+            )
+
+        invocation = {"fingerprint": fingerprint, "workloads": workloads}
+        self._write_atomic(
+            self._invocation_path(self.invocation_key(command, outdir)),
+            json.dumps(invocation).encode(),
+        )
+        return fingerprint
+
+    def restore(self, fingerprint: str, outdir: str) -> None:
+        """
+        Write the files of a stored result into `outdir` and mark it as
+        used.
+
+        :raises KeyError: If the result or any of its objects is missing or
+        cannot be read. Nothing is written then.
+        """
+        path = self._result_path(fingerprint)
+        manifest = self._read_json(path)
+        if manifest is None:
+            raise KeyError(f"No stored result '{fingerprint}'.")
+        files = {}
+        errors = []
+        for name, digest in manifest["files"].items():
+            try:
+                with open(self._object_path(digest), "rb") as f:
+                    files[name] = decompress(f.read())
+            except Exception as error:
+                # Missing, truncated or corrupt objects alike. Corrupt ones
+                # are removed so that the result is stored again; zstd
+                # objects on a host without zstd are left for other hosts.
+                errors.append(f"{digest}: {error}")
+                if not isinstance(error, (OSError, ImportError)):
+                    try:
+                        os.remove(self._object_path(digest))
+                    except FileNotFoundError:
+                        pass
+        if errors:
+            raise KeyError(
+                f"The stored result '{fingerprint}' cannot be read: "
+                + "; ".join(errors)
+            )
+        for name, data in files.items():
+            self._write_atomic(os.path.join(outdir, name), data)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted since it was read; the files are restored all the same.
+            pass
+
+    def run(
+        self,
+        command: List[str],
+        outdir: str,
+        runner: Callable[[List[str], str], int],
+        refresh: bool = False,
+    ) -> int:
+        """
+        Restore the result of a command from the cache, or run it with
+        `runner(command, outdir)` and store its result if it succeeds.
+
+        :param refresh: Run the command even if its result is stored. Its
+        new result is stored as usual.
+
+        :returns: The exit code of the command, 0 on a cache hit.
+        """
+        fingerprint = None if refresh else self.lookup(command, outdir)
+        if fingerprint is not None:
+            os.makedirs(outdir, exist_ok=True)
+            try:
+                self.restore(fingerprint, outdir)
+                return 0
+            except KeyError:
+                # The result was evicted or damaged since the lookup: run
+                # the command, which stores it again.
+                pass
+        exit_code = runner(command, outdir)
+        if exit_code == 0 and os.path.isfile(
+            os.path.join(outdir, "stats.txt")
+        ):
+            self.put(command, outdir)
+        return exit_code
+
+    def results(self) -> List[Dict[str, Any]]:
+        """
+        The manifests of the stored results, least recently used first, with
+        their last use time in `used`.
+        """
+        results = []
+        directory = os.path.join(self.root, "results")
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith(".json"):
+                continue
+            manifest = self._read_json(path)
+            if manifest is not None:
+                manifest["used"] = os.path.getmtime(path)
+                results.append(manifest)
+        return sorted(results, key=lambda manifest: manifest["used"])
+
+    def evict(self, max_size: int) -> int:
+        """
+        Remove the least recently used results until the stored objects take
+        at most `max_size` bytes, then the objects and invocations no stored
+        result refers to. Objects written in the last `COLLECT_GRACE`
+        seconds are kept, as concurrent runs may be storing them.
+
+        :returns: The number of results removed.
+        """
+        results = self.results()
+        references: Dict[str, int] = {}
+        for manifest in results:
+            for digest in manifest["files"].values():
+                references[digest] = references.get(digest, 0) + 1
+        size = sum(
+            os.path.getsize(self._object_path(digest))
+            for digest in references
+            if os.path.exists(self._object_path(digest))
+        )
+
+        removed = 0
+        for manifest in results:
+            if size <= max_size:
+                break
+            os.remove(self._result_path(manifest["fingerprint"]))
+            removed += 1
+            for digest in manifest["files"].values():
+                references[digest] -= 1
+                if references[digest] == 0 and os.path.exists(
+                    self._object_path(digest)
+                ):
+                    size -= os.path.getsize(self._object_path(digest))
+        self._collect(
+            {digest for digest, count in references.items() if count > 0}
+        )
+        return removed
+
+    def _collect(self, referenced: set) -> None:
+        objects = os.path.join(self.root, "objects")
+        recent = time.time() - COLLECT_GRACE
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                path = os.path.join(objects, prefix, name)
+                # Objects still being written by `put`, or written but not
+                # listed in a manifest yet, are skipped.
+                if ".tmp-" in name or prefix + name in referenced:
+                    continue
+                try:
+                    if os.path.getmtime(path) < recent:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        invocations = os.path.join(self.root, "invocations")
+        for name in os.listdir(invocations):
+            invocation = self._read_json(os.path.join(invocations, name))
+            if invocation is not None and not os.path.exists(
+                self._result_path(invocation["fingerprint"])
+            ):
+                os.remove(os.path.join(invocations, name))
+
+
+def _run(command: List[str], outdir: str) -> int:
+    return subprocess.call(command)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reuse the results of gem5 runs whose configuration, "
+        "workload and gem5 binary have not changed."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=DEFAULT_ROOT,
+        help="The directory of the cache.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run a gem5 command unless its result is stored."
+    )
+    run_parser.add_argument(
+        "--outdir",
+        type=str,
+        default="m5out",
+        help="The output directory of the command.",
+    )
+    run_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Run the command even if its result is stored.",
+    )
+    run_parser.add_argument(
+        "gem5_command", nargs=argparse.REMAINDER, help="The gem5 command."
+    )
+
+    subparsers.add_parser("list", help="List the stored results.")
+
+    evict_parser = subparsers.add_parser(
+        "evict", help="Remove the least recently used results."
+    )
+    evict_parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        required=True,
+        help="The size to shrink the cache to, e.g. 2GiB.",
+    )
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache)
+    if args.command == "run":
+        command = args.gem5_command
+        if command and command[0] == "--":
+            command = command[1:]
+        if not command:
+            parser.error("No gem5 command given.")
+        if not args.no_cache and cache.lookup(command, args.outdir):
+            print(f"Restoring the stored result into {args.outdir}.")
+        exit_code = cache.run(command, args.outdir, _run, args.no_cache)
+        raise SystemExit(exit_code)
+    elif args.command == "list":
+        for manifest in cache.results():
+            used = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(manifest["used"])
+            )
+            print(
+                f"{manifest['fingerprint']}\tlast used {used}\t"
+                f"{manifest['size']} bytes"
+            )
+    else:
+        print(f"Removed {cache.evict(args.max_size)} results.")
@@ -0,0 +1,477 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+SimPoint clustering and weighted replay.
+
+This is the host-side half of the SimPoint flow of
+materials/using-gem5/09-accelerating-simulations/04-simpoints:
+
+1. `cluster` reads the basic block vectors (BBVs) written by gem5's SimPoint
+probe (`simpoint.bb.gz`) and picks one representative interval per phase of
+the program. The BBVs are normalized, randomly projected to a few dimensions
+and clustered with k-means for every k up to `--max-k`. The smallest k whose
+Bayesian information criterion (BIC) score is within 90% of the best one is
+kept, as done by the SimPoint 3 tool. The `simpoints` and `weights` files are
+written in the SimPoint 3 format.
+
+2. `replay` restores every SimPoint checkpoint in its own gem5 process, at
+most one per host core at a time, and reports the CPI of each region and the
+CPI of the whole program, weighted by the size of each phase.
+
+Usage:
+------
+
+```
+python3 -m util.simpoints cluster m5out/simpoint.bb.gz -o simpoints
+python3 -m util.simpoints replay simpoint-checkpoints \
+    --binary <path/to/binary> [--cpu o3] [--jobs <N>]
+```
+"""
+
+import argparse
+import gzip
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .sweep import run_sweep, write_table
+
+RESTORE_SCRIPT = os.path.join(
+    "materials",
+    "using-gem5",
+    "09-accelerating-simulations",
+    "04-simpoints",
+    "base-system-simpoints.py",
+)
+
+# The checkpoint directory names used by base-system-simpoints.py.
+CHECKPOINT_NAME = re.compile(
+    r"cpt\.simpoint_(?P<index>\d+)_inst_(?P<inst>\d+)"
+    r"_weight_(?P<weight>[0-9.eE+-]+)_interval_(?P<interval>\d+)"
+    r"_warmup_(?P<warmup>\d+)$"
+)
+
+CYCLES_STAT = "system.processor.cores*.core.numCycles"
+
+
+def read_bbvs(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Read a gem5 basic block vector file. Each line starting with "T" is one
+    interval and holds ":<basic block id>:<count>" pairs.
+
+    :returns: The interval, basic block and count of every non-zero entry, as
+    three arrays, and the number of intervals. Basic block ids are renumbered
+    from 0.
+    """
+    rows = []
+    blocks = []
+    counts = []
+    num_intervals = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            if not line.startswith("T"):
+                continue
+            for token in line[1:].split():
+                _, block, count = token.split(":")
+                blocks.append(int(block))
+                counts.append(int(count))
+            rows.extend([num_intervals] * (len(blocks) - len(rows)))
+            num_intervals += 1
+    _, columns = np.unique(
+        np.array(blocks, dtype=np.int64), return_inverse=True
+    )
+    return (
+        np.array(rows, dtype=np.int64),
+        columns,
+        np.array(counts, dtype=np.float64),
+        num_intervals,
+    )
+
+
+def project(
+    rows: np.ndarray,
+    columns: np.ndarray,
+    counts: np.ndarray,
+    num_intervals: int,
+    dims: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Normalize each interval's BBV to sum to 1 and project it onto `dims`
+    random dimensions. The full interval x basic block matrix is never built.
+    """
+    totals = np.bincount(rows, weights=counts, minlength=num_intervals)
+    values = counts / totals[rows]
+    projection = rng.uniform(-1.0, 1.0, (int(columns.max()) + 1, dims))
+    points = np.empty((num_intervals, dims))
+    for d in range(dims):
+        points[:, d] = np.bincount(
+            rows,
+            weights=values * projection[columns, d],
+            minlength=num_intervals,
+        )
+    return points
+
+
+def _sq_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    distances = (
+        np.einsum("ij,ij->i", points, points)[:, None]
+        - 2.0 * points @ centers.T
+        + np.einsum("ij,ij->i", centers, centers)[None, :]
+    )
+    return np.maximum(distances, 0.0)
+
+
+def kmeans(
+    points: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    max_iterations: int = 100,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster `points` into `k` clusters with k-means++ seeding and Lloyd's
+    iterations.
+
+    :returns: The cluster centers and the cluster of every point.
+    """
+    n = len(points)
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(n)]
+    closest = _sq_distances(points, centers[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            centers[i] = points[rng.choice(n, p=closest / total)]
+        else:
+            centers[i] = points[rng.integers(n)]
+        closest = np.minimum(
+            closest, _sq_distances(points, centers[i : i + 1])[:, 0]
+        )
+
+    labels = None
+    for _ in range(max_iterations):
+        new_labels = _sq_distances(points, centers).argmin(axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        sizes = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        # An empty cluster keeps its previous center.
+        filled = sizes > 0
+        centers[filled] = sums[filled] / sizes[filled, None]
+    return centers, labels
+
+
+def bic(points: np.ndarray, centers: np.ndarray, labels: np.ndarray) -> float:
+    """
+    The Bayesian information criterion of a clustering, assuming spherical
+    Gaussian clusters with a shared variance (Pelleg and Moore, X-means).
+    """
+    n, dims = points.shape
+    k = len(centers)
+    if n <= k:
+        return -math.inf
+    distortion = ((points - centers[labels]) ** 2).sum()
+    variance = max(distortion / (n - k), 1e-12)
+    sizes = np.bincount(labels, minlength=k)
+    sizes = sizes[sizes > 0]
+    likelihood = (
+        sizes * np.log(sizes)
+        - sizes * math.log(n)
+        - sizes * dims / 2.0 * math.log(2.0 * math.pi * variance)
+        - (sizes - 1) / 2.0
+    ).sum()
+    parameters = (k - 1) + dims * k + 1
+    return likelihood - parameters / 2.0 * math.log(n)
+
+
+def find_simpoints(
+    path: str,
+    max_k: int = 30,
+    dims: int = 15,
+    seeds: int = 5,
+    bic_threshold: float = 0.9,
+    seed: int = 0,
+) -> List[Tuple[int, float]]:
+    """
+    Pick the SimPoints of a program from its basic block vectors.
+
+    :param path: The BBV file written by the SimPoint probe.
+    :param max_k: The largest number of clusters tried.
+    :param dims: The number of dimensions the BBVs are projected to.
+    :param seeds: The number of k-means runs per k. The best run is kept.
+    :param bic_threshold: The fraction of the BIC score range the chosen
+    clustering must reach.
+
+    :returns: One (interval, weight) pair per SimPoint. The interval is the
+    one closest to the center of its cluster and the weight is the fraction
+    of all the intervals in that cluster.
+    """
+    rng = np.random.default_rng(seed)
+    rows, columns, counts, num_intervals = read_bbvs(path)
+    if num_intervals == 0:
+        raise ValueError(f"'{path}' does not contain any interval.")
+    if num_intervals == 1:
+        return [(0, 1.0)]
+    points = project(rows, columns, counts, num_intervals, dims, rng)
+
+    results = []
+    for k in range(1, min(max_k, num_intervals) + 1):
+        best = None
+        for _ in range(seeds):
+            centers, labels = kmeans(points, k, rng)
+            distortion = ((points - centers[labels]) ** 2).sum()
+            if best is None or distortion < best[0]:
+                best = (distortion, centers, labels)
+        _, centers, labels = best
+        results.append((bic(points, centers, labels), centers, labels))
+
+    scores = np.array([score for score, _, _ in results])
+    finite = scores[np.isfinite(scores)]
+    if len(finite):
+        cutoff = finite.min() + bic_threshold * (finite.max() - finite.min())
+        _, centers, labels = next(r for r in results if r[0] >= cutoff)
+    else:
+        # Too few intervals to score any clustering: keep a single cluster.
+        _, centers, labels = results[0]
+
+    distances = ((points - centers[labels]) ** 2).sum(axis=1)
+    simpoints = []
+    for cluster in np.unique(labels):
+        members = np.flatnonzero(labels == cluster)
+        closest = members[distances[members].argmin()]
+        simpoints.append((int(closest), len(members) / num_intervals))
+    return sorted(simpoints)
+
+
+def write_simpoints(simpoints: List[Tuple[int, float]], outdir: str) -> None:
+    """
+    Write the SimPoints to the `simpoints` and `weights` files of `outdir`,
+    in the format of the SimPoint 3 tool.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, "simpoints"), "w") as f:
+        for cluster, (interval, _) in enumerate(simpoints):
+            f.write(f"{interval} {cluster}\n")
+    with open(os.path.join(outdir, "weights"), "w") as f:
+        for cluster, (_, weight) in enumerate(simpoints):
+            f.write(f"{weight} {cluster}\n")
+
+
+def find_checkpoints(checkpoint_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Find the SimPoint checkpoints taken by base-system-simpoints.py.
+
+    :returns: A mapping of each checkpoint's directory to the SimPoint
+    information encoded in its name.
+    """
+    checkpoints = {}
+    for name in sorted(os.listdir(checkpoint_dir)):
+        match = CHECKPOINT_NAME.match(name)
+        if match:
+            info = match.groupdict()
+            checkpoints[os.path.join(checkpoint_dir, name)] = {
+                "simpoint": int(info["index"]),
+                "weight": float(info["weight"]),
+                "interval": int(info["interval"]),
+            }
+    return checkpoints
+
+
+def replay(
+    checkpoint_dir: str,
+    binary: str,
+    cpu: str = "timing",
+    gem5: str = "gem5-x86",
+    outdir: str = "simpoint-replay",
+    jobs: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Restore every SimPoint checkpoint in `checkpoint_dir` in parallel and
+    simulate its region in detail.
+
+    :returns: One row per SimPoint with its weight, cycles and CPI, and the
+    weighted CPI of the whole program.
+    """
+    checkpoints = find_checkpoints(checkpoint_dir)
+    if not checkpoints:
+        raise ValueError(
+            f"No SimPoint checkpoints found in '{checkpoint_dir}'."
+        )
+
+    config = {
+        "command": [
+            gem5,
+            "--outdir={outdir}",
+            RESTORE_SCRIPT,
+            "--binary",
+            binary,
+            "--mode",
+            "restore",
+            "--cpu",
+            cpu,
+            "--checkpoint",
+            "{checkpoint}",
+        ],
+        "outdir": outdir,
+        "parameters": {"checkpoint": list(checkpoints)},
+        "stats": [CYCLES_STAT],
+        # The region's statistics are dumped after those of the warmup.
+        "dump": -1,
+    }
+
+    rows = []
+    weighted_cpi = 0.0
+    total_weight = 0.0
+    for result in run_sweep(config, jobs=jobs):
+        info = checkpoints[result["checkpoint"]]
+        cycles = sum(
+            value
+            for name, value in result.items()
+            if name.startswith("system.processor.")
+        )
+        row = dict(info)
+        row["exit_code"] = result["exit_code"]
+        row["cycles"] = cycles
+        row["cpi"] = cycles / info["interval"] if cycles else float("nan")
+        rows.append(row)
+        if cycles:
+            weighted_cpi += info["weight"] * row["cpi"]
+            total_weight += info["weight"]
+
+    # The weights are renormalized if some regions failed to run.
+    return rows, weighted_cpi / total_weight if total_weight else float("nan")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pick SimPoints from gem5 basic block vectors and replay "
+        "their checkpoints."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cluster_parser = subparsers.add_parser(
+        "cluster", help="Cluster basic block vectors into SimPoints."
+    )
+    cluster_parser.add_argument(
+        "bbv_file", type=str, help="The simpoint.bb.gz file written by gem5."
+    )
+    cluster_parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="simpoints",
+        help="The directory the simpoints and weights files are written to.",
+    )
+    cluster_parser.add_argument(
+        "--max-k",
+        type=int,
+        default=30,
+        help="The largest number of SimPoints to pick.",
+    )
+    cluster_parser.add_argument(
+        "--dims",
+        type=int,
+        default=15,
+        help="The number of dimensions the vectors are projected to.",
+    )
+    cluster_parser.add_argument(
+        "--seed", type=int, default=0, help="The random seed."
+    )
+
+    replay_parser = subparsers.add_parser(
+        "replay",
+        help="Restore every SimPoint checkpoint in parallel and report the "
+        "weighted CPI.",
+    )
+    replay_parser.add_argument(
+        "checkpoint_dir",
+        type=str,
+        help="The directory holding the SimPoint checkpoints.",
+    )
+    replay_parser.add_argument(
+        "--binary",
+        "-b",
+        type=str,
+        required=True,
+        help="The binary the checkpoints were taken from.",
+    )
+    replay_parser.add_argument(
+        "--cpu",
+        type=str,
+        choices=["timing", "o3"],
+        default="timing",
+        help="The CPU model the regions are simulated with.",
+    )
+    replay_parser.add_argument(
+        "--gem5", type=str, default="gem5-x86", help="The gem5 binary."
+    )
+    replay_parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="simpoint-replay",
+        help="The directory the regions are simulated in.",
+    )
+    replay_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of regions simulated at once. Defaults to the "
+        "number of host cores.",
+    )
+    args = parser.parse_args()
+
+    if args.command == "cluster":
+        simpoints = find_simpoints(
+            args.bbv_file, max_k=args.max_k, dims=args.dims, seed=args.seed
+        )
+        write_simpoints(simpoints, args.outdir)
+        print(f"Found {len(simpoints)} SimPoints, written to {args.outdir}.")
+    else:
+        rows, weighted_cpi = replay(
+            args.checkpoint_dir,
+            args.binary,
+            cpu=args.cpu,
+            gem5=args.gem5,
+            outdir=args.outdir,
+            jobs=args.jobs,
+        )
+        table = os.path.join(args.outdir, "results.csv")
+        write_table(rows, table)
+        for row in rows:
+            print(
+                f"SimPoint {row['simpoint']}: weight {row['weight']:.4f}, "
+                f"CPI {row['cpi']:.4f}"
+            )
+        print(f"Weighted CPI: {weighted_cpi:.4f}")
+        print(f"Results written to {table}.")
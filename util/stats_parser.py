@@ -0,0 +1,304 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A streaming parser for gem5's stats.txt output.
+
+gem5 appends one block of statistics to stats.txt each time the stats are
+dumped. With periodic dumps these files grow to many gigabytes. This parser
+reads the file one line at a time and yields one dump block at a time, so the
+whole file is never held in memory. Only the statistics matching the given
+glob patterns (e.g. `system.processor.cores*.core.numInsts`) are kept.
+
+The selected statistics can be written out as columns, one row per dump, to
+a NumPy `.npz` archive or, if pyarrow is installed, to a Parquet or Arrow
+file.
+
+Usage:
+------
+
+```
+python3 -m util.stats_parser m5out/stats.txt \
+    -s "system.processor.cores*.core.numInsts" -s simSeconds \
+    -o insts.npz
+```
+
+Without `-o` the matching statistics of each dump are printed.
+"""
+
+import argparse
+import fnmatch
+import gzip
+import re
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, Optional
+
+BEGIN_MARKER = "---------- Begin Simulation Statistics ----------"
+END_MARKER = "---------- End Simulation Statistics   ----------"
+
+
+def _compile_patterns(patterns: Optional[Iterable[str]]):
+    """
+    Compile a list of glob patterns into a single regular expression match
+    function. No patterns means every statistic matches.
+    """
+    if not patterns:
+        return lambda name: True
+    regex = re.compile(
+        "|".join(f"(?:{fnmatch.translate(p)})" for p in patterns)
+    )
+    return lambda name: regex.match(name) is not None
+
+
+def _parse_value(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        # Some statistics, such as percentages in distributions, carry a
+        # unit suffix.
+        return float(value.rstrip("%"))
+
+
+def iter_dumps(
+    path: str, patterns: Optional[Iterable[str]] = None
+) -> Iterator[Dict[str, float]]:
+    """
+    Iterate over the dump blocks of a stats.txt file.
+
+    :param path: The stats.txt file. Gzipped files (".gz") are supported.
+    :param patterns: Glob patterns of the statistics to keep. If not given,
+    all the statistics are kept.
+
+    :returns: An iterator which yields one dictionary per dump block, mapping
+    the statistic names to their values.
+    """
+    matches = _compile_patterns(patterns)
+
+    # The same statistic names appear in every dump block, so whether a name
+    # matches is only worked out the first time it is seen.
+    known = {}
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        dump = None
+        for line in f:
+            if line.startswith("----------"):
+                if line.startswith(BEGIN_MARKER):
+                    dump = {}
+                elif line.startswith(END_MARKER) and dump is not None:
+                    yield dump
+                    dump = None
+                continue
+            if dump is None:
+                continue
+
+            name, _, rest = line.partition(" ")
+            keep = known.get(name)
+            if keep is None:
+                keep = known[name] = bool(name) and matches(name)
+            if not keep:
+                continue
+
+            fields = rest.split(None, 1)
+            if not fields:
+                continue
+            try:
+                dump[name] = _parse_value(fields[0])
+            except ValueError:
+                continue
+
+        # A simulation which was killed may leave its last block unfinished.
+        if dump:
+            yield dump
+
+
+def collect_columns(
+    dumps: Iterable[Dict[str, float]]
+) -> Dict[str, "array"]:
+    """
+    Gather a sequence of dumps into one column per statistic. A statistic
+    missing from a dump is recorded as NaN.
+    """
+    columns = {}
+    num_rows = 0
+    for dump in dumps:
+        for name, value in dump.items():
+            if name not in columns:
+                columns[name] = array("d", [float("nan")] * num_rows)
+            columns[name].append(value)
+        num_rows += 1
+        for column in columns.values():
+            if len(column) < num_rows:
+                column.append(float("nan"))
+    return columns
+
+
+def write_npz(dumps: Iterable[Dict[str, float]], path: str) -> int:
+    """
+    Write the dumps to a compressed NumPy archive with one array per
+    statistic.
+
+    :returns: The number of dumps written.
+    """
+    import numpy as np
+
+    columns = collect_columns(dumps)
+    arrays = {
+        name: np.frombuffer(column, dtype=np.float64)
+        for name, column in columns.items()
+    }
+    np.savez_compressed(path, **arrays)
+    return max((len(col) for col in columns.values()), default=0)
+
+
+def _arrow_batches(dumps: Iterable[Dict[str, float]], batch_size: int):
+    """
+    Group the dumps into pyarrow record batches. The columns are fixed by the
+    first dump; statistics which only appear later are dropped.
+    """
+    import pyarrow as pa
+
+    schema = None
+    rows = []
+    dropped = set()
+
+    def to_batch():
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array([row.get(name) for row in rows], type=pa.float64())
+                for name in schema.names
+            ],
+            schema=schema,
+        )
+
+    for dump in dumps:
+        if schema is None:
+            schema = pa.schema([(name, pa.float64()) for name in dump])
+        new = set(dump).difference(schema.names, dropped)
+        if new:
+            print(
+                f"warning: dropping statistics not in the first dump: "
+                f"{', '.join(sorted(new))}",
+                file=sys.stderr,
+            )
+            dropped.update(new)
+        rows.append(dump)
+        if len(rows) == batch_size:
+            yield to_batch()
+            rows = []
+    if rows:
+        yield to_batch()
+
+
+def write_arrow(
+    dumps: Iterable[Dict[str, float]],
+    path: str,
+    file_format: str = "parquet",
+    batch_size: int = 1024,
+) -> int:
+    """
+    Write the dumps to a Parquet or Arrow IPC file, `batch_size` dumps at a
+    time. Requires pyarrow.
+
+    :returns: The number of dumps written.
+    """
+    try:
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to write Parquet or Arrow files. Install it "
+            "with `pip install pyarrow` or write a .npz file instead."
+        )
+
+    writer = None
+    num_rows = 0
+    try:
+        for batch in _arrow_batches(dumps, batch_size):
+            if writer is None:
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(path, batch.schema)
+                else:
+                    writer = ipc.new_file(path, batch.schema)
+            if file_format == "parquet":
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            num_rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_rows
+
+
+def write_columns(dumps: Iterable[Dict[str, float]], path: str) -> int:
+    """
+    Write the dumps to `path`. The format is chosen by the file extension:
+    ".npz", ".parquet", or ".arrow"/".feather".
+
+    :returns: The number of dumps written.
+    """
+    if path.endswith(".npz"):
+        return write_npz(dumps, path)
+    elif path.endswith(".parquet"):
+        return write_arrow(dumps, path, "parquet")
+    elif path.endswith((".arrow", ".feather")):
+        return write_arrow(dumps, path, "arrow")
+    raise ValueError(f"Unknown output format for '{path}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stream the dumps of a gem5 stats.txt file and select "
+        "statistics by glob pattern."
+    )
+    parser.add_argument("stats_file", type=str, help="The stats.txt file.")
+    parser.add_argument(
+        "-s",
+        "--stat",
+        action="append",
+        dest="patterns",
+        help="A glob pattern of statistics to keep. May be given more than "
+        "once. All statistics are kept if none are given.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="Write the statistics as columns to a .npz, .parquet or "
+        ".arrow file instead of printing them.",
+    )
+    args = parser.parse_args()
+
+    dumps = iter_dumps(args.stats_file, args.patterns)
+    if args.output:
+        num_dumps = write_columns(dumps, args.output)
+        print(f"Wrote {num_dumps} dumps to {args.output}.")
+    else:
+        for i, dump in enumerate(dumps):
+            for name, value in dump.items():
+                print(f"{i}\t{name}\t{value}")
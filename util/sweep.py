@@ -0,0 +1,328 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A design-space sweep driver for gem5 configuration scripts.
+
+A sweep is described in a YAML or TOML file. The file gives the command used
+to run a single design point, with `{name}` placeholders for each swept
+parameter, and the values each parameter may take. The driver expands the
+cross product of all the parameter values, runs every point as its own gem5
+process and collects the requested statistics of every point into a single
+CSV table.
+
+At most `jobs` points run at once. By default this is the number of host
+cores.
+
+An example sweep file (YAML):
+
+```
+command: >-
+  gem5-x86 --outdir={outdir}
+  materials/using-gem5/04-cache-models/simple_cache_run.py
+  {generator_cores} {cache_system} --memory={memory}
+outdir: cache-sweep
+parameters:
+  cache_system: [Classic, MESITwoLevel]
+  generator_cores: [1, 2, 4]
+  memory: [SingleChannelDDR3_1600, DualChannelDDR4_2400]
+stats:
+  - simSeconds
+  - system.processor.cores*.generator.readBW
+```
+
+`{outdir}` is replaced by the output directory of each point. Statistics may
+be given as exact names or as glob patterns. They are read from the first dump
+in each point's stats.txt unless `dump` gives another index; negative indices
+count from the last dump.
+
+Points whose configuration, workload and gem5 binary have not changed since
+they were last run are restored from the result cache (see
+`util.result_cache`) instead of being simulated again. The cache is given
+with `--cache` and disabled with `--no-cache`.
+
+Usage:
+------
+
+```
+python3 -m util.sweep <sweep.yaml> [--jobs <N>] [--outdir <dir>] \
+    [--cache <dir> | --no-cache]
+```
+"""
+
+import argparse
+import collections
+import csv
+import itertools
+import os
+import re
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+
+from .result_cache import DEFAULT_ROOT as DEFAULT_CACHE, ResultCache
+from .stats_parser import iter_dumps
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    """
+    Load a sweep description from a YAML or TOML file. The format is chosen
+    by the file extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(
+                "PyYAML is required to read YAML sweep files. Install it "
+                "with `pip install pyyaml` or use a TOML sweep file."
+            )
+        with open(path) as f:
+            return yaml.safe_load(f)
+    elif extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            # `tomllib` was only added to the standard library in Python 3.11.
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    raise ValueError(f"Unknown sweep file format '{extension}'.")
+
+
+def expand_grid(parameters: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Expand a mapping of parameter names to lists of values into the list of
+    all their combinations. A single value is treated as a one-element list.
+    """
+    names = list(parameters)
+    values = [
+        v if isinstance(v, (list, tuple)) else [v] for v in parameters.values()
+    ]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def point_name(point: Dict[str, Any]) -> str:
+    """
+    A unique, filesystem-safe name for a design point, e.g.
+    "cache_system=Classic-generator_cores=4".
+    """
+    name = "-".join(f"{key}={value}" for key, value in point.items())
+    return re.sub(r"[^A-Za-z0-9._=-]", "_", name)
+
+
+def build_command(
+    template: Any, point: Dict[str, Any], outdir: str
+) -> List[str]:
+    """
+    Fill the command template in with the values of a design point. The
+    template may be a single string or a list of arguments.
+    """
+    if isinstance(template, str):
+        template = shlex.split(template)
+    return [str(arg).format(outdir=outdir, **point) for arg in template]
+
+
+def read_stats(
+    stats_file: str, patterns: Iterable[str], dump: int = 0
+) -> Dict[str, float]:
+    """
+    Read the statistics matching any of `patterns` from one dump in a gem5
+    stats.txt file.
+
+    :param dump: The index of the dump to read. Negative indices count from
+    the end, e.g. -1 is the last dump.
+    """
+    dumps = iter_dumps(stats_file, patterns)
+    if dump < 0:
+        last = collections.deque(dumps, maxlen=-dump)
+        return last[0] if len(last) == -dump else {}
+    return next(itertools.islice(dumps, dump, None), {})
+
+
+def run_point(command: List[str], outdir: str) -> int:
+    """
+    Run a single design point. The output of the command is written to
+    `sweep.log` in the point's output directory.
+
+    :returns: The exit code of the command.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, "sweep.log"), "w") as log:
+        log.write(" ".join(shlex.quote(arg) for arg in command) + "\n")
+        log.flush()
+        return subprocess.call(
+            command, stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+def run_sweep(
+    config: Dict[str, Any],
+    outdir: Optional[str] = None,
+    jobs: Optional[int] = None,
+    dry_run: bool = False,
+    cache: Optional[ResultCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run every point of a sweep and collect the results.
+
+    :param config: The sweep description (see `load_config`).
+    :param outdir: Overrides the output directory given in the config.
+    :param jobs: Overrides the number of points run at once.
+    :param dry_run: Print the commands instead of running them.
+    :param cache: Restore the points already run from this cache, and store
+    the results of the others in it.
+
+    :returns: One row per design point holding the point's parameters, the
+    exit code of its run and the statistics read from its stats.txt.
+    """
+    outdir = outdir or config.get("outdir", "sweep")
+    jobs = jobs or config.get("jobs") or os.cpu_count()
+    points = expand_grid(config["parameters"])
+
+    runs = []
+    for point in points:
+        point_dir = os.path.join(outdir, point_name(point))
+        runs.append(
+            (point, point_dir, build_command(config["command"], point, point_dir))
+        )
+
+    if dry_run:
+        for _, _, command in runs:
+            print(" ".join(shlex.quote(arg) for arg in command))
+        return []
+
+    print(f"Running {len(runs)} design points, {jobs} at a time.")
+    exit_codes = {}
+    cached = set()
+    if cache is not None:
+        for _, point_dir, command in runs:
+            if cache.lookup(command, point_dir) is not None:
+                cached.add(point_dir)
+        if cached:
+            print(f"{len(cached)} points are restored from the cache.")
+
+    def run(command, point_dir):
+        if cache is None:
+            return run_point(command, point_dir)
+        return cache.run(command, point_dir, run_point)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(run, command, point_dir): point_dir
+            for _, point_dir, command in runs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            point_dir = futures[future]
+            exit_codes[point_dir] = future.result()
+            if point_dir in cached:
+                print(f"[{done}/{len(runs)}] {point_dir} restored.")
+                continue
+            print(
+                f"[{done}/{len(runs)}] {point_dir} exited with code "
+                f"{exit_codes[point_dir]}."
+            )
+
+    rows = []
+    for point, point_dir, _ in runs:
+        row = dict(point)
+        row["exit_code"] = exit_codes[point_dir]
+        stats_file = os.path.join(point_dir, "stats.txt")
+        if os.path.exists(stats_file):
+            row.update(
+                read_stats(
+                    stats_file, config.get("stats", []), config.get("dump", 0)
+                )
+            )
+        rows.append(row)
+    return rows
+
+
+def write_table(rows: List[Dict[str, Any]], path: str) -> None:
+    """
+    Write the sweep results to a CSV file. Points missing a statistic get an
+    empty cell.
+    """
+    columns = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a gem5 design-space sweep described by a YAML or "
+        "TOML file."
+    )
+    parser.add_argument(
+        "config", type=str, help="The YAML or TOML sweep description."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of points to run at once. Defaults to the number "
+        "of host cores.",
+    )
+    parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        help="The directory the points are run in. Overrides the config.",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Print the command of each point instead of running it.",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=DEFAULT_CACHE,
+        help="The directory of the result cache.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Run every point, without reading or storing cached results.",
+    )
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    cache = None if args.no_cache else ResultCache(args.cache)
+    rows = run_sweep(config, args.outdir, args.jobs, args.dry_run, cache)
+    if rows:
+        table = os.path.join(
+            args.outdir or config.get("outdir", "sweep"), "results.csv"
+        )
+        write_table(rows, table)
+        print(f"Results written to {table}.")
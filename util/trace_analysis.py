@@ -0,0 +1,441 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Offline analysis of the memory traces written by gem5's MemTraceProbe.
+
+The packets are streamed from the trace in chunks of a bounded number of
+packets, either a gem5 protobuf trace (e.g. the one recorded by
+materials/extra-topics/02-monitor-and-trace/simple_comm_trace.py) or an
+indexed trace written by `python3 -m util.memtrace pack`. Each chunk is
+analyzed with NumPy and only the running totals, and the last access of
+every block, are kept between chunks.
+
+The analysis reports:
+
+- the read/write mix, in packets and bytes;
+- the reuse interval histogram: for each power of 2, the number of accesses
+to a block whose previous access to the same block was that many accesses
+earlier, up to the next power of 2, and the number of first accesses. This
+is not the reuse distance: repeated accesses to the same block in between
+are counted too, so the interval is only an upper bound on the LRU stack
+distance;
+- the stride histogram: the distance, in blocks, between the blocks of two
+consecutive packets;
+- per window of `--window-ticks` ticks: the bytes read and written, the
+bandwidth, the number of distinct blocks accessed in the window and the
+footprint of the trace so far.
+
+Usage:
+------
+
+```
+python3 -m util.trace_analysis m5out/mem_trace.gz [--block-size 64] \
+    [--window-ticks 1000000] [--windows-csv windows.csv] [--json out.json]
+```
+"""
+
+import argparse
+import itertools
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .memtrace import Packet, open_trace, read_proto_trace
+from .sweep import write_table
+
+# The MemCmd values of the requests which read or write memory, as numbered
+# in gem5's src/mem/packet.hh.
+READ_CMDS = [1, 11, 12, 13, 22, 24, 25, 26]
+WRITE_CMDS = [4, 7, 8, 9, 16, 27]
+
+_NUMERIC_FIELDS = ["tick", "cmd", "addr", "size"]
+
+
+def iter_arrays(
+    path: str, chunk_packets: int = 1 << 20
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Read the tick, cmd, addr and size of the packets of a trace, in chunks.
+
+    :param chunk_packets: The number of packets per chunk of a gem5 trace.
+    The chunks of an indexed trace are those it was packed with.
+
+    :returns: An iterator of dictionaries mapping each field name to an
+    array of the values of that field.
+    """
+    _, trace = open_trace(path)
+    if trace is not None:
+        for columns in trace.iter_chunks():
+            yield {
+                name: np.frombuffer(column, dtype=column.typecode)
+                for name, column in columns.items()
+                if name in _NUMERIC_FIELDS
+            }
+        return
+
+    _, packets = read_proto_trace(path)
+    indices = [Packet._fields.index(name) for name in _NUMERIC_FIELDS]
+    while True:
+        batch = list(itertools.islice(packets, chunk_packets))
+        if not batch:
+            return
+        values = np.array(batch, dtype=np.uint64)
+        yield {
+            name: values[:, i] for name, i in zip(_NUMERIC_FIELDS, indices)
+        }
+
+
+class TraceAnalysis:
+    def __init__(
+        self,
+        block_size: int = 64,
+        window_ticks: int = 1000000,
+        max_stride: int = 16,
+    ) -> None:
+        """
+        :param block_size: The size, in bytes, of the blocks whose reuse and
+        footprint are measured.
+        :param window_ticks: The length of the windows of the bandwidth and
+        footprint series.
+        :param max_stride: Strides of at most this many blocks, either way,
+        are counted one by one. Larger ones are counted together.
+        """
+        self.block_size = block_size
+        self.window_ticks = window_ticks
+        self.max_stride = max_stride
+
+        self.packets = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.first_accesses = 0
+        self.reuse_intervals = np.zeros(64, dtype=np.int64)
+        self.strides = np.zeros(2 * max_stride + 1, dtype=np.int64)
+        self.large_strides = 0
+
+        # Every block accessed so far, sorted, and the index of the packet
+        # which last accessed it.
+        self._blocks = np.empty(0, dtype=np.uint64)
+        self._last = np.empty(0, dtype=np.int64)
+        self._last_block = None
+
+        # Per window: [bytes read, bytes written, first accesses].
+        self._windows: Dict[int, np.ndarray] = {}
+        # The distinct blocks of each window, until the window is complete.
+        self._window_blocks: Dict[int, np.ndarray] = {}
+        self._distinct: Dict[int, int] = {}
+
+    def update(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Add a chunk of packets, as returned by `iter_arrays`, to the
+        analysis. Chunks must be given in trace order.
+
+        :returns: The reuse interval of each packet, 0 for first accesses.
+        """
+        cmds = columns["cmd"]
+        sizes = columns["size"].astype(np.int64)
+        blocks = columns["addr"] // np.uint64(self.block_size)
+        windows = (columns["tick"] // np.uint64(self.window_ticks)).astype(
+            np.int64
+        )
+        n = len(blocks)
+        is_read = np.isin(cmds, READ_CMDS)
+        is_write = np.isin(cmds, WRITE_CMDS)
+
+        self.reads += int(is_read.sum())
+        self.writes += int(is_write.sum())
+        self.bytes_read += int(sizes[is_read].sum())
+        self.bytes_written += int(sizes[is_write].sum())
+
+        self._update_strides(blocks)
+        intervals = self._update_reuse(blocks, self.packets + np.arange(n))
+        self._update_windows(
+            windows,
+            blocks,
+            sizes * is_read,
+            sizes * is_write,
+            intervals == 0,
+        )
+        self.packets += n
+        return intervals
+
+    def _update_strides(self, blocks: np.ndarray) -> None:
+        signed = blocks.astype(np.int64)
+        if self._last_block is not None:
+            signed = np.concatenate(([self._last_block], signed))
+        self._last_block = signed[-1]
+        strides = np.diff(signed)
+        small = np.abs(strides) <= self.max_stride
+        self.strides += np.bincount(
+            strides[small] + self.max_stride,
+            minlength=len(self.strides),
+        )
+        self.large_strides += int((~small).sum())
+
+    def _update_reuse(
+        self, blocks: np.ndarray, indices: np.ndarray
+    ) -> np.ndarray:
+        """
+        Count the reuse intervals of a chunk and record the last access of
+        each of its blocks.
+
+        :returns: The reuse interval of each packet, 0 for first accesses.
+        """
+        order = np.argsort(blocks, kind="stable")
+        sorted_blocks = blocks[order]
+        sorted_indices = indices[order]
+        repeated = sorted_blocks[1:] == sorted_blocks[:-1]
+        per_packet = np.zeros(len(blocks), dtype=np.int64)
+        per_packet[order[1:][repeated]] = (
+            sorted_indices[1:][repeated] - sorted_indices[:-1][repeated]
+        )
+
+        # The first access of each block in this chunk is matched with its
+        # last access in the previous chunks, if any.
+        heads = np.concatenate(([True], ~repeated))
+        head_blocks = sorted_blocks[heads]
+        pos = np.searchsorted(self._blocks, head_blocks)
+        found = pos < len(self._blocks)
+        found[found] = self._blocks[pos[found]] == head_blocks[found]
+        per_packet[order[heads][found]] = (
+            sorted_indices[heads][found] - self._last[pos[found]]
+        )
+        intervals = per_packet[per_packet > 0]
+        self.reuse_intervals += np.bincount(
+            np.floor(np.log2(intervals)).astype(np.int64),
+            minlength=len(self.reuse_intervals),
+        )[: len(self.reuse_intervals)]
+
+        self.first_accesses += int((~found).sum())
+
+        # Record the last access of each block of this chunk.
+        tails = np.concatenate((~repeated, [True]))
+        tail_indices = sorted_indices[tails]
+        self._last[pos[found]] = tail_indices[found]
+        blocks = np.concatenate((self._blocks, head_blocks[~found]))
+        last = np.concatenate((self._last, tail_indices[~found]))
+        order = np.argsort(blocks, kind="stable")
+        self._blocks = blocks[order]
+        self._last = last[order]
+        return per_packet
+
+    def _update_windows(
+        self,
+        windows: np.ndarray,
+        blocks: np.ndarray,
+        read_bytes: np.ndarray,
+        write_bytes: np.ndarray,
+        first: np.ndarray,
+    ) -> None:
+        if not len(windows):
+            return
+        base = int(windows.min())
+        offsets = windows - base
+        length = int(offsets.max()) + 1
+        totals = np.stack(
+            [
+                np.bincount(offsets, weights=read_bytes, minlength=length),
+                np.bincount(offsets, weights=write_bytes, minlength=length),
+                np.bincount(offsets, weights=first, minlength=length),
+            ],
+            axis=1,
+        ).astype(np.int64)
+        for offset in np.flatnonzero(np.bincount(offsets)):
+            window = base + int(offset)
+            if window in self._windows:
+                self._windows[window] += totals[offset]
+            else:
+                self._windows[window] = totals[offset]
+
+        # The distinct blocks of a window are only kept while it may still
+        # have packets, i.e. until a later window starts.
+        order = np.argsort(offsets, kind="stable")
+        bounds = np.flatnonzero(np.diff(offsets[order])) + 1
+        for group in np.split(order, bounds):
+            window = base + int(offsets[group[0]])
+            distinct = np.unique(blocks[group])
+            if window in self._window_blocks:
+                distinct = np.union1d(self._window_blocks[window], distinct)
+            self._window_blocks[window] = distinct
+        last = max(self._window_blocks)
+        for window in [w for w in self._window_blocks if w < last]:
+            self._distinct[window] = len(self._window_blocks.pop(window))
+
+    def windows(
+        self, tick_freq: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The per-window series, one dictionary per window with packets.
+
+        :param tick_freq: The ticks per second of the trace, from its
+        header. The bandwidth is only reported if given.
+        """
+        distinct = dict(self._distinct)
+        distinct.update(
+            {w: len(blocks) for w, blocks in self._window_blocks.items()}
+        )
+        rows = []
+        footprint = 0
+        for window in sorted(self._windows):
+            read, written, new = (int(v) for v in self._windows[window])
+            footprint += new
+            row = {
+                "start_tick": window * self.window_ticks,
+                "bytes_read": read,
+                "bytes_written": written,
+                "distinct_blocks": distinct.get(window, 0),
+                "footprint_blocks": footprint,
+            }
+            if tick_freq:
+                seconds = self.window_ticks / tick_freq
+                row["read_bandwidth"] = read / seconds
+                row["write_bandwidth"] = written / seconds
+            rows.append(row)
+        return rows
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        The whole-trace results.
+        """
+        reuse = self.reuse_intervals
+        last = int(np.flatnonzero(reuse).max()) if reuse.any() else 0
+        return {
+            "packets": self.packets,
+            "reads": self.reads,
+            "writes": self.writes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "block_size": self.block_size,
+            "footprint_blocks": len(self._blocks),
+            "first_accesses": self.first_accesses,
+            # Reuse intervals in [2**i, 2**(i + 1)) packets.
+            "reuse_intervals": reuse[: last + 1].tolist(),
+            "strides": {
+                str(stride): int(count)
+                for stride, count in zip(
+                    range(-self.max_stride, self.max_stride + 1), self.strides
+                )
+                if count
+            },
+            "large_strides": self.large_strides,
+        }
+
+
+def analyze(
+    path: str,
+    block_size: int = 64,
+    window_ticks: Optional[int] = None,
+    chunk_packets: int = 1 << 20,
+) -> TraceAnalysis:
+    """
+    Analyze a trace.
+
+    :param window_ticks: The length of the windows. Defaults to 1 us at the
+    tick frequency of the trace.
+    """
+    header, _ = open_trace(path)
+    if window_ticks is None:
+        window_ticks = max(header["tick_freq"] // 1000000, 1)
+    analysis = TraceAnalysis(block_size, window_ticks)
+    for columns in iter_arrays(path, chunk_packets):
+        analysis.update(columns)
+    return analysis
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyze a memory trace written by MemTraceProbe."
+    )
+    parser.add_argument(
+        "trace", type=str, help="A gem5 memory trace or indexed trace."
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=64,
+        help="The block size, in bytes, for reuse, strides and footprint.",
+    )
+    parser.add_argument(
+        "--window-ticks",
+        type=int,
+        help="The length of the bandwidth and footprint windows. Defaults "
+        "to 1 us.",
+    )
+    parser.add_argument(
+        "--chunk-packets",
+        type=int,
+        default=1 << 20,
+        help="The number of packets analyzed at a time.",
+    )
+    parser.add_argument(
+        "--windows-csv", type=str, help="Write the per-window series here."
+    )
+    parser.add_argument(
+        "--json", type=str, help="Write the summary and windows here."
+    )
+    args = parser.parse_args()
+
+    header, _ = open_trace(args.trace)
+    analysis = analyze(
+        args.trace, args.block_size, args.window_ticks, args.chunk_packets
+    )
+    summary = analysis.summary()
+    windows = analysis.windows(header["tick_freq"])
+
+    print(f"Packets: {summary['packets']}")
+    print(
+        f"Reads: {summary['reads']} ({summary['bytes_read']} B), "
+        f"writes: {summary['writes']} ({summary['bytes_written']} B)"
+    )
+    print(
+        f"Footprint: {summary['footprint_blocks']} blocks of "
+        f"{args.block_size} B"
+    )
+    print("Reuse intervals (packets, not distinct blocks, in between):")
+    for i, count in enumerate(summary["reuse_intervals"]):
+        print(f"  [{2 ** i}, {2 ** (i + 1)}): {count}")
+    print(f"  first access: {summary['first_accesses']}")
+    print("Strides (blocks):")
+    for stride, count in summary["strides"].items():
+        print(f"  {stride}: {count}")
+    print(f"  larger than {analysis.max_stride}: {summary['large_strides']}")
+    if windows:
+        peak = max(w["bytes_read"] + w["bytes_written"] for w in windows)
+        seconds = analysis.window_ticks / header["tick_freq"]
+        print(
+            f"Windows: {len(windows)} of {analysis.window_ticks} ticks, "
+            f"peak bandwidth {peak / seconds / 1e9:.3f} GB/s"
+        )
+
+    if args.windows_csv:
+        write_table(windows, args.windows_csv)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "windows": windows}, f, indent=2)
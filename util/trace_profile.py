@@ -0,0 +1,807 @@
+# Copyright (c) 2022 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Statistical profiles of memory traces, and synthetic traces drawn from them.
+
+A profile condenses a trace written by gem5's MemTraceProbe into what
+`util.trace_analysis` measures: the bytes accessed per window, the reuse
+interval and stride histograms, the read fraction, the request size and the
+footprint. It is a small JSON file, however long the trace.
+
+`synthesize` draws a trace from a profile, in gem5's packet trace format,
+which PyTrafficGen replays with `createTrace`. The packets are drawn and
+encoded with NumPy a batch at a time, and the traffic generator then replays
+them from C++, without calling back into Python for each request.
+
+The packets of each window are spread evenly over it. Each packet either
+reuses the block of an earlier packet, at an interval drawn from the reuse
+histogram, or accesses a block for the first time, moving from the previous
+first access by a stride drawn from the strides between the first accesses
+of the trace. Reuses come in runs which access earlier packets again in
+about the same order, as when a stream of blocks is read again. The strides
+between consecutive packets are not drawn themselves, so they only match
+those of the trace as far as they follow from the rest.
+
+`check` extracts the profile of a trace, synthesizes a trace from it and
+extracts the profile of that one, and fails unless the two are within a
+tolerance of each other; see util/README.md for a trace on which it fails.
+
+Usage:
+------
+
+```
+python3 -m util.trace_profile extract m5out/mem_trace.gz profile.json \
+    [--block-size 64] [--window-ticks 1000000]
+python3 -m util.trace_profile synthesize profile.json synthetic.gz \
+    [--duration <ticks>] [--scale 2.0] [--seed 0]
+python3 -m util.trace_profile check m5out/mem_trace.gz [--tolerance 0.1]
+```
+
+See materials/using-gem5/03-running/example3/traffGen_example.py for a
+traffic generator replaying a profile.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+from .memtrace import open_trace, write_encoded_trace
+from .trace_analysis import TraceAnalysis, iter_arrays
+
+# The MemCmd values of the synthetic requests.
+READ_REQ = 1
+WRITE_REQ = 4
+
+# The number of packets drawn and encoded at a time.
+BATCH_PACKETS = 1 << 16
+
+# The number of earlier packets a reuse can refer to.
+MAX_HISTORY = 1 << 22
+
+# The number of times a reuse or a first access is drawn again when its
+# packet or block is already taken.
+CLAIM_ROUNDS = 32
+
+# The blocks the first accesses walk through, per first access.
+SPACE_FACTOR = 8
+
+# The largest distance between the packets reused by two consecutive reuses
+# which continues a run of reuses.
+MAX_GAP = 16
+
+
+def extract_profile(
+    path: str, block_size: int = 64, window_ticks: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Extract the statistical profile of a trace.
+
+    :param window_ticks: The length of the bandwidth windows. Defaults to
+    1 us at the tick frequency of the trace.
+    """
+    header, _ = open_trace(path)
+    if window_ticks is None:
+        window_ticks = max(header["tick_freq"] // 1000000, 1)
+    analysis = TraceAnalysis(block_size, window_ticks)
+    max_stride = analysis.max_stride
+    walk_strides = np.zeros(2 * max_stride + 1, dtype=np.int64)
+    walk_large_strides = 0
+    gaps = np.zeros(MAX_GAP + 1, dtype=np.int64)
+    last_first = np.empty(0, dtype=np.int64)
+    last_source = -1
+    for columns in iter_arrays(path):
+        start = analysis.packets
+        intervals = analysis.update(columns)
+        if not len(intervals):
+            continue
+
+        # The strides between consecutive first accesses, which are the
+        # steps of the walk of `_Sampler`.
+        first = columns["addr"][intervals == 0] // np.uint64(block_size)
+        blocks = np.concatenate((last_first, first.astype(np.int64)))
+        strides = np.diff(blocks)
+        small = np.abs(strides) <= max_stride
+        walk_strides += np.bincount(
+            strides[small] + max_stride, minlength=len(walk_strides)
+        )
+        walk_large_strides += int((~small).sum())
+        last_first = blocks[-1:]
+
+        # The distance between the packets reused by consecutive reuses,
+        # 1 when a stream of blocks is accessed again in the same order.
+        sources = np.where(
+            intervals > 0, start + np.arange(len(intervals)) - intervals, -1
+        )
+        previous = np.concatenate(([last_source], sources[:-1]))
+        distances = sources - previous
+        continued = (sources >= 0) & (previous >= 0)
+        continued &= (distances >= 1) & (distances <= MAX_GAP)
+        gaps += np.bincount(distances[continued], minlength=MAX_GAP + 1)
+        last_source = int(sources[-1])
+
+    summary = analysis.summary()
+    rows = analysis.windows()
+    requests = summary["reads"] + summary["writes"]
+    if not requests:
+        raise ValueError(f"'{path}' has no read or write requests.")
+
+    first = rows[0]["start_tick"] // analysis.window_ticks if rows else 0
+    windows = [0] * (
+        rows[-1]["start_tick"] // analysis.window_ticks - first + 1
+        if rows
+        else 0
+    )
+    for row in rows:
+        index = row["start_tick"] // analysis.window_ticks - first
+        windows[index] = row["bytes_read"] + row["bytes_written"]
+
+    reuses = sum(summary["reuse_intervals"])
+    return {
+        "tick_freq": header["tick_freq"],
+        "block_size": block_size,
+        "window_ticks": analysis.window_ticks,
+        # The bytes read and written in each window, from the first one
+        # with a packet.
+        "windows": windows,
+        "read_fraction": summary["reads"] / requests,
+        "request_size": round(
+            (summary["bytes_read"] + summary["bytes_written"]) / requests
+        ),
+        "packets": summary["packets"],
+        "footprint_blocks": summary["footprint_blocks"],
+        "reuse_intervals": summary["reuse_intervals"],
+        # The fraction of the reuses which continue a run of reuses, and
+        # the distances between the packets they reuse, from 1.
+        "reuse_continuation": int(gaps.sum()) / reuses if reuses else 0.0,
+        "reuse_gaps": gaps[1:].tolist(),
+        "strides": summary["strides"],
+        "large_strides": summary["large_strides"],
+        "walk_strides": {
+            str(stride): int(count)
+            for stride, count in zip(
+                range(-max_stride, max_stride + 1), walk_strides
+            )
+        },
+        "walk_large_strides": walk_large_strides,
+    }
+
+
+def _varints(values: np.ndarray):
+    """
+    Encode an array of integers as varints.
+
+    :returns: A (len(values), 10) array of bytes and the mask of the bytes
+    of each varint.
+    """
+    values = values.astype(np.uint64)
+    shifted = values[:, None] >> (np.arange(10, dtype=np.uint64) * 7)
+    lengths = np.maximum((shifted != 0).sum(axis=1), 1)
+    columns = np.arange(10)
+    more = columns < (lengths[:, None] - 1)
+    data = (shifted & np.uint64(0x7F)) | (more * np.uint64(0x80))
+    return data.astype(np.uint8), columns < lengths[:, None]
+
+
+def encode_packets(
+    tick: np.ndarray, cmd: np.ndarray, addr: np.ndarray, size: np.ndarray
+) -> bytes:
+    """
+    Encode packets as length-delimited messages of gem5's Packet format,
+    the input of `memtrace.write_encoded_trace`.
+    """
+    n = len(tick)
+    blocks = []
+    masks = []
+    for tag, values in ((1, tick), (2, cmd), (3, addr), (4, size)):
+        blocks.append(np.full((n, 1), tag << 3, dtype=np.uint8))
+        masks.append(np.ones((n, 1), dtype=bool))
+        data, mask = _varints(values)
+        blocks.append(data)
+        masks.append(mask)
+    # The messages are at most 44 bytes long, so their length takes one
+    # byte.
+    lengths = sum(mask.sum(axis=1) for mask in masks)
+    blocks.insert(0, lengths.astype(np.uint8)[:, None])
+    masks.insert(0, np.ones((n, 1), dtype=bool))
+    return np.hstack(blocks)[np.hstack(masks)].tobytes()
+
+
+class _Sampler:
+    """
+    Draws the blocks of successive batches of packets from a profile.
+
+    Each packet is either the first access to a block or a reuse of the
+    block of an earlier packet. First accesses are drawn by a walk through
+    `space` blocks, with the strides between the first accesses of the
+    profile, and never land on a block accessed before. Reuses come in runs:
+    the first reuse of a run is drawn at an interval from the reuse
+    histogram, and each of the next ones reuses the packet a gap, from the
+    gaps of the profile, after the one reused by the reuse before it, as
+    when a stream of blocks is accessed again.
+
+    The reuse interval histogram counts the interval since the last access to a
+    block, so each packet is reused at most once: once reused, it is not
+    the last access to its block anymore, and reusing it again would make a
+    shorter interval than the one drawn. Each batch makes the reuses of each
+    bin that the trace so far lacks, of the bins its packets can reach, so
+    that the reuses which cannot be made early in the trace, for lack of
+    earlier packets, are made later.
+    """
+
+    def __init__(self, profile: Dict[str, Any], space: int, rng) -> None:
+        self.rng = rng
+        self.space = space
+
+        # The reuses of each bin per packet of the profile.
+        self.reuse_rates = np.array(
+            profile["reuse_intervals"], dtype=np.float64
+        ) / max(profile["packets"], 1)
+        self.continuation = profile.get("reuse_continuation", 0.0)
+        gaps = np.array(profile.get("reuse_gaps", [1]), dtype=np.float64)
+        self.gap_weights = gaps / gaps.sum() if gaps.sum() else gaps + 1
+
+        # Profiles without the strides of the first accesses fall back to
+        # those of all the packets.
+        strides = profile.get("walk_strides", profile["strides"])
+        large = profile.get("walk_large_strides", profile["large_strides"])
+        strides = {int(k): v for k, v in strides.items()}
+        self.stride_values = np.array(list(strides) + [0], dtype=np.int64)
+        counts = np.array(
+            list(strides.values()) + [large], dtype=np.float64
+        )
+        if not counts.sum():
+            counts[-1] = 1
+        self.stride_weights = counts / counts.sum()
+        self.large = len(self.stride_values) - 1
+
+        # The packets drawn and the reuses of each bin made so far.
+        self.packets = 0
+        self.reuses = np.zeros(len(self.reuse_rates), dtype=np.int64)
+        # The blocks of the latest packets, and whether each was reused.
+        self.history = np.empty(0, dtype=np.int64)
+        self.reused = np.empty(0, dtype=bool)
+        # Every block accessed so far, sorted.
+        self.seen = np.empty(0, dtype=np.int64)
+        self.last_block = 0
+        self.last_source = -1
+
+    def _in_bins(self, bins: np.ndarray) -> np.ndarray:
+        return self.rng.integers(2 ** bins, 2 ** (bins + 1))
+
+    def _walk(self, n: int) -> np.ndarray:
+        """
+        The blocks of a walk by the stride histogram, from the last block.
+        """
+        choices = self.rng.choice(
+            len(self.stride_values), size=n, p=self.stride_weights
+        )
+        jumps = choices == self.large
+        steps = self.stride_values[choices]
+        # A jump sets the block: the steps after it are counted from there.
+        positions = np.cumsum(steps)
+        targets = self.rng.integers(0, self.space, size=n)
+        offsets = np.zeros(n, dtype=np.int64)
+        offsets[jumps] = targets[jumps] - positions[jumps]
+        last_jump = np.maximum.accumulate(
+            np.where(jumps, np.arange(n), -1)
+        )
+        base = np.where(
+            last_jump >= 0,
+            offsets[np.maximum(last_jump, 0)],
+            self.last_block,
+        )
+        return np.mod(positions + base, self.space)
+
+    def _first_accesses(self, n: int) -> np.ndarray:
+        blocks = self._walk(n)
+        self.last_block = int(blocks[-1])
+        # The steps which land on a block accessed before jump to a random
+        # block instead.
+        for _ in range(CLAIM_ROUNDS):
+            taken = np.ones(n, dtype=bool)
+            taken[np.unique(blocks, return_index=True)[1]] = False
+            pos = np.searchsorted(self.seen, blocks)
+            found = pos < len(self.seen)
+            found[found] = self.seen[pos[found]] == blocks[found]
+            taken |= found
+            if not taken.any():
+                break
+            blocks[taken] = self.rng.integers(
+                0, self.space, size=int(taken.sum())
+            )
+        new = np.unique(blocks)
+        self.seen = np.insert(
+            self.seen, np.searchsorted(self.seen, new), new
+        )
+        return blocks
+
+    def draw(self, n: int) -> np.ndarray:
+        known = len(self.history)
+        # The packet of the first block of `history`, and those of the batch.
+        base = self.packets - known
+        indices = np.arange(n)
+        packets = self.packets + indices
+
+        # The reuses of each bin which the batch must make for the trace to
+        # keep the rates of the profile, of the bins its packets can reach.
+        reachable = 2 ** np.arange(len(self.reuse_rates)) < known + n
+        deficits = self.reuse_rates * (self.packets + n) - self.reuses
+        deficits = np.maximum(deficits, 0) * reachable
+        bin_weights = deficits / deficits.sum() if deficits.sum() else None
+
+        # Reuses come in runs: a reuse is continued by the next packet with
+        # probability `continuation`, and any packet starts a run with the
+        # probability which keeps the fraction of reuses. A packet is then
+        # a reuse if a run started at or before it and was continued ever
+        # since; the packet before the batch starts one if it was a reuse.
+        r = min(deficits.sum() / n, 1.0)
+        q = self.continuation if bin_weights is not None else 0.0
+        start_fraction = r * (1 - q) / (1 - r * q) if r < 1 else 1.0
+        starts = self.rng.random(n) < start_fraction
+        continues = self.rng.random(n) < q
+        last_start = np.maximum.accumulate(
+            np.where(starts, indices, -1 if self.last_source >= 0 else -2)
+        )
+        last_stop = np.maximum.accumulate(np.where(continues, -2, indices))
+        is_reuse = last_start >= last_stop
+        after_reuse = np.concatenate(([self.last_source >= 0], is_reuse[:-1]))
+        keep = is_reuse & after_reuse & continues
+
+        def draw_sources(at):
+            # Sources at an interval of the bins the batch needs.
+            if not len(at):
+                return at
+            bins = self.rng.choice(len(deficits), size=len(at), p=bin_weights)
+            return packets[at] - self._in_bins(bins)
+
+        # Each reuse claims the packet it reuses, in `history` and then this
+        # batch, and of several reuses of one packet the earliest takes it.
+        # A reuse which finds its packet taken draws one of the packets left
+        # at an interval in the same bin, or another bin if there are none.
+        # Halfway through the rounds, the reuses left move to other packets
+        # of the batch which are not reuses, e.g. from packets too close to
+        # the start of the trace for their interval.
+        claimed = np.concatenate((self.reused, np.zeros(n, dtype=bool)))
+        sources = np.full(n, -1, dtype=np.int64)
+        taken = is_reuse.copy()
+
+        def claim(pending, wanted):
+            for attempt in range(CLAIM_ROUNDS):
+                targets = wanted - base
+                free = (targets >= 0) & (wanted < packets[pending])
+                free[free] = ~claimed[targets[free]]
+                _, first = np.unique(targets[free], return_index=True)
+                won = np.flatnonzero(free)[first]
+                claimed[targets[won]] = True
+                sources[pending[won]] = wanted[won]
+                left = np.ones(len(pending), dtype=bool)
+                left[won] = False
+                pending, wanted = pending[left], wanted[left]
+                if not len(pending):
+                    break
+                if attempt >= CLAIM_ROUNDS // 2:
+                    others = np.flatnonzero(~taken)
+                    if len(others) >= len(pending):
+                        moved = self.rng.choice(
+                            others, len(pending), replace=False
+                        )
+                        taken[pending] = False
+                        taken[moved] = True
+                        wanted += packets[moved] - packets[pending]
+                        order = np.argsort(moved)
+                        pending, wanted = moved[order], wanted[order]
+
+                intervals = packets[pending] - wanted
+                bins = np.floor(np.log2(np.maximum(intervals, 1)))
+                bins = np.minimum(bins.astype(np.int64), len(deficits) - 1)
+                unclaimed = np.flatnonzero(~claimed)
+                low = np.searchsorted(
+                    unclaimed, packets[pending] - 2 ** (bins + 1) + 1 - base
+                )
+                high = np.searchsorted(
+                    unclaimed, packets[pending] - 2 ** bins - base, "right"
+                )
+                some = (intervals > 0) & (high > low)
+                picks = low + (
+                    self.rng.random(len(pending)) * (high - low)
+                ).astype(np.int64)
+                wanted[some] = unclaimed[picks[some]] + base
+                wanted[~some] = draw_sources(pending[~some])
+            # The reuses left are first accesses.
+            taken[pending] = False
+
+        # The first reuse of each run draws its interval, and claims its
+        # packet first.
+        first_reuses = np.flatnonzero(is_reuse & ~keep)
+        claim(first_reuses, draw_sources(first_reuses))
+
+        # The next reuses of the runs then claim theirs one position of the
+        # runs at a time, each the packet a gap after the one reused by the
+        # reuse before it or, if it is taken, the nearest free one within
+        # `MAX_GAP` of it. The reuses which find none draw an interval.
+        gaps = 1 + self.rng.choice(
+            len(self.gap_weights), size=n, p=self.gap_weights
+        )
+        position = indices - np.maximum.accumulate(np.where(keep, -1, indices))
+        lost = []
+        for step in range(1, int(position[keep].max(initial=0)) + 1):
+            at = np.flatnonzero(keep & (position == step))
+            previous = np.where(
+                at > 0, sources[np.maximum(at - 1, 0)], self.last_source
+            )
+            wanted = previous[:, None] + np.column_stack(
+                (gaps[at], np.tile(np.arange(1, MAX_GAP + 1), (len(at), 1)))
+            )
+            targets = np.maximum(wanted - base, 0)
+            free = (wanted >= base) & (wanted < packets[at][:, None])
+            free &= (previous >= 0)[:, None] & ~claimed[targets]
+            found = np.flatnonzero(free.any(axis=1))
+            wanted = wanted[found, free[found].argmax(axis=1)]
+            _, first = np.unique(wanted, return_index=True)
+            claimed[wanted[first] - base] = True
+            sources[at[found[first]]] = wanted[first]
+            lost.append(at[sources[at] < 0])
+        lost = np.sort(np.concatenate(lost)) if lost else indices[:0]
+        claim(lost, draw_sources(lost))
+
+        reused = sources >= 0
+        intervals = (packets - sources)[reused]
+        self.reuses += np.bincount(
+            np.floor(np.log2(intervals)).astype(np.int64),
+            minlength=len(self.reuses),
+        )[: len(self.reuses)]
+        self.last_source = int(sources[-1])
+        self.packets += n
+
+        pointers = np.arange(known + n)
+        pointers[known:][reused] = sources[reused] - base
+        blocks = np.zeros(n, dtype=np.int64)
+        if not reused.all():
+            blocks[~reused] = self._first_accesses(int((~reused).sum()))
+
+        # Follow chains of reuses by pointer jumping.
+        while True:
+            jumped = pointers[pointers]
+            if np.array_equal(jumped, pointers):
+                break
+            pointers = jumped
+        blocks = np.concatenate((self.history, blocks))[pointers][known:]
+
+        self.history = np.concatenate((self.history, blocks))[-MAX_HISTORY:]
+        self.reused = claimed[-MAX_HISTORY:]
+        return blocks
+
+
+def iter_batches(
+    profile: Dict[str, Any],
+    duration: Optional[int] = None,
+    scale: float = 1.0,
+    max_addr: Optional[int] = None,
+    seed: int = 0,
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Draw the packets of a synthetic trace, a batch at a time.
+
+    :param duration: The length of the trace, in ticks. The windows of the
+    profile are repeated if it is longer. Defaults to the length of the
+    profile.
+    :param scale: Multiplies the bandwidth of every window.
+    :param max_addr: The end of the addresses accessed. If it leaves too
+    few blocks for the first accesses, some of them land on blocks accessed
+    before and the trace has more reuses than the profile.
+
+    :returns: An iterator of dictionaries mapping tick, cmd, addr and size
+    to arrays of the values of a batch of packets.
+    """
+    rng = np.random.default_rng(seed)
+    block_size = profile["block_size"]
+    window_ticks = profile["window_ticks"]
+    size = max(profile["request_size"], 1)
+
+    windows = np.array(profile["windows"], dtype=np.float64)
+    if not len(windows):
+        return
+    if duration is None:
+        duration = len(windows) * window_ticks
+    count = -(-duration // window_ticks)
+    windows = np.resize(windows, count)
+    packets = np.round(windows * scale / size).astype(np.int64)
+
+    # The first accesses walk through several times the blocks they need,
+    # so that they rarely land on a block accessed before.
+    footprint = profile["footprint_blocks"] * packets.sum()
+    space = max(int(SPACE_FACTOR * footprint / max(profile["packets"], 1)), 1)
+    if max_addr is not None:
+        space = max(min(space, max_addr // block_size), 1)
+    sampler = _Sampler(profile, space, rng)
+
+    # Batches hold whole windows, so that the ticks of a window are spread
+    # over it at once.
+    totals = np.cumsum(packets)
+    start = 0
+    while start < count:
+        before = totals[start - 1] if start else 0
+        end = int(
+            np.searchsorted(totals, before + BATCH_PACKETS, side="right")
+        )
+        end = min(max(end, start + 1), count)
+        per_window = packets[start:end]
+        n = int(per_window.sum())
+        start_ticks = np.arange(start, end, dtype=np.int64) * window_ticks
+        if n:
+            window = np.repeat(np.arange(end - start), per_window)
+            rank = np.arange(n) - np.repeat(
+                np.cumsum(per_window) - per_window, per_window
+            )
+            tick = start_ticks[window] + (
+                (2 * rank + 1) * window_ticks // (2 * per_window[window])
+            )
+            keep = tick < duration
+            blocks = sampler.draw(n)
+            cmd = np.where(
+                rng.random(n) < profile["read_fraction"], READ_REQ, WRITE_REQ
+            )
+            yield {
+                "tick": tick[keep],
+                "cmd": cmd[keep],
+                "addr": (blocks * block_size)[keep],
+                "size": np.full(int(keep.sum()), size),
+            }
+        start = end
+
+
+def synthesize(
+    profile: Dict[str, Any],
+    path: str,
+    duration: Optional[int] = None,
+    scale: float = 1.0,
+    max_addr: Optional[int] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Write a synthetic trace drawn from a profile, gzipped if `path` ends in
+    ".gz". See `iter_batches` for the parameters.
+
+    :returns: The number of packets written.
+    """
+    count = 0
+
+    def chunks() -> Iterator[bytes]:
+        nonlocal count
+        for batch in iter_batches(profile, duration, scale, max_addr, seed):
+            count += len(batch["tick"])
+            yield encode_packets(
+                batch["tick"], batch["cmd"], batch["addr"], batch["size"]
+            )
+
+    header = {
+        "obj_id": "synthetic",
+        "ver": 0,
+        "tick_freq": profile["tick_freq"],
+        "id_strings": [],
+    }
+    write_encoded_trace(path, header, chunks())
+    return count
+
+
+def _distance(counts: Dict[str, int], other: Dict[str, int]) -> float:
+    # The total variation distance between two histograms.
+    total, other_total = sum(counts.values()), sum(other.values())
+    if not total or not other_total:
+        return float(total != other_total)
+    return sum(
+        abs(counts.get(key, 0) / total - other.get(key, 0) / other_total)
+        for key in set(counts) | set(other)
+    ) / 2
+
+
+def compare_profiles(
+    profile: Dict[str, Any], other: Dict[str, Any]
+) -> Dict[str, float]:
+    """
+    Measure how far apart the statistics of two profiles are, e.g. those of
+    a trace and of a trace synthesized from its profile.
+
+    :returns: The total variation distance between the reuse interval,
+    stride and walk stride histograms, counting the reuses as a fraction of
+    all packets and the large strides as one more stride; the differences
+    between the read fractions and the reuse continuations; and the
+    relative differences of the footprints and of the bytes accessed.
+    """
+
+    def reuse(p):
+        counts = {
+            str(bin): count for bin, count in enumerate(p["reuse_intervals"])
+        }
+        counts["first"] = p["packets"] - sum(p["reuse_intervals"])
+        return counts
+
+    def strides(p, prefix=""):
+        counts = dict(p.get(f"{prefix}strides", {}))
+        counts["large"] = p.get(f"{prefix}large_strides", 0)
+        return counts
+
+    def relative(value, other_value):
+        return abs(other_value - value) / value if value else 0.0
+
+    return {
+        "reuse_intervals": _distance(reuse(profile), reuse(other)),
+        "strides": _distance(strides(profile), strides(other)),
+        "walk_strides": _distance(
+            strides(profile, "walk_"), strides(other, "walk_")
+        ),
+        "read_fraction": abs(
+            other["read_fraction"] - profile["read_fraction"]
+        ),
+        "reuse_continuation": abs(
+            other.get("reuse_continuation", 0.0)
+            - profile.get("reuse_continuation", 0.0)
+        ),
+        "footprint": relative(
+            profile["footprint_blocks"], other["footprint_blocks"]
+        ),
+        "bytes": relative(sum(profile["windows"]), sum(other["windows"])),
+    }
+
+
+def load_profile(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract statistical profiles of memory traces and "
+        "synthesize traces from them."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="Extract the profile of a trace."
+    )
+    extract_parser.add_argument(
+        "trace", type=str, help="A gem5 memory trace or indexed trace."
+    )
+    extract_parser.add_argument(
+        "profile", type=str, help="The JSON profile to write."
+    )
+    extract_parser.add_argument(
+        "--block-size",
+        type=int,
+        default=64,
+        help="The block size, in bytes, for reuse, strides and footprint.",
+    )
+    extract_parser.add_argument(
+        "--window-ticks",
+        type=int,
+        help="The length of the bandwidth windows. Defaults to 1 us.",
+    )
+
+    synthesize_parser = subparsers.add_parser(
+        "synthesize", help="Write a synthetic trace drawn from a profile."
+    )
+    synthesize_parser.add_argument(
+        "profile", type=str, help="The JSON profile."
+    )
+    synthesize_parser.add_argument(
+        "trace",
+        type=str,
+        help="The trace to write, gzipped if its name ends in .gz.",
+    )
+    synthesize_parser.add_argument(
+        "--duration",
+        type=int,
+        help="The length of the trace, in ticks. Defaults to that of the "
+        "profile.",
+    )
+    synthesize_parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplies the bandwidth of the profile.",
+    )
+    synthesize_parser.add_argument(
+        "--max-addr",
+        type=int,
+        help="The end of the addresses accessed.",
+    )
+    synthesize_parser.add_argument(
+        "--seed", type=int, default=0, help="The random seed."
+    )
+
+    check_parser = subparsers.add_parser(
+        "check",
+        help="Extract the profile of a trace, synthesize a trace from it, "
+        "extract the profile of that trace and compare the two.",
+    )
+    check_parser.add_argument(
+        "trace", type=str, help="A gem5 memory trace or indexed trace."
+    )
+    check_parser.add_argument(
+        "--block-size",
+        type=int,
+        default=64,
+        help="The block size, in bytes, for reuse, strides and footprint.",
+    )
+    check_parser.add_argument(
+        "--window-ticks",
+        type=int,
+        help="The length of the bandwidth windows. Defaults to 1 us.",
+    )
+    check_parser.add_argument(
+        "--seed", type=int, default=0, help="The random seed."
+    )
+    check_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="The largest distance accepted between the two profiles.",
+    )
+    args = parser.parse_args()
+
+    if args.command == "check":
+        profile = extract_profile(
+            args.trace, args.block_size, args.window_ticks
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "synthetic.gz")
+            synthesize(profile, path, seed=args.seed)
+            other = extract_profile(
+                path, args.block_size, profile["window_ticks"]
+            )
+        distances = compare_profiles(profile, other)
+        for name, distance in distances.items():
+            print(f"{name:20} {distance:.3f}")
+        if max(distances.values()) > args.tolerance:
+            print(f"Some distances are larger than {args.tolerance}.")
+            sys.exit(1)
+    elif args.command == "extract":
+        profile = extract_profile(
+            args.trace, args.block_size, args.window_ticks
+        )
+        with open(args.profile, "w") as f:
+            json.dump(profile, f, indent=2)
+        print(
+            f"{profile['packets']} packets, {len(profile['windows'])} "
+            f"windows, {profile['footprint_blocks']} blocks."
+        )
+    else:
+        count = synthesize(
+            load_profile(args.profile),
+            args.trace,
+            args.duration,
+            args.scale,
+            args.max_addr,
+            args.seed,
+        )
+        print(f"Wrote {count} packets to {args.trace}.")